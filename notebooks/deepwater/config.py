@@ -0,0 +1,56 @@
+# MASK STORE CONSTANTS
+MASK_STORE_SUFFIX = ".masks"
+MASK_STORE_INDEX_FILE = "index.json"
+MASK_STORE_DATA_FILE = "masks.bin"
+MASK_STORE_CHUNK_SIZE = 64  # masks buffered between index updates
+MASK_STORE_COMPRESSION_LEVEL = 1  # zlib level; masks are long runs, so 1 is plenty
+LEGACY_MASKS_DIR = "masks"  # one {idx:05d}_obj{obj_id}.npy per frame
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# FRAME LOADER CONSTANTS
+FRAME_LOADER_WORKERS = 4  # threads decoding images
+FRAME_PREFETCH = 8  # frames decoded ahead of the one in use
+FRAME_CACHE_BYTES = 512 * 2**20  # decoded frames kept in memory
+
+# FRAME FILTER CONSTANTS
+FRAME_FILTER_SIZE = (72, 64)  # (width, height) frames are hashed at; 9 x 8 cells
+FRAME_DARK_THRESHOLD = 40.0  # mean gray level (0-255) below which a frame is dark
+FRAME_BLANK_THRESHOLD = 4.0  # gray level std below which a frame is blank
+FRAME_DUPLICATE_DISTANCE = 2  # differing hash bits (of 64) for a near-duplicate
+
+# ELEVATION RASTER CONSTANTS
+ELEVATION_RASTER_FILE = "elevation_raster.npz"
+ELEVATION_DECODE_WORKERS = 4  # threads decompressing masks ahead of the raster update
+ELEVATION_DIRECT_UPDATE_FRAMES = 8  # smaller batches update the rasters pixel by pixel
+
+# POLYGON EXTRACTION CONSTANTS
+POLYGON_CACHE_FILE = "polygon_cache.sqlite"
+POLYGON_TABLE_DIR = "polygons"
+POLYGON_CHUNK_SIZE = 32  # masks per process-pool task
+DEFAULT_SIMPLIFY_TOLERANCE = 2.0
+
+# RENDERING CONSTANTS
+DEFAULT_COLORMAP = "viridis"
+GRID_COLUMNS = 6
+GRID_ROWS_PER_PAGE = 5
+GRID_TILE_WIDTH = 320  # pixels
+GRID_PAGE_DIR = "review_pages"
+
+# THUMBNAIL CACHE CONSTANTS
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_WIDTHS = (160, 320, 640)  # pixels; must include GRID_TILE_WIDTH
+THUMBNAIL_JPEG_QUALITY = 85
+THUMBNAIL_WORKERS = 4
+
+# SEGMENTATION CONSTANTS
+SAM_VIDEO_DIR = "SAM"  # sequentially numbered symlinks to the images, for SAM 2
+SEGMENTATION_WINDOW_SIZE = 150  # frames per SAM 2 inference state
+SEGMENTATION_WINDOW_OVERLAP = 4  # frames seeding each window from the previous one
+SEGMENTATION_CHECKPOINT_FILE = "segmentation_checkpoint.json"
+SEGMENTATION_PROMPTS_FILE = "prompts.json"  # saved by notebook 02 for the pipeline
+SAM2_CHECKPOINT = "../checkpoints/sam2.1_hiera_tiny.pt"
+SAM2_MODEL_CONFIG = "configs/sam2.1/sam2.1_hiera_t.yaml"
+
+# PIPELINE CONSTANTS
+ELEVATION_MAP_DIR = "elevation_maps"
+GAGE_HEIGHT_COLUMN = "00065"
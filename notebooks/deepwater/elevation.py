@@ -0,0 +1,282 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .config import ELEVATION_DECODE_WORKERS, ELEVATION_DIRECT_UPDATE_FRAMES
+from .mask_store import MaskStore
+
+
+def _to_words(packed: np.ndarray, n_words: int) -> np.ndarray:
+    """View a bit-packed mask as uint64 words (zero-padding the last word)."""
+    if packed.size == n_words * 8:
+        return packed.view(np.uint64)
+    padded = np.zeros(n_words * 8, np.uint8)
+    padded[: packed.size] = packed
+    return padded.view(np.uint64)
+
+
+def _unpack_words(words: np.ndarray, n_pixels: int) -> np.ndarray:
+    return np.unpackbits(words.view(np.uint8), count=n_pixels)
+
+
+def _prefetch(fn: Callable, items: Sequence, workers: int) -> Iterator:
+    """Yield fn(item) in order, computing up to `workers` items ahead in threads."""
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _first_hits(
+    frames: Iterable[Tuple[np.ndarray, float]], n_pixels: int, fill: float
+) -> np.ndarray:
+    """Return, per pixel, the value of the first frame whose bit is set.
+
+    Frames are (mask as uint64 words, value) pairs. Only the words with newly set
+    bits are unpacked, so each frame costs a pass over its packed words plus the
+    pixels it sets for the first time.
+    """
+    result = np.full(n_pixels, fill, np.float32)
+    remaining = None
+    for words, value in frames:
+        if remaining is None:
+            remaining = np.full(words.shape, np.iinfo(np.uint64).max, np.uint64)
+        new = words & remaining
+        nonzero = np.flatnonzero(new)
+        if nonzero.size == 0:
+            continue
+        new_words = new[nonzero]
+        bits = np.unpackbits(new_words.view(np.uint8).reshape(-1, 8), axis=1)
+        rows, cols = np.nonzero(bits)
+        result[nonzero[rows] * 64 + cols] = value
+        remaining[nonzero] &= ~new_words
+    return result
+
+
+class ElevationRaster:
+    """Per-pixel water elevation statistics built from a stack of masks.
+
+    For every pixel it keeps the minimum elevation (gage height) at which it was
+    wet, the maximum elevation at which it was dry, how many frames it was wet in
+    and, from that, its inundation frequency. None of these depend on the order
+    frames are added, so new frames can be added at any time without
+    reprocessing the ones already seen.
+
+    Masks are processed bit-packed, 64 pixels per word: the min/max rasters come
+    from passes over the frames sorted by elevation that only unpack newly hit
+    pixels, and wet counts are kept as bit-sliced counters (one packed plane per
+    bit of the count), so a frame costs a few passes over its packed words.
+    """
+
+    def __init__(self, shape: Tuple[int, int]):
+        self.shape = tuple(int(n) for n in shape)
+        self.n_pixels = self.shape[0] * self.shape[1]
+        self.n_words = (self.n_pixels + 63) // 64
+        self.min_wet = np.full(self.n_pixels, np.inf, np.float32)
+        self.max_dry = np.full(self.n_pixels, -np.inf, np.float32)
+        self.names: List[str] = []
+        self._names = set()
+        self._count_planes: List[np.ndarray] = []
+        self._n_counted = 0
+        # Bits past the last pixel are padding and must never count as dry
+        self._valid = self._pack(np.ones(self.n_pixels, bool))
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def wet_count(self) -> np.ndarray:
+        """Number of frames each pixel was wet in (2D uint32 array)."""
+        counts = np.zeros(self.n_pixels, np.uint32)
+        for bit, plane in enumerate(self._count_planes):
+            counts |= _unpack_words(plane, self.n_pixels).astype(np.uint32) << bit
+        return counts.reshape(self.shape)
+
+    @property
+    def inundation_frequency(self) -> np.ndarray:
+        """Fraction of frames each pixel was wet in (2D float32 array)."""
+        return self.wet_count.astype(np.float32) / max(self.frame_count, 1)
+
+    def get_min_wet(self) -> np.ndarray:
+        """Lowest elevation each pixel was wet at (NaN if never wet)."""
+        min_wet = np.where(np.isinf(self.min_wet), np.nan, self.min_wet)
+        return min_wet.reshape(self.shape)
+
+    def get_max_dry(self) -> np.ndarray:
+        """Highest elevation each pixel was dry at (NaN if never dry)."""
+        max_dry = np.where(np.isinf(self.max_dry), np.nan, self.max_dry)
+        return max_dry.reshape(self.shape)
+
+    def query(self, x: int, y: int) -> dict:
+        """Return the statistics of a single pixel (image coordinates)."""
+        i = y * self.shape[1] + x
+        wet = sum(
+            int(plane.view(np.uint8)[i // 8] >> (7 - i % 8) & 1) << bit
+            for bit, plane in enumerate(self._count_planes)
+        )
+        return {
+            "min_wet_elevation": float(self.min_wet[i]),
+            "max_dry_elevation": float(self.max_dry[i]),
+            "wet_count": wet,
+            "inundation_frequency": wet / max(self.frame_count, 1),
+        }
+
+    def add(self, name: str, mask: np.ndarray, elevation: float) -> bool:
+        """Add a single (unpacked) mask; returns False if the frame was already added."""
+        mask = np.asarray(mask)
+        if mask.ndim == 3:
+            mask = mask.squeeze()
+        if mask.shape != self.shape:
+            raise ValueError(f"mask shape {mask.shape} does not match {self.shape}")
+        words = self._pack(mask.astype(bool, copy=False).ravel())
+        return self._add_packed([name], [elevation], lambda _: words) == 1
+
+    def add_frames(
+        self,
+        mask_store: MaskStore,
+        names: Sequence[str],
+        elevations: Sequence[float],
+        workers: int = ELEVATION_DECODE_WORKERS,
+    ) -> int:
+        """Add the masks of `names` from a mask store with their elevations.
+
+        Frames already in the raster, frames missing from the store and frames
+        without an elevation (NaN) are skipped. Masks are decompressed by
+        `workers` threads a few frames ahead, so memory stays bounded.
+        Returns the number of frames added.
+        """
+        if tuple(mask_store.shape) != self.shape:
+            raise ValueError(
+                f"mask shape {mask_store.shape} does not match {self.shape}"
+            )
+        present = [
+            (name, elevation)
+            for name, elevation in zip(names, elevations)
+            if name in mask_store
+        ]
+
+        def get_words(name):
+            return _to_words(mask_store.get_packed(name), self.n_words)
+
+        return self._add_packed(
+            [name for name, _ in present],
+            [elevation for _, elevation in present],
+            get_words,
+            workers,
+        )
+
+    def _add_packed(self, names, elevations, get_words, workers=1) -> int:
+        frames = []
+        for name, elevation in zip(names, elevations):
+            if name in self._names or np.isnan(elevation):
+                continue
+            self._names.add(name)
+            frames.append((float(elevation), name))
+        if not frames:
+            return 0
+        frames.sort()  # ascending elevation
+        ascending = [name for _, name in frames]
+        values = [e for e, _ in frames]
+
+        if len(frames) <= ELEVATION_DIRECT_UPDATE_FRAMES:
+            # A few new frames: updating every pixel directly is cheaper
+            for elevation, name in frames:
+                words = self._add_to_wet_count(get_words(name))
+                wet = _unpack_words(words, self.n_pixels).view(bool)
+                np.fmin(self.min_wet, elevation, out=self.min_wet, where=wet)
+                np.fmax(self.max_dry, elevation, out=self.max_dry, where=~wet)
+            self.names.extend(ascending)
+            return len(frames)
+
+        wet = (
+            (self._add_to_wet_count(words), e)
+            for words, e in zip(_prefetch(get_words, ascending, workers), values)
+        )
+        hits = _first_hits(wet, self.n_pixels, np.inf)
+        np.fmin(self.min_wet, hits, out=self.min_wet)
+
+        dry = (
+            (~words & self._valid, e)
+            for words, e in zip(
+                _prefetch(get_words, ascending[::-1], workers), values[::-1]
+            )
+        )
+        hits = _first_hits(dry, self.n_pixels, -np.inf)
+        np.fmax(self.max_dry, hits, out=self.max_dry)
+
+        self.names.extend(ascending)
+        return len(frames)
+
+    def _add_to_wet_count(self, words: np.ndarray) -> np.ndarray:
+        """Add one to the wet count of every set bit (ripple carry over the planes)."""
+        self._n_counted += 1
+        while len(self._count_planes) < self._n_counted.bit_length():
+            self._count_planes.append(np.zeros(self.n_words, np.uint64))
+        carry = words
+        for plane in self._count_planes:
+            next_carry = plane & carry
+            plane ^= carry
+            carry = next_carry
+        return words
+
+    def _pack(self, bits: np.ndarray) -> np.ndarray:
+        return _to_words(np.packbits(bits), self.n_words)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the rasters to a compressed .npz file (elevations as float32)."""
+        count_dtype = np.uint16 if self.frame_count < 2**16 else np.uint32
+        np.savez_compressed(
+            path,
+            shape=np.array(self.shape),
+            min_wet=self.min_wet.reshape(self.shape),
+            max_dry=self.max_dry.reshape(self.shape),
+            wet_count=self.wet_count.astype(count_dtype),
+            names=np.array(self.names),
+        )
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ElevationRaster":
+        """Load rasters saved with save(); more frames can then be added."""
+        with np.load(path) as data:
+            raster = cls(tuple(data["shape"]))
+            raster.min_wet = data["min_wet"].ravel().astype(np.float32)
+            raster.max_dry = data["max_dry"].ravel().astype(np.float32)
+            counts = data["wet_count"].ravel().astype(np.uint32)
+            raster.names = data["names"].tolist()
+        raster._names = set(raster.names)
+        raster._n_counted = len(raster.names)
+        n_bits = int(counts.max()).bit_length() if counts.size else 0
+        raster._count_planes = [
+            raster._pack((counts >> bit) & 1) for bit in range(n_bits)
+        ]
+        return raster
+
+
+def build_elevation_raster(
+    mask_store: MaskStore,
+    names: Sequence[str],
+    elevations: Sequence[float],
+    path: Optional[Union[str, Path]] = None,
+) -> ElevationRaster:
+    """Build (or, if `path` exists, update) the elevation raster for a camera.
+
+    Only frames not already saved at `path` are processed, and the updated
+    raster is saved back to it.
+    """
+    if path is not None and Path(path).exists():
+        raster = ElevationRaster.load(path)
+    else:
+        raster = ElevationRaster(mask_store.shape)
+    n_added = raster.add_frames(mask_store, names, elevations)
+    print(f"Added {n_added} frames to elevation raster ({raster.frame_count} total)")
+    if path is not None:
+        raster.save(path)
+    return raster
@@ -0,0 +1,175 @@
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+import pandas as pd
+
+from .config import (
+    FRAME_BLANK_THRESHOLD,
+    FRAME_DARK_THRESHOLD,
+    FRAME_DUPLICATE_DISTANCE,
+    FRAME_FILTER_SIZE,
+    GAGE_HEIGHT_COLUMN,
+)
+from .frames import FrameLoader
+
+# Values of the skip_reason column; kept frames have none
+SKIP_MISSING = "missing"  # the image is missing or could not be decoded
+SKIP_DARK = "dark"
+SKIP_BLANK = "blank"
+SKIP_DUPLICATE = "duplicate"  # looks the same as the previous kept frame
+SKIP_SAME_STAGE = "same_stage"  # same gage height as the previous kept frame
+
+FRAME_STATS_COLUMNS = ["brightness", "contrast", "frame_hash"]
+# frame_hash of images that could not be read, so they are not retried every run
+UNREADABLE_FRAME_HASH = "unreadable"
+
+
+def get_frame_hashes(grays: np.ndarray) -> np.ndarray:
+    """64-bit difference hashes (dHash) of a batch of grayscale frames.
+
+    Each (height, width) frame is averaged down to 8 rows of 9 cells, and bit
+    (row, col) is set where a cell is brighter than the one to its left.
+    Frames must be FRAME_FILTER_SIZE, which is a whole multiple of 9 x 8 cells.
+    """
+    n, height, width = grays.shape
+    cells = grays.reshape(n, 8, height // 8, 9, width // 9).mean(axis=(2, 4))
+    bits = cells[:, :, 1:] > cells[:, :, :-1]
+    return np.packbits(bits.reshape(n, 64), axis=1).view(">u8").ravel()
+
+
+def _hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def compute_frame_stats(
+    images_dir: Union[str, Path],
+    names: Sequence[str],
+    loader: Optional[FrameLoader] = None,
+) -> pd.DataFrame:
+    """Brightness, contrast and perceptual hash of each image, from a tiny decode.
+
+    Images are decoded at FRAME_FILTER_SIZE width (JPEGs at 1/8 size) by a
+    FrameLoader's threads, and the statistics are computed on the whole stack
+    at once. Images that are missing or cannot be decoded get NaN statistics
+    and UNREADABLE_FRAME_HASH. Returns a DataFrame with FRAME_STATS_COLUMNS,
+    one row per name; other hashes are hex strings.
+    """
+    width, height = FRAME_FILTER_SIZE
+    own_loader = loader is None
+    loader = loader or FrameLoader(images_dir)
+    try:
+        grays = [
+            (
+                None
+                if frame is None
+                else cv2.resize(
+                    cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY),
+                    (width, height),
+                    interpolation=cv2.INTER_AREA,
+                )
+            )
+            for frame in loader.iter_frames(list(names), width, skip_errors=True)
+        ]
+    finally:
+        if own_loader:
+            loader.close()
+    found = np.array([gray is not None for gray in grays], bool)
+    grays = np.array([gray for gray in grays if gray is not None], np.float32)
+    grays = grays.reshape(-1, height, width)
+
+    stats = pd.DataFrame(
+        {
+            "brightness": np.nan,
+            "contrast": np.nan,
+            "frame_hash": UNREADABLE_FRAME_HASH,
+        },
+        index=range(len(found)),
+    )
+    stats.loc[found, "brightness"] = grays.mean(axis=(1, 2))
+    stats.loc[found, "contrast"] = grays.std(axis=(1, 2))
+    # "0x" keeps the hashes strings when read back from a CSV
+    stats.loc[found, "frame_hash"] = [f"{h:#018x}" for h in get_frame_hashes(grays)]
+    return stats
+
+
+def get_skip_reasons(
+    stats: pd.DataFrame,
+    stages: Sequence[float],
+    dark_threshold: float = FRAME_DARK_THRESHOLD,
+    blank_threshold: float = FRAME_BLANK_THRESHOLD,
+    duplicate_distance: int = FRAME_DUPLICATE_DISTANCE,
+) -> List[Optional[str]]:
+    """Why each frame (in time order) should not be segmented, or None to keep it.
+
+    Frames darker than `dark_threshold` (mean gray level) or with less
+    contrast than `blank_threshold` (standard deviation) are unusable. Of the
+    rest, a frame is skipped if its hash is within `duplicate_distance` bits
+    of the previous kept frame (e.g. a frozen camera), or if its gage height
+    equals that frame's, so each run of identical stage values keeps its first
+    usable frame. A frame's reason only depends on the frames before it, so
+    appending frames never changes the reasons of earlier ones.
+    """
+    brightness = stats["brightness"].to_numpy(float)
+    contrast = stats["contrast"].to_numpy(float)
+    missing = np.isnan(brightness)
+    dark = ~missing & (brightness < dark_threshold)
+    blank = ~missing & ~dark & (contrast < blank_threshold)
+    reasons = np.full(len(stats), None, object)
+    reasons[missing] = SKIP_MISSING
+    reasons[dark] = SKIP_DARK
+    reasons[blank] = SKIP_BLANK
+
+    last_hash, last_stage = None, None
+    for i, (frame_hash, stage) in enumerate(zip(stats["frame_hash"], stages)):
+        if reasons[i] is not None:
+            continue
+        frame_hash = int(frame_hash, 16)
+        if (
+            last_hash is not None
+            and _hamming(frame_hash, last_hash) <= duplicate_distance
+        ):
+            reasons[i] = SKIP_DUPLICATE
+        elif last_stage is not None and stage == last_stage:
+            reasons[i] = SKIP_SAME_STAGE
+        else:
+            last_hash, last_stage = frame_hash, stage
+    return reasons.tolist()
+
+
+def filter_frames(
+    df: pd.DataFrame,
+    images_dir: Union[str, Path],
+    loader: Optional[FrameLoader] = None,
+    stage_column: str = GAGE_HEIGHT_COLUMN,
+    **thresholds,
+) -> pd.DataFrame:
+    """Add brightness, contrast, frame_hash and skip_reason columns to images_and_data.
+
+    Statistics are only computed for rows that do not have them yet, so
+    re-running after new images are added only decodes the new ones. Images
+    that could not be read are not retried unless their frame_hash is
+    cleared. Skip reasons are decided over all rows in time order (see
+    get_skip_reasons); rows with no skip_reason are the frames to segment.
+    """
+    df = df.copy()
+    for column in FRAME_STATS_COLUMNS:
+        if column not in df.columns:
+            df[column] = np.nan
+    df["frame_hash"] = df["frame_hash"].astype(object)
+    todo = df.index[df["frame_hash"].isna()]
+    if len(todo):
+        print(f"Computing frame statistics for {len(todo)} images")
+        stats = compute_frame_stats(images_dir, df.loc[todo, "image_names"], loader)
+        stats.index = todo
+        df.loc[todo, FRAME_STATS_COLUMNS] = stats
+
+    order = df.index[np.argsort(df["image_names"].to_numpy(), kind="stable")]
+    reasons = get_skip_reasons(
+        df.loc[order, FRAME_STATS_COLUMNS].reset_index(drop=True),
+        df.loc[order, stage_column].to_numpy(),
+        **thresholds,
+    )
+    df["skip_reason"] = pd.Series(reasons, index=order, dtype=object)
+    return df
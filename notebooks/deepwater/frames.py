@@ -0,0 +1,157 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from .config import FRAME_CACHE_BYTES, FRAME_LOADER_WORKERS, FRAME_PREFETCH
+
+FrameKey = Tuple[str, Optional[int]]
+
+
+def decode_frame(
+    image_path: Union[str, Path], width: Optional[int] = None
+) -> np.ndarray:
+    """Decode an image to an RGB (height, width, 3) uint8 array.
+
+    With `width`, the image is scaled to that width, and JPEGs are decoded
+    at 1/2, 1/4 or 1/8 size first when that is still at least as large, which
+    skips most of the decoding work.
+    """
+    with Image.open(image_path) as image:
+        if width is None or width == image.width:
+            return np.array(image.convert("RGB"))
+        height = round(image.height * width / image.width)
+        image.draft("RGB", (width, height))
+        return np.array(image.convert("RGB").resize((width, height)))
+
+
+class FrameLoader:
+    """Decoded frames of an images directory, prefetched by a thread pool and cached.
+
+    Frames are looked up by image name, at full resolution or scaled to a
+    `width`. Decoding runs in `workers` threads (Pillow releases the GIL while
+    decoding), and iter_frames() keeps `prefetch` frames decoding ahead of the
+    one being used. Decoded frames are kept in an LRU cache holding at most
+    `cache_bytes`; cached arrays are shared, so they are read-only.
+    """
+
+    def __init__(
+        self,
+        images_dir: Union[str, Path],
+        width: Optional[int] = None,
+        workers: int = FRAME_LOADER_WORKERS,
+        cache_bytes: int = FRAME_CACHE_BYTES,
+        prefetch: int = FRAME_PREFETCH,
+    ):
+        """Frames are decoded at `width` unless another width is asked for."""
+        self.images_dir = Path(images_dir)
+        self.width = width
+        self.cache_bytes = cache_bytes
+        self.prefetch_count = prefetch
+        self._executor = ThreadPoolExecutor(workers)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[FrameKey, np.ndarray]" = OrderedDict()
+        self._pending: Dict[FrameKey, Future] = {}
+        self.nbytes = 0
+
+    def _key(self, name: str, width: Optional[int]) -> FrameKey:
+        return name, self.width if width is None else width
+
+    def _decode(self, key: FrameKey) -> np.ndarray:
+        name, width = key
+        frame = decode_frame(self.images_dir / name, width)
+        frame.flags.writeable = False
+        return frame
+
+    def _store(self, key: FrameKey, future: Future) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            frame = future.result()
+            if frame.nbytes > self.cache_bytes:
+                return
+            self._cache[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.cache_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def submit(self, name: str, width: Optional[int] = None) -> Future:
+        """Start decoding a frame (if it is not cached or already decoding)."""
+        key = self._key(name, width)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                future = Future()
+                future.set_result(self._cache[key])
+                return future
+            if key in self._pending:
+                return self._pending[key]
+            future = self._executor.submit(self._decode, key)
+            self._pending[key] = future
+        future.add_done_callback(lambda f: self._store(key, f))
+        return future
+
+    def get(self, name: str, width: Optional[int] = None) -> np.ndarray:
+        """The decoded frame of an image, waiting for it if necessary."""
+        return self.submit(name, width).result()
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.get(name)
+
+    def prefetch(self, names: Iterable[str], width: Optional[int] = None) -> None:
+        """Start decoding frames that will be needed soon."""
+        for name in names:
+            self.submit(name, width)
+
+    def iter_frames(
+        self,
+        names: Sequence[str],
+        width: Optional[int] = None,
+        skip_errors: bool = False,
+    ) -> Iterator[Optional[np.ndarray]]:
+        """Yield the frames of `names` in order, decoding the next ones ahead.
+
+        With `skip_errors`, images that are missing or cannot be decoded are
+        yielded as None instead of raising.
+        """
+        pending = deque()
+        for name in names:
+            pending.append(self.submit(name, width))
+            if len(pending) > self.prefetch_count:
+                yield self._result(pending.popleft(), skip_errors)
+        while pending:
+            yield self._result(pending.popleft(), skip_errors)
+
+    @staticmethod
+    def _result(future: Future, skip_errors: bool) -> Optional[np.ndarray]:
+        if skip_errors and future.exception() is not None:
+            return None
+        return future.result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.nbytes = 0
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def open_frame_loader(
+    camera_dir: Union[str, Path], width: Optional[int] = None, **kwargs
+) -> FrameLoader:
+    """The frame loader of a camera directory's `images/`."""
+    return FrameLoader(Path(camera_dir) / "images", width, **kwargs)
@@ -0,0 +1,258 @@
+import json
+import mmap
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .config import (
+    MASK_STORE_SUFFIX,
+    MASK_STORE_INDEX_FILE,
+    MASK_STORE_DATA_FILE,
+    MASK_STORE_CHUNK_SIZE,
+    MASK_STORE_COMPRESSION_LEVEL,
+    LEGACY_MASKS_DIR,
+    IMAGE_EXTENSIONS,
+)
+
+MASK_FILENAME_PATTERN = re.compile(r"^(\d+)_obj(\d+)\.npy$")
+
+
+def get_mask_store_path(camera_dir: Union[str, Path], obj_id: int = 1) -> Path:
+    """Return the default mask store path for a camera directory, e.g. `{camera_id}/obj1.masks`."""
+    return Path(camera_dir) / f"obj{obj_id}{MASK_STORE_SUFFIX}"
+
+
+def _as_2d_bool(mask) -> np.ndarray:
+    mask = np.asarray(mask)
+    if mask.ndim == 3:
+        mask = mask.squeeze()
+    return mask.astype(bool, copy=False)
+
+
+class MaskStoreWriter:
+    """Append boolean masks to a mask store.
+
+    Each mask is bit-packed (8 pixels per byte) and zlib-compressed, and all masks
+    go into one data file, so a camera's masks take a couple of files instead of
+    one `.npy` per frame. Masks are buffered and written `chunk_size` at a time;
+    the index is only updated after a chunk's data is on disk, so an interrupted
+    run leaves a readable store. Appending to an existing store continues it.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        chunk_size: int = MASK_STORE_CHUNK_SIZE,
+        compress: bool = True,
+        overwrite: bool = False,
+    ):
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.shape: Optional[Tuple[int, int]] = None
+        self.names: List[str] = []
+        self.offsets: List[int] = [0]  # frame i is data[offsets[i]:offsets[i + 1]]
+        self._pending: List[Tuple[str, bytes]] = []
+
+        index_path = self.path / MASK_STORE_INDEX_FILE
+        if overwrite or not index_path.exists():
+            self.path.mkdir(parents=True, exist_ok=True)
+            # Empty the index first, so it never points past the end of the data
+            self._write_index()
+            open(self.path / MASK_STORE_DATA_FILE, "wb").close()
+        else:
+            with open(index_path) as f:
+                index = json.load(f)
+            self.shape = tuple(index["shape"]) if index["shape"] else None
+            self.names = index["names"]
+            self.offsets = index["offsets"]
+            self.compress = index["compressed"]
+        self._names = set(self.names)
+        self._data = open(self.path / MASK_STORE_DATA_FILE, "r+b")
+        self._data.truncate(self.offsets[-1])  # drop data written after the last index
+        self._data.seek(self.offsets[-1])
+
+    def append(self, name: str, mask) -> int:
+        """Add a mask under an image name and return its frame index."""
+        mask = _as_2d_bool(mask)
+        if self.shape is None:
+            self.shape = mask.shape
+        elif mask.shape != self.shape:
+            raise ValueError(f"mask shape {mask.shape} does not match {self.shape}")
+        if name in self._names:
+            raise ValueError(f"{name} is already in the mask store")
+
+        data = np.packbits(mask.ravel()).tobytes()
+        if self.compress:
+            data = zlib.compress(data, MASK_STORE_COMPRESSION_LEVEL)
+        self._names.add(name)
+        self._pending.append((name, data))
+        if len(self._pending) >= self.chunk_size:
+            self.flush()
+        return len(self.names) + len(self._pending) - 1
+
+    def flush(self) -> None:
+        """Write buffered masks to the data file and update the index."""
+        for name, data in self._pending:
+            self._data.write(data)
+            self.names.append(name)
+            self.offsets.append(self.offsets[-1] + len(data))
+        self._data.flush()
+        self._pending = []
+        self._write_index()
+
+    def _write_index(self) -> None:
+        """Atomically replace the index with the frames written so far."""
+        index = {
+            "shape": list(self.shape) if self.shape else None,
+            "compressed": self.compress,
+            "names": self.names,
+            "offsets": self.offsets,
+        }
+        tmp_path = self.path / (MASK_STORE_INDEX_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.path / MASK_STORE_INDEX_FILE)
+
+    def close(self) -> None:
+        self.flush()
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MaskStore:
+    """Read-only access to a mask store written by MaskStoreWriter.
+
+    The data file is memory-mapped, and a mask can be looked up by frame index or
+    image name (`store[12]`, `store["image.jpg"]`) without touching any other
+    frame. Iterating yields the masks in frame order.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path / MASK_STORE_INDEX_FILE) as f:
+            index = json.load(f)
+        self.shape: Tuple[int, int] = tuple(index["shape"] or (0, 0))
+        self.compressed: bool = index["compressed"]
+        self.names: List[str] = index["names"]
+        self.offsets: List[int] = index["offsets"]
+        self._positions: Dict[str, int] = {n: i for i, n in enumerate(self.names)}
+
+        self._file = open(self.path / MASK_STORE_DATA_FILE, "rb")
+        self._mmap = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.offsets[-1]
+            else b""
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mask data on disk."""
+        return self.offsets[-1]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._positions
+
+    def index_of(self, name: str) -> int:
+        return self._positions[name]
+
+    def __getitem__(self, key: Union[int, str]) -> np.ndarray:
+        """Return the mask for a frame index or image name as a 2D boolean array."""
+        packed = self.get_packed(key)
+        n_pixels = self.shape[0] * self.shape[1]
+        return np.unpackbits(packed, count=n_pixels).view(bool).reshape(self.shape)
+
+    def get_packed(self, key: Union[int, str]) -> np.ndarray:
+        """Return a mask still bit-packed (`np.packbits` of the flattened mask)."""
+        frame = self._positions[key] if isinstance(key, str) else int(key)
+        if frame < 0:
+            frame += len(self)
+        if not 0 <= frame < len(self):
+            raise IndexError(f"frame {key} is out of range")
+        data = self._mmap[self.offsets[frame] : self.offsets[frame + 1]]
+        if self.compressed:
+            data = zlib.decompress(data)
+        return np.frombuffer(data, np.uint8)
+
+    def get(self, name: str, default=None) -> Optional[np.ndarray]:
+        return self[name] if name in self._positions else default
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for frame in range(len(self)):
+            yield self[frame]
+
+    def items(self) -> Iterator[Tuple[str, np.ndarray]]:
+        return zip(self.names, self)
+
+    def close(self) -> None:
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def convert_mask_dir(
+    masks_dir: Union[str, Path],
+    store_path: Union[str, Path],
+    names: Optional[Sequence[str]] = None,
+    obj_id: int = 1,
+    chunk_size: int = MASK_STORE_CHUNK_SIZE,
+) -> MaskStore:
+    """Convert a directory of `{idx:05d}_obj{obj_id}.npy` masks into a mask store.
+
+    `names[idx]` is used as the image name for frame `idx` (e.g. the sorted image
+    files the masks were created from); without it the `.npy` file names are used.
+    """
+    mask_files = []
+    for filename in os.listdir(masks_dir):
+        match = MASK_FILENAME_PATTERN.match(filename)
+        if match and int(match.group(2)) == obj_id:
+            mask_files.append((int(match.group(1)), filename))
+    mask_files.sort()
+
+    with MaskStoreWriter(store_path, chunk_size=chunk_size, overwrite=True) as writer:
+        for idx, filename in mask_files:
+            name = names[idx] if names is not None else filename
+            writer.append(name, np.load(os.path.join(masks_dir, filename)))
+
+    print(f"Converted {len(mask_files)} masks from {masks_dir} to {store_path}")
+    return MaskStore(store_path)
+
+
+def open_mask_store(
+    camera_dir: Union[str, Path],
+    obj_id: int = 1,
+    images_dir: Optional[Union[str, Path]] = None,
+) -> MaskStore:
+    """Open a camera's mask store, first converting a legacy `masks/` directory if needed.
+
+    Legacy masks are numbered by the sorted image files in `images_dir`
+    (`{camera_dir}/images` by default), exactly as notebook 02 numbered them.
+    """
+    camera_dir = Path(camera_dir)
+    store_path = get_mask_store_path(camera_dir, obj_id)
+    masks_dir = camera_dir / LEGACY_MASKS_DIR
+    if not (store_path / MASK_STORE_INDEX_FILE).exists() and masks_dir.is_dir():
+        images_dir = Path(images_dir) if images_dir else camera_dir / "images"
+        names = sorted(
+            f for f in os.listdir(images_dir) if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        return convert_mask_dir(masks_dir, store_path, names, obj_id)
+    return MaskStore(store_path)
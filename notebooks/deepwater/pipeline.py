@@ -0,0 +1,264 @@
+"""Frame filter, segmentation, polygon and elevation stages for `pynims pipeline`.
+
+Run from this directory, after annotating each camera in notebook 02:
+
+    pynims pipeline cameras.json --stages deepwater.pipeline:STAGES
+"""
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+from pynims.config import PIPELINE_IMAGES_AND_DATA_FILE
+from pynims.pipeline import PipelineCamera, Stage, StageOutputs, hash_values
+
+from .config import (
+    DEFAULT_SIMPLIFY_TOLERANCE,
+    ELEVATION_MAP_DIR,
+    ELEVATION_RASTER_FILE,
+    FRAME_BLANK_THRESHOLD,
+    FRAME_DARK_THRESHOLD,
+    FRAME_DUPLICATE_DISTANCE,
+    FRAME_FILTER_SIZE,
+    GAGE_HEIGHT_COLUMN,
+    POLYGON_CACHE_FILE,
+    POLYGON_TABLE_DIR,
+    SAM2_CHECKPOINT,
+    SAM2_MODEL_CONFIG,
+    SEGMENTATION_WINDOW_OVERLAP,
+    SEGMENTATION_WINDOW_SIZE,
+)
+from .elevation import build_elevation_raster
+from .filtering import filter_frames
+from .mask_store import MaskStore, get_mask_store_path
+from .polygons import extract_polygons, get_polygon_cache_key
+from .segmentation import get_prompts_fingerprint, load_prompts, segment_windowed
+
+
+def _get_mask_hashes(
+    camera_dir: Path, obj_ids: List[int], items: List[str]
+) -> StageOutputs:
+    """Hash the masks of every object for each item found in the mask stores."""
+    stores = [MaskStore(get_mask_store_path(camera_dir, obj_id)) for obj_id in obj_ids]
+    outputs = {}
+    for item in items:
+        if all(item in store for store in stores):
+            digest = hashlib.blake2b(digest_size=16)
+            for store in stores:
+                digest.update(store.get_packed(item).tobytes())
+            outputs[item] = digest.hexdigest()
+    for store in stores:
+        store.close()
+    return outputs
+
+
+class FilterStage(Stage):
+    """Decide which new frames are worth segmenting, and record why the rest are not.
+
+    Adds frame statistics and a skip_reason to images_and_data.csv (see
+    deepwater.filtering.filter_frames). Skipped frames are dropped, so they
+    never reach SAM 2; kept frames output their perceptual hash.
+    """
+
+    name = "filter"
+    deps = ("download", "join")
+    # Whether a frame is kept depends on the frames before it
+    append_only = True
+
+    def __init__(
+        self,
+        dark_threshold: float = FRAME_DARK_THRESHOLD,
+        blank_threshold: float = FRAME_BLANK_THRESHOLD,
+        duplicate_distance: int = FRAME_DUPLICATE_DISTANCE,
+    ):
+        self.thresholds = dict(
+            dark_threshold=dark_threshold,
+            blank_threshold=blank_threshold,
+            duplicate_distance=duplicate_distance,
+        )
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        return hash_values(FRAME_FILTER_SIZE, sorted(self.thresholds.items()))
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        csv_path = camera.camera_dir / PIPELINE_IMAGES_AND_DATA_FILE
+        df = pd.read_csv(csv_path)
+        # The images of these items are new or changed, so their statistics are redone
+        if "frame_hash" in df.columns:
+            df.loc[df["image_names"].isin(items), "frame_hash"] = None
+        df = filter_frames(df, camera.images_dir, **self.thresholds)
+        tmp_path = csv_path.with_suffix(".csv.tmp")
+        df.to_csv(tmp_path, index=False)
+        tmp_path.replace(csv_path)
+
+        df = df.set_index("image_names")
+        return {
+            item: (
+                df.at[item, "frame_hash"]
+                if pd.isna(df.at[item, "skip_reason"])
+                else None
+            )
+            for item in items
+            if item in df.index
+        }
+
+
+class SegmentStage(Stage):
+    """Segment new images with SAM 2, continuing from the prompts saved by notebook 02.
+
+    New images are appended to the mask stores by segment_windowed, which
+    resumes after the last segmented frame. Changed prompts (or changed
+    images) resegment everything.
+    """
+
+    name = "segment"
+    deps = ("filter",)
+    append_only = True
+
+    def __init__(
+        self,
+        model_cfg: str = SAM2_MODEL_CONFIG,
+        checkpoint: str = SAM2_CHECKPOINT,
+        device: str = "cpu",
+        window_size: int = SEGMENTATION_WINDOW_SIZE,
+        overlap: int = SEGMENTATION_WINDOW_OVERLAP,
+    ):
+        self.model_cfg = model_cfg
+        self.checkpoint = checkpoint
+        self.device = device
+        self.window_size = window_size
+        self.overlap = overlap
+        self._predictor = None
+        # One model is shared by all cameras, so they take turns using it
+        self._lock = threading.Lock()
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        prompts = load_prompts(camera.camera_dir)
+        return hash_values(
+            get_prompts_fingerprint(prompts), self.model_cfg, self.checkpoint
+        )
+
+    def _get_predictor(self):
+        if self._predictor is None:
+            from sam2.build_sam import build_sam2_video_predictor
+
+            self._predictor = build_sam2_video_predictor(
+                self.model_cfg, self.checkpoint, device=self.device
+            )
+        return self._predictor
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        prompts = load_prompts(camera.camera_dir)
+        obj_ids = sorted({p.obj_id for p in prompts})
+        image_files = set(items)
+        store_path = get_mask_store_path(camera.camera_dir, obj_ids[0])
+        if not rebuild and store_path.exists():
+            with MaskStore(store_path) as store:
+                image_files.update(store.names)
+        with self._lock:
+            segment_windowed(
+                self._get_predictor(),
+                camera.images_dir,
+                sorted(image_files),
+                prompts,
+                camera.camera_dir,
+                window_size=self.window_size,
+                overlap=self.overlap,
+                resume=not rebuild,
+            )
+        return _get_mask_hashes(camera.camera_dir, obj_ids, items)
+
+
+class PolygonStage(Stage):
+    """Extract the polygons of new masks and save the camera's polygon table.
+
+    Polygons are cached by mask content, so only new or changed masks are
+    polygonized; the table itself is rewritten from the cache.
+    """
+
+    name = "polygons"
+    deps = ("segment",)
+
+    def __init__(self, simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE):
+        self.simplify_tolerance = simplify_tolerance
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        return hash_values(self.simplify_tolerance)
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        output_dir = camera.camera_dir / ELEVATION_MAP_DIR
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with MaskStore(get_mask_store_path(camera.camera_dir)) as mask_store:
+            table = extract_polygons(
+                mask_store,
+                mask_store.names,
+                simplify_tolerance=self.simplify_tolerance,
+                cache_path=output_dir / POLYGON_CACHE_FILE,
+            )
+            table.save(output_dir / POLYGON_TABLE_DIR)
+            # The polygons of a mask are fully determined by its cache key
+            return {
+                item: get_polygon_cache_key(
+                    mask_store.get_packed(item),
+                    mask_store.shape,
+                    self.simplify_tolerance,
+                )
+                for item in items
+                if item in mask_store
+            }
+
+
+class ElevationStage(Stage):
+    """Add new frames to the camera's elevation raster.
+
+    Frames flagged 'bad' in notebook 02.5 are left out, and changing the flags
+    rebuilds the raster, since frames cannot be taken back out of it.
+    """
+
+    name = "elevation"
+    deps = ("join", "segment")
+    append_only = True
+
+    def _read_images_and_data(self, camera: PipelineCamera) -> pd.DataFrame:
+        return pd.read_csv(camera.camera_dir / PIPELINE_IMAGES_AND_DATA_FILE)
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        df = self._read_images_and_data(camera)
+        bad: Optional[list] = None
+        if "quality_flag" in df.columns:
+            bad = sorted(df.loc[df["quality_flag"] == "bad", "image_names"])
+        return hash_values(bad)
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        df = self._read_images_and_data(camera).set_index("image_names")
+        if "quality_flag" in df.columns:
+            df = df[df["quality_flag"] != "bad"]
+        good = [item for item in items if item in df.index]
+
+        raster_path = camera.camera_dir / ELEVATION_MAP_DIR / ELEVATION_RASTER_FILE
+        raster_path.parent.mkdir(parents=True, exist_ok=True)
+        if rebuild and raster_path.exists():
+            raster_path.unlink()
+        with MaskStore(get_mask_store_path(camera.camera_dir)) as mask_store:
+            elevations = df.loc[good, GAGE_HEIGHT_COLUMN].to_numpy()
+            build_elevation_raster(mask_store, good, elevations, raster_path)
+        outputs: StageOutputs = {item: None for item in items}
+        outputs.update(
+            (item, hash_values(float(elevation)))
+            for item, elevation in zip(good, elevations)
+        )
+        return outputs
+
+
+STAGES = [FilterStage(), SegmentStage(), PolygonStage(), ElevationStage()]
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .config import (
+    POLYGON_CHUNK_SIZE,
+    DEFAULT_SIMPLIFY_TOLERANCE,
+)
+from .mask_store import MaskStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS polygons (
+    key TEXT PRIMARY KEY,
+    counts BLOB NOT NULL,
+    vertices BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def mask_to_polygons(
+    mask: np.ndarray, simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE
+) -> List[np.ndarray]:
+    """Convert a binary mask to simplified outer contours, each an (n, 2) array of (x, y)."""
+    if mask.ndim == 3:
+        mask = mask.squeeze()
+    mask_uint8 = mask.astype(np.uint8) * 255
+    contours, _ = cv2.findContours(
+        mask_uint8, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+
+    polygons = []
+    for contour in contours:
+        approx = cv2.approxPolyDP(contour, simplify_tolerance, True)
+        if len(approx) >= 3:  # need at least 3 points for a polygon
+            polygons.append(approx.reshape(-1, 2))
+    return polygons
+
+
+def get_polygon_cache_key(packed: np.ndarray, shape, simplify_tolerance: float) -> str:
+    """Key a mask's polygons by its content and the simplify tolerance."""
+    digest = hashlib.blake2b(packed.tobytes(), digest_size=16)
+    digest.update(repr((tuple(shape), float(simplify_tolerance))).encode())
+    return digest.hexdigest()
+
+
+def _to_columns(polygons: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    counts = np.array([len(p) for p in polygons], np.int32)
+    vertices = (
+        np.concatenate(polygons).astype(np.int32)
+        if polygons
+        else np.empty((0, 2), np.int32)
+    )
+    return counts, vertices
+
+
+def _extract_chunk(
+    store_path: str, names: List[str], simplify_tolerance: float
+) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+    """Process-pool task: extract the polygons of a chunk of masks."""
+    with MaskStore(store_path) as mask_store:
+        return [
+            (name, *_to_columns(mask_to_polygons(mask_store[name], simplify_tolerance)))
+            for name in names
+        ]
+
+
+class PolygonCache:
+    """A SQLite cache of extracted polygons, keyed by get_polygon_cache_key."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 500):  # stay under SQLite's variable limit
+            batch = keys[i : i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, counts, vertices FROM polygons WHERE key IN "
+                f"({','.join('?' * len(batch))})",
+                batch,
+            )
+            for key, counts, vertices in rows:
+                found[key] = (
+                    np.frombuffer(counts, np.int32),
+                    np.frombuffer(vertices, np.int32).reshape(-1, 2),
+                )
+        return found
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray, np.ndarray]]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO polygons (key, counts, vertices) "
+                "VALUES (?, ?, ?)",
+                [(key, c.tobytes(), v.tobytes()) for key, c, v in items],
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PolygonTable:
+    """Polygons of many frames as flat columns.
+
+    `vertices` holds every (x, y) vertex, polygon i is
+    `vertices[polygon_offsets[i]:polygon_offsets[i + 1]]`, and frame j owns
+    polygons `frame_offsets[j]:frame_offsets[j + 1]`. Saved as .npy files, so
+    load() can memory-map them instead of reading them.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        frame_offsets: np.ndarray,
+        polygon_offsets: np.ndarray,
+        vertices: np.ndarray,
+        simplify_tolerance: Optional[float] = None,
+    ):
+        self.names = names
+        self.frame_offsets = frame_offsets
+        self.polygon_offsets = polygon_offsets
+        self.vertices = vertices
+        self.simplify_tolerance = simplify_tolerance
+
+    @classmethod
+    def from_frames(
+        cls,
+        names: List[str],
+        frames: Sequence[Tuple[np.ndarray, np.ndarray]],
+        simplify_tolerance: Optional[float] = None,
+    ) -> "PolygonTable":
+        """Build a table from per-frame (vertex counts, vertices) columns."""
+        polygon_counts = [len(counts) for counts, _ in frames]
+        counts = np.concatenate([c for c, _ in frames] or [np.empty(0, np.int32)])
+        frame_offsets = np.zeros(len(frames) + 1, np.int64)
+        np.cumsum(polygon_counts, out=frame_offsets[1:])
+        polygon_offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=polygon_offsets[1:])
+        vertices = np.concatenate(
+            [v for _, v in frames] or [np.empty((0, 2), np.int32)]
+        )
+        return cls(names, frame_offsets, polygon_offsets, vertices, simplify_tolerance)
+
+    def __len__(self) -> int:
+        """Number of polygons."""
+        return len(self.polygon_offsets) - 1
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.vertices[self.polygon_offsets[i] : self.polygon_offsets[i + 1]]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def polygon_frames(self) -> np.ndarray:
+        """Frame index of every polygon."""
+        return np.repeat(np.arange(len(self.names)), np.diff(self.frame_offsets))
+
+    @property
+    def num_vertices(self) -> np.ndarray:
+        return np.diff(self.polygon_offsets)
+
+    def frame_polygons(self, key: Union[int, str]) -> List[np.ndarray]:
+        """Return the polygons of a frame, by frame index or image name."""
+        frame = self.names.index(key) if isinstance(key, str) else key
+        start, end = self.frame_offsets[frame], self.frame_offsets[frame + 1]
+        return [self[i] for i in range(start, end)]
+
+    def save(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "frame_offsets.npy", self.frame_offsets)
+        np.save(path / "polygon_offsets.npy", self.polygon_offsets)
+        np.save(path / "vertices.npy", self.vertices)
+        with open(path / "frames.json", "w") as f:
+            json.dump(
+                {"names": self.names, "simplify_tolerance": self.simplify_tolerance}, f
+            )
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "PolygonTable":
+        """Load a saved table; with mmap=True the arrays are memory-mapped, not read."""
+        path = Path(path)
+        mmap_mode = "r" if mmap else None
+        with open(path / "frames.json") as f:
+            frames = json.load(f)
+        return cls(
+            frames["names"],
+            np.load(path / "frame_offsets.npy", mmap_mode=mmap_mode),
+            np.load(path / "polygon_offsets.npy", mmap_mode=mmap_mode),
+            np.load(path / "vertices.npy", mmap_mode=mmap_mode),
+            frames["simplify_tolerance"],
+        )
+
+
+def extract_polygons(
+    mask_store: MaskStore,
+    names: Sequence[str],
+    simplify_tolerance: float = DEFAULT_SIMPLIFY_TOLERANCE,
+    cache_path: Optional[Union[str, Path]] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = POLYGON_CHUNK_SIZE,
+) -> PolygonTable:
+    """Extract the polygons of every named mask into a PolygonTable.
+
+    Masks are split into chunks of `chunk_size` and processed by a pool of
+    `workers` processes (all CPUs by default). With a `cache_path`, polygons
+    are cached by mask content and simplify tolerance, so a re-run only
+    processes masks that changed or were never seen with this tolerance.
+    Names missing from the mask store get no polygons.
+    """
+    names = list(names)
+    keys = {
+        name: get_polygon_cache_key(
+            mask_store.get_packed(name), mask_store.shape, simplify_tolerance
+        )
+        for name in names
+        if name in mask_store
+    }
+    cache = PolygonCache(cache_path) if cache_path is not None else None
+    found = cache.get_many(keys.values()) if cache is not None else {}
+    todo = [name for name, key in keys.items() if key not in found]
+    print(f"Extracting polygons from {len(todo)} masks ({len(found)} cached)")
+
+    chunks = [todo[i : i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    store_path = str(mask_store.path)
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(
+                _extract_chunk,
+                [store_path] * len(chunks),
+                chunks,
+                [simplify_tolerance] * len(chunks),
+            )
+            _collect(results, keys, found, cache)
+    else:
+        results = (
+            _extract_chunk(store_path, chunk, simplify_tolerance) for chunk in chunks
+        )
+        _collect(results, keys, found, cache)
+    if cache is not None:
+        cache.close()
+
+    empty = (np.empty(0, np.int32), np.empty((0, 2), np.int32))
+    frames = [found[keys[name]] if name in keys else empty for name in names]
+    return PolygonTable.from_frames(names, frames, simplify_tolerance)
+
+
+def _collect(results, keys, found, cache) -> None:
+    for chunk in results:
+        items = [(keys[name], counts, vertices) for name, counts, vertices in chunk]
+        for key, counts, vertices in items:
+            found[key] = (counts, vertices)
+        if cache is not None:
+            cache.put_many(items)
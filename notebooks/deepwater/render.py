@@ -0,0 +1,209 @@
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import matplotlib
+import numpy as np
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import Normalize
+
+from .config import (
+    DEFAULT_COLORMAP,
+    GRID_COLUMNS,
+    GRID_ROWS_PER_PAGE,
+    GRID_TILE_WIDTH,
+)
+from .frames import decode_frame
+
+Color = Tuple[int, int, int]
+
+
+def get_colormap(name: str = DEFAULT_COLORMAP):
+    return matplotlib.colormaps[name]
+
+
+def add_polygon_collection(
+    ax,
+    polygons: Iterable[np.ndarray],
+    values: Sequence[float],
+    cmap=None,
+    norm: Optional[Normalize] = None,
+    alpha: float = 0.4,
+    linewidth: float = 1.0,
+) -> PolyCollection:
+    """Draw all polygons on `ax` as one collection, colored by `values`.
+
+    Looks the same as one `ax.fill` per polygon (faces and edges in the value's
+    color, drawn in order) but is a single artist, so it renders in one pass.
+    """
+    cmap = cmap or get_colormap()
+    values = np.asarray(values)
+    norm = norm or Normalize(vmin=values.min(), vmax=values.max())
+    colors = cmap(norm(values))
+    collection = PolyCollection(
+        list(polygons),
+        facecolors=colors,
+        edgecolors=colors,
+        linewidths=linewidth,
+        alpha=alpha,
+    )
+    ax.add_collection(collection)
+    return collection
+
+
+def rasterize_polygons(
+    polygons: Iterable[np.ndarray],
+    values: Sequence[float],
+    shape: Tuple[int, int],
+    lowest_on_top: bool = True,
+) -> np.ndarray:
+    """Fill polygons into a float32 raster of their values (NaN where none).
+
+    With lowest_on_top each pixel ends up with the lowest value of the polygons
+    covering it (polygons are filled from the highest value down), so the
+    result does not depend on the input order.
+    """
+    polygons = list(polygons)
+    values = np.asarray(values, np.float64)
+    raster = np.full(shape, np.nan, np.float32)
+    order = np.argsort(-values if lowest_on_top else values, kind="stable")
+    for i in order:
+        cv2.fillPoly(raster, [polygons[i].astype(np.int32)], float(values[i]))
+    return raster
+
+
+def colorize(
+    raster: np.ndarray,
+    cmap=None,
+    norm: Optional[Normalize] = None,
+    background: Optional[np.ndarray] = None,
+    alpha: float = 1.0,
+) -> np.ndarray:
+    """Map a value raster to RGB, blended over `background` where it has values."""
+    cmap = cmap or get_colormap()
+    norm = norm or Normalize(vmin=np.nanmin(raster), vmax=np.nanmax(raster))
+    has_value = ~np.isnan(raster)
+    rgb = (
+        np.array(background, np.uint8)[..., :3]
+        if background is not None
+        else np.full(raster.shape + (3,), 255, np.uint8)
+    )
+    colors = cmap(norm(raster[has_value]), bytes=True)[:, :3]
+    rgb[has_value] = (alpha * colors + (1 - alpha) * rgb[has_value]).astype(np.uint8)
+    return rgb
+
+
+def overlay_mask(
+    image: np.ndarray, mask: np.ndarray, color: Color = (0, 255, 255), alpha=0.4
+) -> np.ndarray:
+    """Blend `color` into an RGB image wherever the mask is set."""
+    result = image.copy()
+    result[mask] = (alpha * np.array(color) + (1 - alpha) * image[mask]).astype(
+        np.uint8
+    )
+    return result
+
+
+def load_thumbnail(image_path: Union[str, Path], width: int) -> np.ndarray:
+    """Load an image scaled to `width`, letting the JPEG decoder downscale first."""
+    return decode_frame(image_path, width)
+
+
+def placeholder_tile(width: int = GRID_TILE_WIDTH) -> np.ndarray:
+    """A plain gray tile standing in for a missing image."""
+    return np.full((width * 9 // 16, width, 3), 230, np.uint8)
+
+
+def overlay_resized_mask(
+    tile: np.ndarray, mask: np.ndarray, color: Color = (0, 255, 255), alpha=0.5
+) -> np.ndarray:
+    """Overlay a full-resolution mask on a thumbnail, resizing the mask to fit."""
+    small_mask = cv2.resize(
+        mask.astype(np.uint8),
+        (tile.shape[1], tile.shape[0]),
+        interpolation=cv2.INTER_NEAREST,
+    ).astype(bool)
+    return overlay_mask(tile, small_mask, color, alpha)
+
+
+def make_tile(
+    image_path: Union[str, Path],
+    mask: Optional[np.ndarray],
+    width: int = GRID_TILE_WIDTH,
+    color: Color = (0, 255, 255),
+    alpha: float = 0.5,
+) -> np.ndarray:
+    """A thumbnail of an image with its mask overlaid (gray if the image is missing)."""
+    if not Path(image_path).exists():
+        return placeholder_tile(width)
+    tile = load_thumbnail(image_path, width)
+    if mask is not None:
+        tile = overlay_resized_mask(tile, mask, color, alpha)
+    return tile
+
+
+def _label(tile: np.ndarray, lines: List[str], color: Color) -> np.ndarray:
+    """Put a white title band with the label lines above a tile."""
+    line_height = 18
+    band = np.full((line_height * len(lines) + 6, tile.shape[1], 3), 255, np.uint8)
+    for i, line in enumerate(lines):
+        cv2.putText(
+            band,
+            line,
+            (4, line_height * (i + 1)),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            color,
+            1,
+            cv2.LINE_AA,
+        )
+    cell = np.vstack([band, tile])
+    # Separate cells with a thin white border
+    cell[:2], cell[-2:], cell[:, :2], cell[:, -2:] = 255, 255, 255, 255
+    return cell
+
+
+def render_grid_pages(
+    tiles: Iterable[Tuple[np.ndarray, List[str], Color]],
+    output_dir: Union[str, Path],
+    n_cols: int = GRID_COLUMNS,
+    n_rows: int = GRID_ROWS_PER_PAGE,
+    prefix: str = "page",
+    first_page: int = 0,
+) -> Iterator[Path]:
+    """Lay out (tile, label lines, label RGB color) items in pages of n_rows x n_cols.
+
+    Tiles are consumed lazily and each page is written as soon as it is full,
+    so memory holds one page no matter how many frames there are. Yields the
+    path of every page image; pages are numbered from `first_page`, so a
+    single page can be rendered on its own from just its rows.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    per_page = n_cols * n_rows
+    cells: List[np.ndarray] = []
+    page_number = first_page
+
+    def write_page() -> Path:
+        blank = np.full_like(cells[0], 255)
+        n_filled_rows = -(-len(cells) // n_cols)
+        padded = cells + [blank] * (n_filled_rows * n_cols - len(cells))
+        rows = [
+            np.hstack(padded[r * n_cols : (r + 1) * n_cols])
+            for r in range(n_filled_rows)
+        ]
+        path = output_dir / f"{prefix}_{page_number:03d}.jpg"
+        cv2.imwrite(str(path), cv2.cvtColor(np.vstack(rows), cv2.COLOR_RGB2BGR))
+        return path
+
+    for tile, lines, color in tiles:
+        cell = _label(tile, lines, color)
+        if cells and cell.shape != cells[0].shape:
+            cell = cv2.resize(cell, (cells[0].shape[1], cells[0].shape[0]))
+        cells.append(cell)
+        if len(cells) == per_page:
+            yield write_page()
+            cells = []
+            page_number += 1
+    if cells:
+        yield write_page()
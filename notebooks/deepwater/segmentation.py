@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .config import (
+    SAM_VIDEO_DIR,
+    SEGMENTATION_CHECKPOINT_FILE,
+    SEGMENTATION_PROMPTS_FILE,
+    SEGMENTATION_WINDOW_OVERLAP,
+    SEGMENTATION_WINDOW_SIZE,
+)
+from .mask_store import MaskStore, MaskStoreWriter, get_mask_store_path
+
+
+class Prompt(NamedTuple):
+    """Clicks on one object in one frame (frame_idx counts all images, in order)."""
+
+    frame_idx: int
+    obj_id: int
+    points: np.ndarray
+    labels: np.ndarray
+
+
+def get_window_dir(camera_dir: Union[str, Path]) -> Path:
+    return Path(camera_dir) / SAM_VIDEO_DIR / "window"
+
+
+def link_frames(image_paths: Sequence[Union[str, Path]], video_dir: Union[str, Path]):
+    """Symlink images into `video_dir` as 00000.jpg, 00001.jpg, ... for SAM 2.
+
+    Frames linked by an earlier call are removed first, so the directory holds
+    exactly these images.
+    """
+    video_dir = Path(video_dir)
+    video_dir.mkdir(parents=True, exist_ok=True)
+    for path in video_dir.glob("*.jpg"):
+        path.unlink()
+    for i, image_path in enumerate(image_paths):
+        os.symlink(os.path.abspath(image_path), video_dir / f"{i:05d}.jpg")
+
+
+def get_windows(
+    n_frames: int, window_size: int, overlap: int, start: int = 0
+) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) of windows covering frames `start` to `n_frames`.
+
+    Every window after the first begins `overlap` frames before the previous
+    one ended, so each one can be seeded with the masks of those frames.
+    """
+    if not 0 < overlap < window_size:
+        raise ValueError("overlap must be at least 1 and less than window_size")
+    end = min(start + window_size, n_frames)
+    yield start, end
+    while end < n_frames:
+        start = end - overlap
+        end = min(start + window_size, n_frames)
+        yield start, end
+
+
+def save_prompts(camera_dir: Union[str, Path], prompts: Sequence[Prompt]) -> None:
+    """Save the prompts of a camera, so its segmentation can be continued later."""
+    items = [
+        {
+            "frame_idx": int(p.frame_idx),
+            "obj_id": int(p.obj_id),
+            "points": np.asarray(p.points, np.float32).tolist(),
+            "labels": np.asarray(p.labels, np.int32).tolist(),
+        }
+        for p in prompts
+    ]
+    _write_json(Path(camera_dir) / SEGMENTATION_PROMPTS_FILE, items)
+
+
+def load_prompts(camera_dir: Union[str, Path]) -> List[Prompt]:
+    """Load the prompts saved by save_prompts."""
+    with open(Path(camera_dir) / SEGMENTATION_PROMPTS_FILE) as f:
+        items = json.load(f)
+    return [
+        Prompt(
+            item["frame_idx"],
+            item["obj_id"],
+            np.array(item["points"], np.float32),
+            np.array(item["labels"], np.int32),
+        )
+        for item in items
+    ]
+
+
+def get_prompts_fingerprint(prompts: Sequence[Prompt]) -> str:
+    """Hash the prompts, to tell whether a checkpoint was made with the same ones."""
+    items = sorted(
+        (
+            int(p.frame_idx),
+            int(p.obj_id),
+            np.asarray(p.points, np.float32).tolist(),
+            np.asarray(p.labels, np.int32).tolist(),
+        )
+        for p in prompts
+    )
+    return hashlib.blake2b(json.dumps(items).encode(), digest_size=16).hexdigest()
+
+
+def _read_checkpoint(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _get_resume_frame(
+    camera_dir: Path, image_files: List[str], obj_ids: List[int], fingerprint: str
+) -> int:
+    """The first frame some object's mask store is missing, or 0 to start over.
+
+    Runs only resume if the checkpoint was made with the same prompts and every
+    store holds masks for a prefix of `image_files` (new images may have been
+    added at the end since).
+    """
+    checkpoint = _read_checkpoint(camera_dir / SEGMENTATION_CHECKPOINT_FILE)
+    if checkpoint is None or checkpoint["prompts"] != fingerprint:
+        return 0
+    n_done = []
+    for obj_id in obj_ids:
+        path = get_mask_store_path(camera_dir, obj_id)
+        if not path.exists():
+            return 0
+        with MaskStore(path) as store:
+            if store.names != image_files[: len(store)]:
+                return 0
+            n_done.append(len(store))
+    return min(n_done)
+
+
+def _load_seed_masks(
+    camera_dir: Path, obj_ids: List[int], start: int, end: int
+) -> List[Dict[int, np.ndarray]]:
+    if start >= end:
+        return []
+    stores = {
+        obj_id: MaskStore(get_mask_store_path(camera_dir, obj_id)) for obj_id in obj_ids
+    }
+    seeds = [
+        {obj_id: stores[obj_id][i] for obj_id in obj_ids} for i in range(start, end)
+    ]
+    for store in stores.values():
+        store.close()
+    return seeds
+
+
+def segment_windowed(
+    predictor,
+    images_dir: Union[str, Path],
+    image_files: Sequence[str],
+    prompts: Sequence[Prompt],
+    camera_dir: Union[str, Path],
+    window_size: int = SEGMENTATION_WINDOW_SIZE,
+    overlap: int = SEGMENTATION_WINDOW_OVERLAP,
+    resume: bool = True,
+    offload_state_to_cpu: bool = False,
+    async_loading_frames: bool = True,
+) -> int:
+    """Propagate SAM 2 masks through an image sequence in overlapping windows.
+
+    Instead of one inference state over every frame, SAM 2 is run on
+    `window_size` frames at a time, so memory stays bounded however long the
+    sequence is. The first window is seeded with the prompts on frame 0; each
+    later one with the masks of the `overlap` frames it shares with the
+    previous window, plus any prompts that fall inside it. Masks are appended
+    to each object's mask store as frames come out of the predictor, and a
+    checkpoint is written after every window. With `resume`, a run with the
+    same prompts continues after the last saved frame; changed prompts start
+    over. With `async_loading_frames`, SAM 2 decodes each window's frames in
+    a background thread while propagation starts, instead of all up front.
+    Returns the number of frames segmented by this call.
+    """
+    camera_dir = Path(camera_dir)
+    image_files = list(image_files)
+    obj_ids = sorted({p.obj_id for p in prompts})
+    fingerprint = get_prompts_fingerprint(prompts)
+    checkpoint_path = camera_dir / SEGMENTATION_CHECKPOINT_FILE
+
+    next_frame = (
+        _get_resume_frame(camera_dir, image_files, obj_ids, fingerprint)
+        if resume
+        else 0
+    )
+    if next_frame == 0 and not any(p.frame_idx == 0 for p in prompts):
+        raise ValueError("the first frame needs a prompt to start segmentation")
+    if next_frame >= len(image_files):
+        print(f"All {len(image_files)} frames are already segmented")
+        return 0
+    if next_frame:
+        print(f"Resuming at frame {next_frame} of {len(image_files)}")
+    _write_json(
+        checkpoint_path,
+        {
+            "prompts": fingerprint,
+            "next_frame": next_frame,
+            "n_frames": len(image_files),
+        },
+    )
+
+    # Masks of the most recent frames, to seed the next window
+    start = max(next_frame - overlap, 0)
+    recent = deque(_load_seed_masks(camera_dir, obj_ids, start, next_frame), overlap)
+    writers = {
+        obj_id: MaskStoreWriter(
+            get_mask_store_path(camera_dir, obj_id), overwrite=next_frame == 0
+        )
+        for obj_id in obj_ids
+    }
+    window_dir = get_window_dir(camera_dir)
+    n_written = 0
+    try:
+        for start, end in get_windows(len(image_files), window_size, overlap, start):
+            link_frames(
+                [os.path.join(images_dir, f) for f in image_files[start:end]],
+                window_dir,
+            )
+            state = predictor.init_state(
+                video_path=str(window_dir),
+                offload_video_to_cpu=True,
+                offload_state_to_cpu=offload_state_to_cpu,
+                async_loading_frames=async_loading_frames,
+            )
+            for i, masks in enumerate(recent):
+                for obj_id, mask in masks.items():
+                    predictor.add_new_mask(state, frame_idx=i, obj_id=obj_id, mask=mask)
+            for p in prompts:
+                if start <= p.frame_idx < end and p.frame_idx >= next_frame:
+                    predictor.add_new_points_or_box(
+                        state,
+                        frame_idx=p.frame_idx - start,
+                        obj_id=p.obj_id,
+                        points=p.points,
+                        labels=p.labels,
+                    )
+
+            for (
+                out_frame_idx,
+                out_obj_ids,
+                out_mask_logits,
+            ) in predictor.propagate_in_video(state):
+                frame = start + out_frame_idx
+                masks = {
+                    obj_id: (out_mask_logits[i] > 0.0).cpu().numpy().squeeze(0)
+                    for i, obj_id in enumerate(out_obj_ids)
+                }
+                if frame >= next_frame:
+                    empty = np.zeros_like(next(iter(masks.values())))
+                    for obj_id, writer in writers.items():
+                        writer.append(image_files[frame], masks.get(obj_id, empty))
+                    n_written += 1
+                recent.append(masks)
+
+            predictor.reset_state(state)
+            del state
+            for writer in writers.values():
+                writer.flush()
+            next_frame = end
+            _write_json(
+                checkpoint_path,
+                {
+                    "prompts": fingerprint,
+                    "next_frame": end,
+                    "n_frames": len(image_files),
+                },
+            )
+            print(f"Segmented frames {start}-{end - 1} of {len(image_files)}")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_written
@@ -0,0 +1,223 @@
+import glob
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Union
+
+import cv2
+import numpy as np
+
+from .config import (
+    GRID_TILE_WIDTH,
+    THUMBNAIL_DIR,
+    THUMBNAIL_JPEG_QUALITY,
+    THUMBNAIL_WIDTHS,
+    THUMBNAIL_WORKERS,
+)
+from .mask_store import MaskStore
+from .render import (
+    Color,
+    load_thumbnail,
+    overlay_resized_mask,
+    placeholder_tile,
+)
+
+
+def get_thumbnail_dir(camera_dir: Union[str, Path]) -> Path:
+    return Path(camera_dir) / THUMBNAIL_DIR
+
+
+def get_overlay_key(
+    packed: np.ndarray, shape, color: Color, alpha: float, digest_size: int = 8
+) -> str:
+    """Key an overlay by its mask content, color and opacity."""
+    digest = hashlib.blake2b(packed.tobytes(), digest_size=digest_size)
+    digest.update(repr((tuple(shape), tuple(color), float(alpha))).encode())
+    return digest.hexdigest()
+
+
+def _read_jpeg(path: Path) -> Optional[np.ndarray]:
+    if not path.exists():
+        return None
+    image = cv2.imread(str(path))
+    return None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _write_jpeg(path: Path, image: np.ndarray, quality: int) -> None:
+    """Write a JPEG atomically, so a half-written file is never read back."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    ok, data = cv2.imencode(
+        ".jpg",
+        cv2.cvtColor(image, cv2.COLOR_RGB2BGR),
+        [cv2.IMWRITE_JPEG_QUALITY, quality],
+    )
+    if not ok:
+        raise ValueError(f"could not encode {path}")
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(data.tobytes())
+    os.replace(tmp_path, path)
+
+
+class ThumbnailCache:
+    """Disk-backed thumbnails of a camera's images and their mask overlays.
+
+    Every image is kept at each width in `widths` (a small pyramid: the largest
+    level is decoded from the source JPEG, smaller ones are downsampled from
+    it). Overlays are the thumbnails with the mask already blended in, stored
+    under a hash of the mask content, color and opacity. Images are keyed by
+    name only, since downloaded images never change; a changed mask gets a
+    new key, so its stale overlay is never read and is replaced when rebuilt.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        images_dir: Union[str, Path],
+        mask_store: Optional[MaskStore] = None,
+        widths: Sequence[int] = THUMBNAIL_WIDTHS,
+        quality: int = THUMBNAIL_JPEG_QUALITY,
+    ):
+        self.root = Path(root)
+        self.images_dir = Path(images_dir)
+        self.mask_store = mask_store
+        self.widths = sorted(widths, reverse=True)
+        self.quality = quality
+
+    def _check_width(self, width: int) -> None:
+        if width not in self.widths:
+            raise ValueError(f"width {width} is not one of {self.widths}")
+
+    def image_path(self, name: str, width: int) -> Path:
+        return self.root / f"w{width}" / f"{Path(name).stem}.jpg"
+
+    def overlay_path(self, name: str, width: int, color: Color, key: str) -> Path:
+        """`{stem}.{color as hex}.{key}.jpg`, so each color has one current file."""
+        stem = f"{Path(name).stem}.{bytes(color).hex()}"
+        return self.root / "overlays" / f"w{width}" / f"{stem}.{key}.jpg"
+
+    def overlay_key(self, name: str, color: Color, alpha: float) -> str:
+        return get_overlay_key(
+            self.mask_store.get_packed(name), self.mask_store.shape, color, alpha
+        )
+
+    def has_mask(self, name: str) -> bool:
+        return self.mask_store is not None and name in self.mask_store
+
+    def _build_pyramid(self, name: str) -> Dict[int, np.ndarray]:
+        levels = {}
+        image = load_thumbnail(self.images_dir / name, self.widths[0])
+        for width in self.widths:
+            if width != image.shape[1]:
+                height = round(image.shape[0] * width / image.shape[1])
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+            _write_jpeg(self.image_path(name, width), image, self.quality)
+            levels[width] = image
+        return levels
+
+    def get_image(self, name: str, width: int = GRID_TILE_WIDTH) -> np.ndarray:
+        """The thumbnail of an image, building its pyramid on first use."""
+        self._check_width(width)
+        image = _read_jpeg(self.image_path(name, width))
+        if image is None:
+            image = self._build_pyramid(name)[width]
+        return image
+
+    def get_overlay(
+        self,
+        name: str,
+        width: int = GRID_TILE_WIDTH,
+        color: Color = (0, 255, 255),
+        alpha: float = 0.5,
+        key: Optional[str] = None,
+    ) -> np.ndarray:
+        """The thumbnail of an image with its mask overlaid, built on first use."""
+        self._check_width(width)
+        key = key or self.overlay_key(name, color, alpha)
+        path = self.overlay_path(name, width, color, key)
+        overlay = _read_jpeg(path)
+        if overlay is None:
+            overlay = overlay_resized_mask(
+                self.get_image(name, width), self.mask_store[name], color, alpha
+            )
+            # Drop the overlay of an earlier version of this mask
+            stale = glob.escape(str(path.with_suffix("").with_suffix(""))) + ".*.jpg"
+            for old_path in glob.glob(stale):
+                os.remove(old_path)
+            _write_jpeg(path, overlay, self.quality)
+        return overlay
+
+    def get_tile(
+        self,
+        name: str,
+        width: int = GRID_TILE_WIDTH,
+        color: Color = (0, 255, 255),
+        alpha: float = 0.5,
+    ) -> np.ndarray:
+        """Like render.make_tile, but cached: the overlay if the image has a
+        mask, the plain thumbnail if not, a gray tile if the image is missing."""
+        if not (self.images_dir / name).exists():
+            return placeholder_tile(width)
+        if self.has_mask(name):
+            return self.get_overlay(name, width, color, alpha)
+        return self.get_image(name, width)
+
+    def build(
+        self,
+        names: Sequence[str],
+        width: int = GRID_TILE_WIDTH,
+        colors: Sequence[Color] = ((0, 255, 255),),
+        alpha: float = 0.5,
+        workers: int = THUMBNAIL_WORKERS,
+    ) -> int:
+        """Build the thumbnails and overlays the review grids need, in parallel.
+
+        Only missing files are built: images whose pyramid is incomplete and
+        overlays whose mask changed or was never rendered in `colors`. Names
+        without an image are skipped. Returns the number of images processed.
+        """
+        self._check_width(width)
+        names = list(names)
+        todo, n_missing = [], 0
+        for name in names:
+            if not (self.images_dir / name).exists():
+                n_missing += 1
+                continue
+            missing_image = not all(
+                self.image_path(name, w).exists() for w in self.widths
+            )
+            missing_overlays = [
+                color
+                for color in colors
+                if self.has_mask(name)
+                and not self.overlay_path(
+                    name, width, color, self.overlay_key(name, color, alpha)
+                ).exists()
+            ]
+            if missing_image or missing_overlays:
+                todo.append((name, missing_image, missing_overlays))
+        n_cached = len(names) - len(todo) - n_missing
+        print(f"Building thumbnails for {len(todo)} images ({n_cached} cached)")
+
+        def build_one(item):
+            name, missing_image, missing_overlays = item
+            if missing_image:
+                self._build_pyramid(name)
+            for color in missing_overlays:
+                self.get_overlay(name, width, color, alpha)
+
+        # Decoding, resizing and JPEG encoding release the GIL, so threads scale
+        with ThreadPoolExecutor(workers) as executor:
+            for _ in executor.map(build_one, todo):
+                pass
+        return len(todo)
+
+
+def open_thumbnail_cache(
+    camera_dir: Union[str, Path],
+    mask_store: Optional[MaskStore] = None,
+    images_dir: Optional[Union[str, Path]] = None,
+) -> ThumbnailCache:
+    """The thumbnail cache of a camera directory (`{camera_dir}/thumbnails`)."""
+    images_dir = images_dir or Path(camera_dir) / "images"
+    return ThumbnailCache(get_thumbnail_dir(camera_dir), images_dir, mask_store)
@@ -0,0 +1,167 @@
+"""Benchmark the NIMS clients against a local fake NIMS server.
+
+Reports listing pages/sec, downloads/sec, bytes/sec, retry overhead and peak
+Python memory for get_image_list, download_image and download_images_for_camera.
+
+    python benchmarks/bench_client.py --latency 0.02 --error-rate 0.01
+    python benchmarks/bench_client.py --save baseline.json
+    python benchmarks/bench_client.py --compare baseline.json   # exits 1 on regression
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+
+from pynims.config import NIMS_CAMERA_BASE_URL_ENV_VAR, NIMS_IMAGE_BASE_URL_ENV_VAR
+from pynims.fake_server import FakeNIMSServer
+
+# Metrics where bigger is better; a drop beyond the tolerance is a regression
+THROUGHPUT_METRICS = ("pages_per_sec", "downloads_per_sec", "bytes_per_sec")
+
+
+def measure(server, fn):
+    """Run fn() and return wall time, peak traced memory and the server counters it caused."""
+    before = Counter(server.stats)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    delta = Counter(server.stats)
+    delta.subtract(before)
+    return elapsed, peak, delta
+
+
+def summarize(name, elapsed, peak, delta):
+    requests = sum(v for k, v in delta.items() if k.startswith("requests."))
+    errors = sum(v for k, v in delta.items() if k.startswith("errors."))
+    downloads = delta["requests.image"] - delta["errors.image"]
+    result = {
+        "seconds": elapsed,
+        "requests": requests,
+        "retries": errors,
+        "retry_overhead": errors / requests if requests else 0.0,
+        "peak_memory_mb": peak / 1e6,
+    }
+    if delta["requests.listFiles"]:
+        result["pages_per_sec"] = delta["requests.listFiles"] / elapsed
+    if downloads:
+        result["downloads_per_sec"] = downloads / elapsed
+        result["bytes_per_sec"] = delta["bytes"] / elapsed
+    print(f"\n{name}")
+    for key, value in result.items():
+        print(f"  {key:<18} {value:14.2f}")
+    return result
+
+
+def run(args):
+    from pynims.client import NIMSClient
+    from pynims.workflows import download_images_for_camera
+
+    server = FakeNIMSServer(
+        n_cameras=1,
+        images_per_camera=args.images,
+        interval=timedelta(minutes=5),
+        page_size=args.page_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        image_size=args.image_size,
+    )
+    os.environ[NIMS_CAMERA_BASE_URL_ENV_VAR] = server.camera_base_url
+    os.environ[NIMS_IMAGE_BASE_URL_ENV_VAR] = server.image_base_url
+    camera_id = server.cameras[0]["camId"]
+    names = server.images[camera_id]
+    start, end = "2000-01-01T00:00:00Z", "2100-01-01T00:00:00Z"
+
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix="pynims-bench-")
+    with server:
+        with NIMSClient() as client:
+            results["get_image_list"] = summarize(
+                f"get_image_list ({args.images} images, page size {args.page_size})",
+                *measure(server, lambda: client.get_image_list(camera_id, start, end)),
+            )
+
+            sequential_dir = os.path.join(tmp_dir, "sequential")
+
+            def download_sequentially():
+                for name in names[: args.downloads]:
+                    client.download_image(name, sequential_dir)
+
+            results["download_image"] = summarize(
+                f"download_image x {args.downloads} (sequential)",
+                *measure(server, download_sequentially),
+            )
+
+        concurrent_dir = os.path.join(tmp_dir, "concurrent")
+        results["download_images_for_camera"] = summarize(
+            f"download_images_for_camera x {args.downloads} "
+            f"(concurrency {args.concurrency})",
+            *measure(
+                server,
+                lambda: download_images_for_camera(
+                    camera_id,
+                    names[0].split("___")[1][:-5],
+                    names[-1].split("___")[1][:-5],
+                    recursive=True,
+                    max_results=args.downloads,
+                    save_dir=concurrent_dir,
+                    concurrency=args.concurrency,
+                ),
+            ),
+        )
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for bench, metrics in baseline.items():
+        for metric in THROUGHPUT_METRICS:
+            if metric in metrics and metric in results.get(bench, {}):
+                old, new = metrics[metric], results[bench][metric]
+                if new < old * (1 - tolerance):
+                    regressions.append(
+                        f"{bench}.{metric}: {new:.1f} vs baseline {old:.1f} "
+                        f"({(new / old - 1) * 100:+.0f}%)"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=20000, help="images to list")
+    parser.add_argument("--downloads", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=200_000, help="bytes")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Micro-benchmark: batch image-name parsing vs. the scalar pynims.utils helpers.
+
+python benchmarks/bench_image_names.py --n 200000
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta, timezone
+
+from pynims.image_names import ImageNameTable, parse_image_names
+from pynims.utils import (
+    convert_nims_image_name_to_utc_date,
+    get_nims_image_name_from_date_time_and_cam_id,
+    get_utc_date_from_tl1_image_name,
+)
+
+
+def make_nims_names(n, n_cameras=20):
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        get_nims_image_name_from_date_time_and_cam_id(
+            start + timedelta(minutes=5 * i), f"STATE_Camera_{i % n_cameras:03d}"
+        )
+        for i in range(n)
+    ]
+
+
+def make_tl1_names(n):
+    start = datetime(2020, 1, 1)
+    return [
+        f"CAM___{(start + timedelta(minutes=5 * i)):%Y-%m-%d_%H-%M-%S}-000-05-00.jpg"
+        for i in range(n)
+    ]
+
+
+def bench(label, fn, repeat):
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"{label:<40} {best * 1000:10.1f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000, help="number of names")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    nims = make_nims_names(args.n)
+    tl1 = make_tl1_names(args.n)
+    print(f"{args.n} names, best of {args.repeat}")
+
+    scalar = bench(
+        "nims scalar (convert_nims_image_name...)",
+        lambda: [convert_nims_image_name_to_utc_date(n) for n in nims],
+        args.repeat,
+    )
+    batch = bench(
+        "nims batch (parse_image_names)", lambda: parse_image_names(nims), args.repeat
+    )
+    print(f"{'':<40} {scalar / batch:10.1f} x")
+
+    scalar = bench(
+        "tl1 scalar (get_utc_date_from_tl1...)",
+        lambda: [get_utc_date_from_tl1_image_name(n) for n in tl1],
+        args.repeat,
+    )
+    batch = bench(
+        "tl1 batch (parse_image_names)",
+        lambda: parse_image_names(tl1, "tl1"),
+        args.repeat,
+    )
+    print(f"{'':<40} {scalar / batch:10.1f} x")
+
+    table = ImageNameTable.from_names(nims)
+    print(
+        f"ImageNameTable: {table.nbytes / len(table):.1f} bytes/name "
+        f"vs {sum(len(n) for n in nims) / len(nims):.1f} chars/name as a list"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+import asyncio
+import httpx
+from typing import Optional, Dict, Any, AsyncIterator, List, Union
+from pathlib import Path
+from datetime import datetime, timezone
+from dateutil.parser import parse
+
+from .config import (
+    NIMS_DEFAULT_OLDEST_IMAGE_TIME,
+    DEFAULT_HTTP_TIMEOUT,
+    DEFAULT_RETRIES,
+    DEFAULT_DOWNLOAD_CONCURRENCY,
+    DOWNLOAD_CHUNK_SIZE,
+    NIMS_DEFAULT_SAVE_DIR,
+)
+from .cache import CameraMetadataCache, get_timezone
+from .client import get_base_urls, get_retry_delay
+from .download import (
+    BatchDownloadError,
+    DownloadVerificationError,
+    finalize_download,
+    finalize_unsatisfiable_range,
+    RemoteInfo,
+    get_expected_size,
+    get_partial_path,
+    get_remote_info,
+    get_resume_headers,
+    get_write_offset,
+    is_file_current,
+)
+from .metrics import Instrumentation, get_endpoint_name, get_instrumentation
+from .ratelimit import TokenBucket
+from .utils import (
+    get_cam_id_from_nims_image_name,
+    convert_nims_image_name_to_utc_date,
+)
+
+
+class AsyncNIMSClient:
+    """An asyncio client for the NIMS API, used to download many images concurrently.
+
+    All requests share a single connection pool, and at most `concurrency`
+    requests are in flight at once.
+    """
+
+    def __init__(
+        self,
+        env: str = "prod",
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+        concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+        rate_limits: Optional[Dict[str, TokenBucket]] = None,
+        camera_cache: Optional[CameraMetadataCache] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ):
+        """Initialize the AsyncNIMSClient.
+
+        `rate_limits` maps a URL prefix (e.g. the camera API or image base URL) to
+        the TokenBucket every request under that prefix must pass through.
+        """
+
+        if env not in ["prod", "dev"]:
+            raise ValueError("env must be 'prod' or 'dev'")
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.camera_base_url, self.image_base_url = get_base_urls(env)
+        self.concurrency = concurrency
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=concurrency, max_keepalive_connections=concurrency
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limits = rate_limits or {}
+        self.camera_cache = (
+            camera_cache if camera_cache is not None else CameraMetadataCache()
+        )
+        self.instrumentation = (
+            instrumentation if instrumentation is not None else get_instrumentation()
+        )
+
+    async def get_cameras(self):
+        """Retrieve a list of all cameras (and refresh the camera cache with them)."""
+        url = f"{self.camera_base_url}cameras"
+        cameras = await self._make_request(url)
+        self.camera_cache.warm(cameras)
+        return cameras
+
+    async def get_camera(self, camera_id: str):
+        """Retrieve a specific camera by its ID."""
+        camera = self.camera_cache.get(camera_id)
+        if camera is not None:
+            return camera
+        url = f"{self.camera_base_url}cameras"
+        params = {"camId": camera_id}
+        response = await self._make_request(url, params=params)
+        if response and len(response) > 0:
+            self.camera_cache.put(camera_id, response[0])
+            return response[0]
+        raise ValueError(f"Camera with ID '{camera_id}' not found")
+
+    async def iter_image_pages(
+        self,
+        camera_id: str,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+    ) -> AsyncIterator[List[str]]:
+        """Yield the images for a camera within a time range one page at a time, oldest first."""
+        if not start:
+            start = NIMS_DEFAULT_OLDEST_IMAGE_TIME
+        start = await self._format_date_range_input(start, camera_id)
+        if not end:
+            end = datetime.now(timezone.utc)
+        end = await self._format_date_range_input(end, camera_id)
+
+        url = f"{self.camera_base_url}listFiles"
+        after = start
+        seen = set()
+        while True:
+            params = {
+                "camId": camera_id,
+                "recent": "false",
+                "after": after.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "before": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }
+            page = await self._make_request(url, params)
+
+            # Consecutive pages overlap on the boundary image
+            new_images = [image for image in page if image not in seen]
+            if not new_images:
+                return
+            yield new_images
+            if len(page) <= 1:
+                return
+
+            seen = set(page)
+            after = convert_nims_image_name_to_utc_date(page[-1])
+
+    async def _format_date_range_input(self, datetimeInput, cameraId):
+        if isinstance(datetimeInput, str):
+            datetimeInput = parse(datetimeInput)
+        if datetimeInput.tzinfo is None:  # naive times are in local camera time
+            camera = await self.get_camera(cameraId)
+            datetimeInput = get_timezone(camera["tz"]).localize(datetimeInput)
+        return datetimeInput.astimezone(timezone.utc)
+
+    async def download_image(
+        self,
+        image_name: str,
+        save_dir: Optional[Union[str, Path]] = None,
+        revalidate: bool = False,
+        max_retries: int = DEFAULT_RETRIES,
+    ) -> Path:
+        """Download a NIMS image by its name and save it to the specified directory.
+
+        Streams to a `.part` file and resumes/verifies exactly like
+        NIMSClient.download_image.
+        """
+        if save_dir is None:
+            save_dir = NIMS_DEFAULT_SAVE_DIR
+
+        save_dir = Path(save_dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+
+        save_path = save_dir / image_name
+        if save_path.exists():
+            if not revalidate or await self.verify_image(image_name, save_dir):
+                print(f"{image_name} already exists -- skipping")
+                return save_path
+            save_path.unlink()
+
+        url = self._get_image_url(image_name)
+
+        for attempt in range(max_retries + 1):
+            try:
+                await self._throttle(url)
+                async with self._semaphore:
+                    return await self._stream_to_file(url, save_path)
+            except (
+                httpx.HTTPStatusError,
+                httpx.RequestError,
+                DownloadVerificationError,
+            ) as e:
+                delay = get_retry_delay(e, attempt, max_retries)
+                if delay is None:
+                    raise
+                self.instrumentation.on_retry("image", attempt, delay, e)
+                await asyncio.sleep(delay)
+
+    async def verify_image(
+        self, image_name: str, save_dir: Union[str, Path], check_hash: bool = False
+    ) -> bool:
+        """Check a downloaded image's size (and optionally MD5 ETag) with a HEAD request."""
+        save_path = Path(save_dir) / image_name
+        if not save_path.exists():
+            return False
+        response = await self._send("HEAD", self._get_image_url(image_name))
+        return is_file_current(save_path, response, check_hash)
+
+    async def get_image_info(self, image_name: str) -> RemoteInfo:
+        """Get an image's size and MD5 (when its ETag is one) with a HEAD request."""
+        response = await self._send("HEAD", self._get_image_url(image_name))
+        return get_remote_info(response)
+
+    async def get_images_info(self, image_names: List[str]) -> Dict[str, RemoteInfo]:
+        """HEAD many images concurrently."""
+        infos = await asyncio.gather(*(self.get_image_info(n) for n in image_names))
+        return dict(zip(image_names, infos))
+
+    def _get_image_url(self, image_name: str) -> str:
+        camera_id = get_cam_id_from_nims_image_name(image_name)
+        return f"{self.image_base_url}overlay/{camera_id}/{image_name}"
+
+    async def _stream_to_file(self, url: str, save_path: Path) -> Path:
+        part_path = get_partial_path(save_path)
+        headers = get_resume_headers(part_path)
+        with self.instrumentation.request("image", "GET") as record:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                record.status_code = response.status_code
+                if response.status_code != 416:
+                    response.raise_for_status()
+                    offset = get_write_offset(response, part_path)
+                    mode = "ab" if offset else "wb"
+                    f = await self._run_blocking(open, part_path, mode)
+                    try:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            await self._run_blocking(f.write, chunk)
+                            record.nbytes += len(chunk)
+                    finally:
+                        await self._run_blocking(f.close)
+
+        if response.status_code == 416:
+            saved = await self._run_blocking(
+                finalize_unsatisfiable_range, response, part_path, save_path
+            )
+            return saved or await self._stream_to_file(url, save_path)
+
+        # Hashing a large image would stall every other download on the loop
+        return await self._run_blocking(
+            finalize_download,
+            part_path,
+            save_path,
+            get_expected_size(response),
+            response.headers.get("etag"),
+        )
+
+    async def download_images(
+        self,
+        image_names: List[str],
+        save_dir: Optional[Union[str, Path]] = None,
+        revalidate: bool = False,
+    ) -> List[Path]:
+        """Download many images concurrently, returning their paths in input order.
+
+        A failed image does not stop the others; once the whole batch has finished,
+        a BatchDownloadError is raised listing every image that failed.
+        """
+        total = len(image_names)
+        completed = 0
+
+        async def _download(image_name):
+            nonlocal completed
+            save_path = await self.download_image(image_name, save_dir, revalidate)
+            completed += 1
+            print(f"image # {completed} of {total}")
+            return save_path
+
+        results = await asyncio.gather(
+            *(_download(name) for name in image_names), return_exceptions=True
+        )
+        errors = {}
+        for image_name, result in zip(image_names, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                errors[image_name] = result
+        if errors:
+            paths = [r for r in results if not isinstance(r, BaseException)]
+            raise BatchDownloadError(errors, paths)
+        return results
+
+    async def _run_blocking(self, fn, *args):
+        """Run a blocking (file IO) call in the default executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _make_request(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        max_retries: int = DEFAULT_RETRIES,
+    ) -> Dict[str, Any]:
+        response = await self._send("GET", url, params, max_retries)
+        return response.json()
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        max_retries: int = DEFAULT_RETRIES,
+    ) -> httpx.Response:
+        endpoint = get_endpoint_name(url, self.image_base_url)
+        for attempt in range(max_retries + 1):
+            try:
+                await self._throttle(url)
+                async with self._semaphore:
+                    with self.instrumentation.request(endpoint, method) as record:
+                        resp = await self.client.request(method, url, params=params)
+                        record.status_code = resp.status_code
+                        record.nbytes = len(resp.content)
+                resp.raise_for_status()
+                return resp
+            except (httpx.HTTPStatusError, httpx.RequestError) as e:
+                delay = get_retry_delay(e, attempt, max_retries)
+                if delay is None:
+                    raise
+                self.instrumentation.on_retry(endpoint, attempt, delay, e)
+                await asyncio.sleep(delay)  # backoff without holding a slot
+
+    async def _throttle(self, url: str) -> None:
+        for prefix, bucket in self.rate_limits.items():
+            if url.startswith(prefix):
+                await bucket.acquire()
+                return
+
+    async def close(self):
+        self.camera_cache.save()
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
@@ -0,0 +1,265 @@
+import asyncio
+import fnmatch
+import json
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Union
+
+from .async_client import AsyncNIMSClient
+from .client import get_base_urls
+from .cache import CameraMetadataCache
+from .config import (
+    NIMS_DEFAULT_CAMERA_CACHE_PATH,
+    NIMS_API_RATE_LIMIT,
+    NIMS_IMAGE_RATE_LIMIT,
+    DEFAULT_DOWNLOAD_CONCURRENCY,
+    DEFAULT_DOWNLOAD_QUEUE_SIZE,
+)
+from .ratelimit import TokenBucket
+from .utils import get_nims_image_timestamp
+
+
+class _Page:
+    """A listed page of images; the camera's cursor moves past it once all are handled."""
+
+    def __init__(self, n_images: int, cursor: Optional[str]):
+        self.remaining = n_images
+        self.cursor = cursor
+
+
+class CameraJob:
+    """The listing/download progress of one camera in a bulk run."""
+
+    def __init__(self, camera_id: str, save_dir: Path, state: Dict[str, Any]):
+        self.camera_id = camera_id
+        self.save_dir = save_dir
+        self.cursor: Optional[str] = state.get("cursor")
+        self.complete: bool = state.get("complete", False)
+        self.downloaded: int = state.get("downloaded", 0)
+        self.failed: Dict[str, str] = dict(state.get("failed", {}))
+        self.error: Optional[str] = None
+        self.pending: Deque[tuple] = deque()
+        self.pages: Deque[_Page] = deque()
+        self.listing_done = False
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "cursor": self.cursor,
+            "complete": self.complete,
+            "downloaded": self.downloaded,
+            "failed": self.failed,
+            "error": self.error,
+        }
+
+
+class BulkDownloadScheduler:
+    """Download a time window of images for many cameras under shared limits.
+
+    One lister per camera pages through its images into a per-camera queue,
+    and `concurrency` workers take images from those queues in round-robin
+    order so every camera makes progress. API Gateway and image-bucket
+    requests pass through separate token buckets. Each camera's progress (a
+    cursor past which nothing has been handled, and any failures) is saved
+    to `state_path` after every page so an interrupted run can be resumed.
+    Without an `end` a camera is never complete: each run lists on from its
+    cursor, picking up the images taken since the last run.
+    """
+
+    def __init__(
+        self,
+        camera_ids: List[str],
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        save_dir: Union[str, Path] = ".",
+        concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+        api_rate: float = NIMS_API_RATE_LIMIT,
+        image_rate: float = NIMS_IMAGE_RATE_LIMIT,
+        state_path: Optional[Union[str, Path]] = None,
+        queue_size: int = DEFAULT_DOWNLOAD_QUEUE_SIZE,
+        env: str = "prod",
+    ):
+        self.camera_ids = list(camera_ids)
+        self.start = start
+        self.end = end
+        self.save_dir = Path(save_dir)
+        self.concurrency = concurrency
+        self.api_rate = api_rate
+        self.image_rate = image_rate
+        self.state_path = Path(state_path) if state_path else None
+        self.queue_size = queue_size
+        self.env = env
+        self.jobs: List[CameraJob] = []
+        self._next_job = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def run(self) -> List[CameraJob]:
+        """Run (or resume) the bulk download and return the per-camera results."""
+        return asyncio.run(self.run_async())
+
+    async def run_async(self) -> List[CameraJob]:
+        state = self._load_state()
+        self.jobs = [
+            CameraJob(cam, self.save_dir / cam, state.get(cam, {}))
+            for cam in self.camera_ids
+        ]
+        self._condition = asyncio.Condition()
+
+        camera_base_url, image_base_url = get_base_urls(self.env)
+        rate_limits = {
+            camera_base_url: TokenBucket(self.api_rate),
+            image_base_url: TokenBucket(self.image_rate),
+        }
+        async with AsyncNIMSClient(
+            env=self.env,
+            concurrency=self.concurrency,
+            rate_limits=rate_limits,
+            camera_cache=CameraMetadataCache(path=NIMS_DEFAULT_CAMERA_CACHE_PATH),
+        ) as client:
+            # One request warms the timezone of every camera
+            await client.get_cameras()
+
+            listers = [
+                asyncio.ensure_future(self._list_camera(client, job))
+                for job in self.jobs
+            ]
+            workers = [
+                asyncio.ensure_future(self._download_worker(client))
+                for _ in range(self.concurrency)
+            ]
+            await asyncio.gather(*listers, *workers)
+
+        self._save_state()
+        return self.jobs
+
+    async def _list_camera(self, client: AsyncNIMSClient, job: CameraJob) -> None:
+        try:
+            # Retry what failed last time before resuming the listing
+            if job.failed:
+                await self._add_page(job, list(job.failed), job.cursor)
+                job.failed = {}
+            if not job.complete:
+                start = job.cursor or self.start
+                async for page in client.iter_image_pages(
+                    job.camera_id, start, self.end
+                ):
+                    cursor = _to_iso(get_nims_image_timestamp(page[-1]))
+                    await self._add_page(job, page, cursor)
+        except Exception as e:
+            job.error = f"listing failed -- {e}"
+            print(f"{job.camera_id}: {job.error}")
+        finally:
+            async with self._condition:
+                job.listing_done = True
+                self._condition.notify_all()
+            if not job.pages:
+                self._finish_pages(job)
+
+    async def _add_page(
+        self, job: CameraJob, images: List[str], cursor: Optional[str]
+    ) -> None:
+        page = _Page(len(images), cursor)
+        async with self._condition:
+            # Backpressure: don't list further ahead than the queue allows
+            await self._condition.wait_for(lambda: len(job.pending) < self.queue_size)
+            job.pages.append(page)
+            job.pending.extend((image, page) for image in images)
+            self._condition.notify_all()
+
+    async def _download_worker(self, client: AsyncNIMSClient) -> None:
+        while True:
+            picked = await self._pick_image()
+            if picked is None:
+                return
+            job, image, page = picked
+            try:
+                await client.download_image(image, job.save_dir)
+                job.downloaded += 1
+            except Exception as e:
+                job.failed[image] = str(e)
+                print(f"{image} failed -- {e}")
+            page.remaining -= 1
+            if page is job.pages[0]:
+                self._finish_pages(job)
+
+    async def _pick_image(self):
+        """Take the next image, visiting cameras in round-robin order."""
+        async with self._condition:
+            while True:
+                for _ in range(len(self.jobs)):
+                    job = self.jobs[self._next_job]
+                    self._next_job = (self._next_job + 1) % len(self.jobs)
+                    if job.pending:
+                        image, page = job.pending.popleft()
+                        self._condition.notify_all()
+                        return job, image, page
+                if all(job.listing_done for job in self.jobs):
+                    return None
+                await self._condition.wait()
+
+    def _finish_pages(self, job: CameraJob) -> None:
+        """Advance the camera's cursor past every fully handled page and save state."""
+        advanced = False
+        while job.pages and job.pages[0].remaining == 0:
+            page = job.pages.popleft()
+            if page.cursor is not None:
+                job.cursor = page.cursor
+            advanced = True
+        if job.listing_done and not job.pages and job.error is None:
+            # An open-ended window keeps growing, so it can only be caught up with
+            job.complete = self.end is not None
+            print(f"{job.camera_id}: done ({job.downloaded} downloaded)")
+            advanced = True
+        if advanced:
+            self._save_state()
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        state = json.loads(self.state_path.read_text())
+        if state.get("start") != _as_str(self.start) or state.get("end") != _as_str(
+            self.end
+        ):
+            print(f"{self.state_path} is for a different time window -- starting over")
+            return {}
+        return state.get("cameras", {})
+
+    def _save_state(self) -> None:
+        if self.state_path is None:
+            return
+        state = {
+            "start": _as_str(self.start),
+            "end": _as_str(self.end),
+            "cameras": {job.camera_id: job.state() for job in self.jobs},
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2))
+        tmp_path.replace(self.state_path)
+
+
+def _as_str(value: Optional[Union[str, datetime]]) -> Optional[str]:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _to_iso(nims_timestamp: str) -> str:
+    """'YYYY-MM-DDTHH-MM-SSZ' (as in image names) -> 'YYYY-MM-DDTHH:MM:SSZ'."""
+    date, time = nims_timestamp.split("T")
+    return f"{date}T{time.replace('-', ':')}"
+
+
+def select_cameras(
+    cameras: List[Dict[str, Any]],
+    camera_ids: Optional[List[str]] = None,
+    pattern: Optional[str] = None,
+) -> List[str]:
+    """Pick camera IDs from a get_cameras() response by explicit ID and/or glob pattern."""
+    selected = []
+    for camera in cameras:
+        cam_id = camera["camId"]
+        if camera_ids and cam_id not in camera_ids:
+            continue
+        if pattern and not fnmatch.fnmatch(cam_id, pattern):
+            continue
+        selected.append(cam_id)
+    return selected
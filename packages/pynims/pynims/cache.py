@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+import pytz
+
+from .config import DEFAULT_CAMERA_CACHE_TTL, DEFAULT_CAMERA_CACHE_SIZE
+
+
+@lru_cache(maxsize=None)
+def get_timezone(tz: str):
+    """Return a (shared) pytz timezone object for a tz database name."""
+    return pytz.timezone(tz)
+
+
+class CameraMetadataCache:
+    """A thread-safe LRU cache of camera metadata with per-entry expiry.
+
+    Entries expire `ttl` seconds after they are stored, and the least recently
+    used entries are evicted once more than `max_size` cameras are cached. If a
+    `path` is given the cache is loaded from, and saved to, a JSON file so it
+    survives between CLI invocations.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_CAMERA_CACHE_TTL,
+        max_size: int = DEFAULT_CAMERA_CACHE_SIZE,
+        path: Optional[Union[str, Path]] = None,
+    ):
+        """Initialize the cache, loading any unexpired entries from `path`."""
+        self.ttl = ttl
+        self.max_size = max_size
+        self.path = Path(path).expanduser() if path else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path and self.path.exists():
+            self.load()
+
+    def get(self, camera_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached camera, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(camera_id)
+            if entry is None:
+                return None
+            expires_at, camera = entry
+            if expires_at < time.time():
+                del self._entries[camera_id]
+                return None
+            self._entries.move_to_end(camera_id)
+            return camera
+
+    def put(self, camera_id: str, camera: Dict[str, Any]) -> None:
+        """Store a camera, evicting the least recently used entries if full."""
+        with self._lock:
+            self._entries[camera_id] = (time.time() + self.ttl, camera)
+            self._entries.move_to_end(camera_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def warm(self, cameras: Iterable[Dict[str, Any]]) -> None:
+        """Store every camera from a get_cameras() response."""
+        for camera in cameras:
+            self.put(camera["camId"], camera)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self) -> None:
+        """Load unexpired entries from the cache file."""
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return  # a missing or corrupt cache is just a cold cache
+        now = time.time()
+        with self._lock:
+            for camera_id, (expires_at, camera) in data.items():
+                if expires_at >= now:
+                    self._entries[camera_id] = (expires_at, camera)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Write the cache to its file (a no-op for in-memory caches)."""
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                camera_id: list(entry) for camera_id, entry in self._entries.items()
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(data))
+        tmp_path.replace(self.path)
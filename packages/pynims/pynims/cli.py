@@ -1,16 +1,76 @@
 import typer
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
 
 from pynims.workflows import (
     get_camera_list,
     save_image_list_to_file,
     download_images_for_camera,
+    plan_downloads_for_camera,
+    sync_image_list_index,
+    stream_images_for_camera,
+    download_images_for_cameras,
+)
+from pynims.metrics import RequestMetrics, set_instrumentation
+from pynims.pipeline import (
+    get_default_stages,
+    load_pipeline_config,
+    load_stages,
+    run_pipeline,
+)
+from pynims.config import (
+    DEFAULT_DOWNLOAD_CONCURRENCY,
+    DEFAULT_PIPELINE_WORKERS,
+    NIMS_API_RATE_LIMIT,
+    NIMS_IMAGE_RATE_LIMIT,
 )
 
 app = typer.Typer(help="NIMS Workflow CLI")
 
 
+def _check_positive(value: Optional[float]) -> Optional[float]:
+    if value is not None and value <= 0:
+        raise typer.BadParameter("must be greater than 0")
+    return value
+
+
+def _check_stage_sampling(site: Optional[str], stage_resolution: Optional[float]):
+    if stage_resolution is not None and site is None:
+        raise typer.BadParameter(
+            "--stage-resolution needs the gage site of the camera (--site)"
+        )
+
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    stats: bool = typer.Option(
+        False, help="Print request throughput, latency and retries at the end"
+    ),
+    stats_json: Optional[Path] = typer.Option(
+        None, help="Write request metrics to this JSON file"
+    ),
+    stats_prom: Optional[Path] = typer.Option(
+        None, help="Write request metrics to this Prometheus text file"
+    ),
+):
+    """NIMS Workflow CLI"""
+    if not (stats or stats_json or stats_prom):
+        return
+    metrics = RequestMetrics()
+    set_instrumentation(metrics)
+
+    def report():
+        if stats:
+            typer.echo(metrics.format_summary(), err=True)
+        if stats_json:
+            metrics.save_json(stats_json)
+        if stats_prom:
+            metrics.save_prometheus(stats_prom)
+
+    ctx.call_on_close(report)
+
+
 @app.command()
 def cameras(ids_only: bool = True):
     """List cameras (IDs or full info)."""
@@ -24,11 +84,16 @@ def image_list(
     camera_id: str,
     start: Optional[str] = typer.Option(None, help="Start datetime (ISO 8601)"),
     end: Optional[str] = typer.Option(None, help="End datetime (ISO 8601)"),
-    recursive: Optional[bool] = typer.Option(None, help="Use recursive fetching"),
+    recursive: Optional[bool] = typer.Option(
+        None, help="Page through the full time range"
+    ),
     max_results: Optional[int] = typer.Option(
         None, help="Max number of images to include in list"
     ),
     save_dir: Path = typer.Option("image_lists", help="Directory to save image list"),
+    index_path: Optional[Path] = typer.Option(
+        None, help="Local image-list index (SQLite) to sync and list from"
+    ),
 ):
     """Fetch and save image list for a camera."""
     save_image_list_to_file(
@@ -38,6 +103,7 @@ def image_list(
         recursive=recursive,
         max_results=max_results,
         save_dir=save_dir,
+        index_path=index_path,
     )
     typer.echo(f"Saved image list for {camera_id} to {save_dir}")
 
@@ -47,15 +113,70 @@ def download_images(
     camera_id: str,
     start: Optional[str] = typer.Option(None, help="Start datetime (ISO 8601)"),
     end: Optional[str] = typer.Option(None, help="End datetime (ISO 8601)"),
-    recursive: bool = typer.Option(False, help="Use recursive fetching"),
+    recursive: bool = typer.Option(False, help="Page through the full time range"),
     max_results: Optional[int] = typer.Option(
         None, help="Max number of images to download"
     ),
     save_dir: Optional[Path] = typer.Option(
         None, help="Parent directory to save images"
     ),
+    concurrency: int = typer.Option(
+        1, min=1, help="Number of images to download in parallel"
+    ),
+    index_path: Optional[Path] = typer.Option(
+        None, help="Local image-list index (SQLite) to sync and list from"
+    ),
+    revalidate: bool = typer.Option(
+        False, help="Re-check existing images against the server (HEAD request)"
+    ),
+    stream: bool = typer.Option(
+        False, help="Start downloading while the image list is still being fetched"
+    ),
+    dry_run: bool = typer.Option(
+        False, help="Only print what would be downloaded (same as `pynims plan`)"
+    ),
+    site: Optional[str] = typer.Option(
+        None, help="USGS gage site of the camera, for --stage-resolution"
+    ),
+    stage_resolution: Optional[float] = typer.Option(
+        None,
+        callback=_check_positive,
+        help="Only take one image per this many feet of gage height, e.g. 0.05",
+    ),
 ):
     """Download images for a camera."""
+    _check_stage_sampling(site, stage_resolution)
+    if stage_resolution is not None and stream:
+        raise typer.BadParameter("--stage-resolution needs the full list, not --stream")
+    if dry_run:
+        plan(
+            camera_id=camera_id,
+            start=start,
+            end=end,
+            recursive=recursive,
+            max_results=max_results,
+            save_dir=save_dir,
+            index_path=index_path,
+            revalidate=revalidate,
+            check_hash=False,
+            concurrency=concurrency,
+            show_names=False,
+            site=site,
+            stage_resolution=stage_resolution,
+        )
+        return
+    if stream:
+        stream_images_for_camera(
+            camera_id=camera_id,
+            start=start,
+            end=end,
+            max_results=max_results,
+            save_dir=save_dir,
+            concurrency=concurrency,
+            revalidate=revalidate,
+        )
+        typer.echo(f"Downloaded images for {camera_id}")
+        return
     download_images_for_camera(
         camera_id=camera_id,
         start=start,
@@ -63,9 +184,162 @@ def download_images(
         recursive=recursive,
         max_results=max_results,
         save_dir=save_dir,
+        concurrency=concurrency,
+        index_path=index_path,
+        revalidate=revalidate,
+        site=site,
+        stage_resolution=stage_resolution,
     )
     typer.echo(f"Downloaded images for {camera_id}")
 
 
+@app.command()
+def plan(
+    camera_id: str,
+    start: Optional[str] = typer.Option(None, help="Start datetime (ISO 8601)"),
+    end: Optional[str] = typer.Option(None, help="End datetime (ISO 8601)"),
+    recursive: bool = typer.Option(False, help="Page through the full time range"),
+    max_results: Optional[int] = typer.Option(
+        None, help="Max number of images to plan for"
+    ),
+    save_dir: Optional[Path] = typer.Option(
+        None, help="Directory the images would be saved to"
+    ),
+    index_path: Optional[Path] = typer.Option(
+        None, help="Local image-list index (SQLite) to sync and list from"
+    ),
+    revalidate: bool = typer.Option(
+        False, help="Check existing images against the server (HEAD requests)"
+    ),
+    check_hash: bool = typer.Option(
+        False, help="With --revalidate, also compare MD5s with the server's ETags"
+    ),
+    concurrency: int = typer.Option(
+        DEFAULT_DOWNLOAD_CONCURRENCY, min=1, help="HEAD requests in flight"
+    ),
+    show_names: bool = typer.Option(
+        False, "--list", help="Print every image that would be downloaded"
+    ),
+    site: Optional[str] = typer.Option(
+        None, help="USGS gage site of the camera, for --stage-resolution"
+    ),
+    stage_resolution: Optional[float] = typer.Option(
+        None,
+        callback=_check_positive,
+        help="Only take one image per this many feet of gage height, e.g. 0.05",
+    ),
+):
+    """Show which images are missing, truncated or stale locally, without downloading."""
+    _check_stage_sampling(site, stage_resolution)
+    download_plan = plan_downloads_for_camera(
+        camera_id=camera_id,
+        start=start,
+        end=end,
+        recursive=recursive,
+        max_results=max_results,
+        save_dir=save_dir,
+        index_path=index_path,
+        revalidate=revalidate,
+        check_hash=check_hash,
+        concurrency=concurrency,
+        site=site,
+        stage_resolution=stage_resolution,
+    )
+    if show_names:
+        for status in ("missing", "truncated", "stale"):
+            for image in getattr(download_plan, status):
+                typer.echo(f"{status}\t{image}")
+    typer.echo(f"{camera_id}: {download_plan.summary()}")
+
+
+@app.command()
+def download_many(
+    camera_ids: Optional[List[str]] = typer.Argument(
+        None, help="Camera IDs to download (default: all, or those matching --pattern)"
+    ),
+    pattern: Optional[str] = typer.Option(
+        None, help="Glob pattern for camera IDs, e.g. 'WI_*'"
+    ),
+    start: Optional[str] = typer.Option(None, help="Start datetime (ISO 8601)"),
+    end: Optional[str] = typer.Option(None, help="End datetime (ISO 8601)"),
+    save_dir: Path = typer.Option(
+        ".", help="Parent directory; images go to <save_dir>/<camera_id>"
+    ),
+    concurrency: int = typer.Option(
+        DEFAULT_DOWNLOAD_CONCURRENCY, min=1, help="Total requests in flight"
+    ),
+    api_rate: float = typer.Option(
+        NIMS_API_RATE_LIMIT, help="Max API Gateway requests per second"
+    ),
+    image_rate: float = typer.Option(
+        NIMS_IMAGE_RATE_LIMIT, help="Max image downloads per second"
+    ),
+    state_file: Path = typer.Option(
+        "download_state.json", help="Progress file used to resume an interrupted run"
+    ),
+):
+    """Download images for many cameras with shared concurrency and rate limits."""
+    jobs = download_images_for_cameras(
+        camera_ids=camera_ids,
+        pattern=pattern,
+        start=start,
+        end=end,
+        save_dir=save_dir,
+        concurrency=concurrency,
+        api_rate=api_rate,
+        image_rate=image_rate,
+        state_path=state_file,
+    )
+    for job in jobs:
+        status = "complete" if job.complete else (job.error or "incomplete")
+        typer.echo(
+            f"{job.camera_id}: {job.downloaded} downloaded, "
+            f"{len(job.failed)} failed, {status}"
+        )
+
+
+@app.command()
+def sync_index(
+    camera_id: str,
+    start: Optional[str] = typer.Option(None, help="Start datetime (ISO 8601)"),
+    end: Optional[str] = typer.Option(None, help="End datetime (ISO 8601)"),
+    index_path: Optional[Path] = typer.Option(
+        None, help="Local image-list index (SQLite), defaults to ~/.cache/pynims"
+    ),
+):
+    """Bring the local image-list index for a camera up to date."""
+    n_ranges = sync_image_list_index(
+        camera_id=camera_id, start=start, end=end, index_path=index_path
+    )
+    typer.echo(f"Synced {n_ranges} missing range(s) for {camera_id}")
+
+
+@app.command()
+def pipeline(
+    config: Path = typer.Argument(..., help="JSON file listing the cameras to run"),
+    stages: List[str] = typer.Option(
+        [], help="Extra stages as module:attribute, e.g. deepwater.pipeline:STAGES"
+    ),
+    workers: int = typer.Option(
+        DEFAULT_PIPELINE_WORKERS, help="Number of cameras to run at the same time"
+    ),
+):
+    """Run only new or changed images through download, join and any extra stages."""
+    all_stages = get_default_stages()
+    for spec in stages:
+        all_stages.extend(load_stages(spec))
+    results = run_pipeline(load_pipeline_config(config), all_stages, workers)
+    failed = False
+    for camera_id, result in results.items():
+        if isinstance(result, Exception):
+            failed = True
+            typer.echo(f"{camera_id}: failed -- {result}")
+        else:
+            summary = ", ".join(f"{name} {n}" for name, n in result.items())
+            typer.echo(f"{camera_id}: {summary}")
+    if failed:
+        raise typer.Exit(1)
+
+
 if __name__ == "__main__":
     app()
@@ -1,6 +1,8 @@
 import httpx
+import os
 import time
-from typing import Optional, Dict, Any, List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Union
 from pathlib import Path
 from datetime import datetime, timezone
 from dateutil.parser import parse
@@ -10,46 +12,116 @@ from .config import (
     NIMS_PROD_CAMERA_BASE_URL,
     NIMS_DEV_CAMERA_BASE_URL,
     NIMS_IMAGE_BASE_URL,
+    NIMS_CAMERA_BASE_URL_ENV_VAR,
+    NIMS_IMAGE_BASE_URL_ENV_VAR,
     NIMS_IMAGE_LIST_LIMIT,
     NIMS_DEFAULT_OLDEST_IMAGE_TIME,
+    NIMS_LIST_SHARDS_PER_WORKER,
+    NIMS_MIN_LIST_SHARD_SECONDS,
+    DEFAULT_LIST_WORKERS,
     DEFAULT_HTTP_TIMEOUT,
     DEFAULT_RETRIES,
     DEFAULT_SLEEP_MULTIPLIER,
+    DOWNLOAD_CHUNK_SIZE,
+    NIMS_DEFAULT_SAVE_DIR,
+)
+from .download import (
+    DownloadVerificationError,
+    finalize_download,
+    finalize_unsatisfiable_range,
+    get_expected_size,
+    get_partial_path,
+    get_resume_headers,
+    get_write_offset,
+    is_file_current,
 )
 
+from .cache import CameraMetadataCache, get_timezone
+from .metrics import Instrumentation, get_endpoint_name, get_instrumentation
 from .utils import (
     get_cam_id_from_nims_image_name,
     convert_nims_image_name_to_utc_date,
+    split_time_range,
 )
 
 
+def get_base_urls(env: str = "prod") -> Tuple[str, str]:
+    """Return the (camera API, image) base URLs, honoring the override environment variables."""
+    camera_base_url = (
+        NIMS_PROD_CAMERA_BASE_URL if env == "prod" else NIMS_DEV_CAMERA_BASE_URL
+    )
+    return (
+        os.environ.get(NIMS_CAMERA_BASE_URL_ENV_VAR, camera_base_url),
+        os.environ.get(NIMS_IMAGE_BASE_URL_ENV_VAR, NIMS_IMAGE_BASE_URL),
+    )
+
+
+def get_retry_delay(
+    error: Exception, attempt: int, max_retries: int = DEFAULT_RETRIES
+) -> Optional[float]:
+    """Return the backoff (in seconds) before retrying a failed request, or None to give up.
+
+    Timeouts, connection errors and downloads that failed verification are
+    retried until max_retries is reached, server errors (5xx) are retried,
+    client errors (4xx) are not.
+    Backoff is exponential: 1s, 2s, 4s, ...
+    """
+    if attempt >= max_retries:
+        return None
+    if isinstance(error, httpx.HTTPStatusError):
+        if error.response.status_code < 500:
+            return None
+    elif not isinstance(error, (httpx.RequestError, DownloadVerificationError)):
+        return None
+    return DEFAULT_SLEEP_MULTIPLIER**attempt
+
+
 class NIMSClient:
     """A client for interacting with the USGS NIMS (National Imagery Management System) API."""
 
-    def __init__(self, env: str = "prod", timeout: float = DEFAULT_HTTP_TIMEOUT):
-        """Initialize the NIMSClient."""
+    def __init__(
+        self,
+        env: str = "prod",
+        timeout: float = DEFAULT_HTTP_TIMEOUT,
+        camera_cache: Optional[CameraMetadataCache] = None,
+        instrumentation: Optional[Instrumentation] = None,
+    ):
+        """Initialize the NIMSClient.
+
+        Camera metadata is cached in `camera_cache` (an in-memory cache by default)
+        so repeated lookups, e.g. a camera's timezone, don't hit the API.
+        """
 
         if env not in ["prod", "dev"]:
             raise ValueError("env must be 'prod' or 'dev'")
 
-        self.camera_base_url = (
-            NIMS_PROD_CAMERA_BASE_URL if env == "prod" else NIMS_DEV_CAMERA_BASE_URL
-        )
-        self.image_base_url = NIMS_IMAGE_BASE_URL
+        self.camera_base_url, self.image_base_url = get_base_urls(env)
         self.client = httpx.Client(timeout=timeout)
         self.default_image_limit = NIMS_IMAGE_LIST_LIMIT
+        self.camera_cache = (
+            camera_cache if camera_cache is not None else CameraMetadataCache()
+        )
+        self.instrumentation = (
+            instrumentation if instrumentation is not None else get_instrumentation()
+        )
 
     def get_cameras(self):
-        """Retrieve a list of all cameras."""
+        """Retrieve a list of all cameras (and refresh the camera cache with them)."""
         url = f"{self.camera_base_url}cameras"
-        return self._make_request(url)
+        cameras = self._make_request(url)
+        self.camera_cache.warm(cameras)
+        return cameras
 
     def get_camera(self, camera_id: str):
         """Retrieve a specific camera by its ID."""
+        camera = self.camera_cache.get(camera_id)
+        if camera is not None:
+            return camera
         url = f"{self.camera_base_url}cameras"
         params = {"camId": camera_id}
         response = self._make_request(url, params=params)
         if response and len(response) > 0:
+            self.camera_cache.put(camera_id, response[0])
             return response[0]
         raise ValueError(f"Camera with ID '{camera_id}' not found")
 
@@ -78,17 +150,52 @@ class NIMSClient:
                 "expecting type 'str' or 'datetime.datetime' for 'after' and 'before'"
             )
 
-        # Set default recursive behavior
+        # Page through the whole range by default when both ends are given
         if recursive is None:
             recursive = start is not None and end is not None
 
         if recursive:
-            return self._fetch_image_list_recursively(
-                camera_id, start, end, max_results, []
-            )
+            return self._fetch_image_list_sharded(camera_id, start, end, max_results)
         else:
             return self._fetch_image_list_single(camera_id, start, end, max_results)
 
+    def iter_image_pages(
+        self,
+        camera_id: str,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+    ) -> Iterator[List[str]]:
+        """Yield the images for a camera within a time range one page at a time, oldest first.
+
+        Unlike get_image_list, the first page is available after a single request
+        and only one page is held in memory at a time.
+        """
+        if not camera_id:
+            raise ValueError("camera_id is required")
+        if not start:
+            start = NIMS_DEFAULT_OLDEST_IMAGE_TIME
+        start = self._format_date_range_input(start, camera_id)
+        if not end:
+            end = datetime.now(timezone.utc)
+        end = self._format_date_range_input(end, camera_id)
+        return self._iter_pages(camera_id, start, end)
+
+    def iter_image_list(
+        self,
+        camera_id: str,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        max_results: Optional[int] = None,
+    ) -> Iterator[str]:
+        """Yield the image names for a camera within a time range as each page arrives."""
+        count = 0
+        for page in self.iter_image_pages(camera_id, start, end):
+            for image in sorted(page):
+                if max_results is not None and count >= max_results:
+                    return
+                yield image
+                count += 1
+
     def _fetch_image_list_single(
         self,
         camera_id: str,
@@ -109,74 +216,140 @@ class NIMSClient:
         image_list = self._make_request(url, params)
         return sorted(image_list)
 
-    def _fetch_image_list_recursively(
+    def _fetch_image_list_sharded(
         self,
         camera_id: str,
         start: Optional[Union[str, datetime]] = None,
         end: Optional[Union[str, datetime]] = None,
         max_results: Optional[int] = None,
-        whole_image_list: Optional[List[str]] = None,
+        max_workers: int = DEFAULT_LIST_WORKERS,
     ) -> List[str]:
-        if whole_image_list is None:
-            whole_image_list = []
-
-        url = f"{self.camera_base_url}listFiles"
-        params = {"camId": camera_id, "recent": "false"}
+        """Page through every image in [start, end], fetching time shards in parallel.
 
+        The first page tells us where the camera's data actually begins (and whether
+        there is more than one page at all). The rest of the range is then split into
+        shards that are paginated concurrently and merged.
+        """
         if not start:
             start = NIMS_DEFAULT_OLDEST_IMAGE_TIME
         start = self._format_date_range_input(start, camera_id)
-        params["after"] = start.strftime("%Y-%m-%dT%H:%M:%SZ")
-
         if not end:
             end = datetime.now(timezone.utc)
         end = self._format_date_range_input(end, camera_id)
-        params["before"] = end.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        image_list = self._make_request(url, params)
 
-        # Stop if there are no new images
-        if len(image_list) <= 1:
-            return whole_image_list
+        first_page = self._fetch_image_list_page(camera_id, start, end)
 
-        latest_image_timestamp = convert_nims_image_name_to_utc_date(image_list[-1])
+        # A capped listing stops early, so it is cheaper to walk it in order
+        if max_results is not None or len(first_page) <= 1 or max_workers <= 1:
+            return self._paginate_image_list(
+                camera_id, start, end, max_results, first_page
+            )
 
-        # Extend results
-        if whole_image_list:
-            whole_image_list.extend(image_list[1:])
-        else:
-            whole_image_list = image_list
-
-        if max_results is not None and len(whole_image_list) >= max_results:
-            return whole_image_list[:max_results]
-
-        # Continue recursively
-        return self._fetch_image_list_recursively(
-            camera_id=camera_id,
-            start=latest_image_timestamp,
-            end=end,
-            max_results=max_results,
-            whole_image_list=whole_image_list,
+        data_start = max(start, convert_nims_image_name_to_utc_date(min(first_page)))
+        shards = split_time_range(
+            data_start,
+            end,
+            max_workers * NIMS_LIST_SHARDS_PER_WORKER,
+            NIMS_MIN_LIST_SHARD_SECONDS,
         )
 
+        images = set(first_page)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._paginate_image_list, camera_id, shard_start, shard_end
+                )
+                for shard_start, shard_end in shards
+            ]
+            for future in futures:
+                images.update(future.result())
+        return sorted(images)
+
+    def _paginate_image_list(
+        self,
+        camera_id: str,
+        start: datetime,
+        end: datetime,
+        max_results: Optional[int] = None,
+        first_page: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Iteratively page through [start, end] using the last image of each page as the cursor."""
+        images = []
+        for new_images in self._iter_pages(camera_id, start, end, first_page):
+            images.extend(new_images)
+            if max_results is not None and len(images) >= max_results:
+                return sorted(images)[:max_results]
+        return sorted(images)
+
+    def _iter_pages(
+        self,
+        camera_id: str,
+        start: datetime,
+        end: datetime,
+        first_page: Optional[List[str]] = None,
+    ) -> Iterator[List[str]]:
+        """Yield the images of each page in [start, end] that were not on the previous page."""
+        page = first_page
+        if page is None:
+            page = self._fetch_image_list_page(camera_id, start, end)
+
+        seen = set()
+        while True:
+            # Consecutive pages overlap on the boundary image
+            new_images = [image for image in page if image not in seen]
+            if not new_images:
+                return
+            yield new_images
+            if len(page) <= 1:
+                return
+
+            seen = set(page)
+            after = convert_nims_image_name_to_utc_date(page[-1])
+            page = self._fetch_image_list_page(camera_id, after, end)
+
+    def _fetch_image_list_page(
+        self, camera_id: str, after: datetime, before: datetime
+    ) -> List[str]:
+        url = f"{self.camera_base_url}listFiles"
+        params = {
+            "camId": camera_id,
+            "recent": "false",
+            "after": after.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "before": before.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        return self._make_request(url, params)
+
     def _format_date_range_input(self, datetimeInput, cameraId):
         if isinstance(datetimeInput, str):
             datetimeInput = parse(datetimeInput)
         if (
             datetimeInput.tzinfo is None
         ):  # assume if user doesn't pass any tz info, they want to query in local camera time
-            tz = pytz.timezone(self.get_camera_attribute(cameraId, "tz"))
+            tz = get_timezone(self.get_camera_attribute(cameraId, "tz"))
             datetimeInput = tz.localize(datetimeInput)
             datetimeInput = datetimeInput.astimezone(
                 pytz.utc
             )  # after setting to camera tz, convert to utc
         return datetimeInput
 
-    def download_image(self, image_name: str, save_dir: Optional[str] = None):
-        """Download a NIMS image by its name and save it to the specified directory."""
+    def download_image(
+        self,
+        image_name: str,
+        save_dir: Optional[str] = None,
+        revalidate: bool = False,
+        max_retries: int = DEFAULT_RETRIES,
+    ):
+        """Download a NIMS image by its name and save it to the specified directory.
+
+        The image is streamed to a `.part` file and renamed into place once its size
+        (and ETag, when it is an MD5) has been verified, so an interrupted download
+        never leaves a truncated image behind and is resumed with a Range request on
+        the next attempt. With revalidate=True an existing image is checked against
+        the server with a HEAD request and re-downloaded if it differs.
+        """
         # Set save_dir to default if None provided
         if save_dir is None:
-            save_dir = "downloaded_images/"
+            save_dir = NIMS_DEFAULT_SAVE_DIR
 
         # Create directory if it doesn't exist
         save_dir = Path(save_dir)
@@ -184,20 +357,65 @@ class NIMSClient:
 
         save_path = save_dir / image_name
         if save_path.exists():
-            print(f"{image_name} already exists -- skipping")
-            return save_path
+            if not revalidate or self.verify_image(image_name, save_dir):
+                print(f"{image_name} already exists -- skipping")
+                return save_path
+            save_path.unlink()
 
-        camera_id = get_cam_id_from_nims_image_name(image_name)
-        url = f"{self.image_base_url}overlay/{camera_id}/{image_name}"
-
-        # Download and save
-        response = self.client.get(url)
-        response.raise_for_status()
+        url = self._get_image_url(image_name)
 
-        with open(save_path, "wb") as f:
-            f.write(response.content)
-
-        return save_path  # Return where it was saved
+        for attempt in range(max_retries + 1):
+            try:
+                return self._stream_to_file(url, save_path)
+            except (
+                httpx.HTTPStatusError,
+                httpx.RequestError,
+                DownloadVerificationError,
+            ) as e:
+                delay = get_retry_delay(e, attempt, max_retries)
+                if delay is None:
+                    raise
+                self.instrumentation.on_retry("image", attempt, delay, e)
+                time.sleep(delay)
+
+    def verify_image(
+        self, image_name: str, save_dir: Union[str, Path], check_hash: bool = False
+    ) -> bool:
+        """Check a downloaded image's size (and optionally MD5 ETag) with a HEAD request."""
+        save_path = Path(save_dir) / image_name
+        if not save_path.exists():
+            return False
+        response = self._send("HEAD", self._get_image_url(image_name))
+        return is_file_current(save_path, response, check_hash)
+
+    def _get_image_url(self, image_name: str) -> str:
+        camera_id = get_cam_id_from_nims_image_name(image_name)
+        return f"{self.image_base_url}overlay/{camera_id}/{image_name}"
+
+    def _stream_to_file(self, url: str, save_path: Path) -> Path:
+        part_path = get_partial_path(save_path)
+        headers = get_resume_headers(part_path)
+        with self.instrumentation.request("image", "GET") as record:
+            with self.client.stream("GET", url, headers=headers) as response:
+                record.status_code = response.status_code
+                if response.status_code != 416:
+                    response.raise_for_status()
+                    offset = get_write_offset(response, part_path)
+                    with open(part_path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            f.write(chunk)
+                            record.nbytes += len(chunk)
+
+        if response.status_code == 416:
+            saved = finalize_unsatisfiable_range(response, part_path, save_path)
+            return saved or self._stream_to_file(url, save_path)
+
+        return finalize_download(
+            part_path,
+            save_path,
+            get_expected_size(response),
+            response.headers.get("etag"),
+        )
 
     def _make_request(
         self,
@@ -205,33 +423,33 @@ class NIMSClient:
         params: Optional[Dict[str, Any]] = None,
         max_retries: int = DEFAULT_RETRIES,
     ) -> Dict[str, Any]:
+        return self._send("GET", url, params, max_retries).json()
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        max_retries: int = DEFAULT_RETRIES,
+    ) -> httpx.Response:
+        endpoint = get_endpoint_name(url, self.image_base_url)
         for attempt in range(max_retries + 1):
             try:
-                resp = self.client.get(url, params=params)
+                with self.instrumentation.request(endpoint, method) as record:
+                    resp = self.client.request(method, url, params=params)
+                    record.status_code = resp.status_code
+                    record.nbytes = len(resp.content)
                 resp.raise_for_status()
-                return resp.json()
-
-            except httpx.TimeoutException:
-                if attempt == max_retries:
-                    raise
-                time.sleep(
-                    DEFAULT_SLEEP_MULTIPLIER**attempt
-                )  # Exponential backoff: 1s, 2s, 4s
-
-            except httpx.HTTPStatusError as e:
-                if e.response.status_code >= 500 and attempt < max_retries:
-                    time.sleep(
-                        DEFAULT_SLEEP_MULTIPLIER**attempt
-                    )  # Retry on server errors
-                    continue
-                raise  # Don't retry on client errors (4xx)
-
-            except httpx.RequestError:
-                if attempt == max_retries:
+                return resp
+            except (httpx.HTTPStatusError, httpx.RequestError) as e:
+                delay = get_retry_delay(e, attempt, max_retries)
+                if delay is None:
                     raise
-                time.sleep(DEFAULT_SLEEP_MULTIPLIER**attempt)
+                self.instrumentation.on_retry(endpoint, attempt, delay, e)
+                time.sleep(delay)
 
     def close(self):
+        self.camera_cache.save()
         self.client.close()
 
     def __enter__(self):
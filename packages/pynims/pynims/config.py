@@ -5,11 +5,57 @@ NIMS_PROD_CAMERA_BASE_URL = (
 NIMS_DEV_CAMERA_BASE_URL = "https://wnzcqxlz38.execute-api.us-east-1.amazonaws.com/dev/"
 NIMS_IMAGE_BASE_URL = "https://usgs-nims-images.s3.amazonaws.com/"
 
+# Environment variables that override the endpoints above, e.g. to point the
+# clients at a local stand-in server (see pynims.fake_server)
+NIMS_CAMERA_BASE_URL_ENV_VAR = "PYNIMS_CAMERA_BASE_URL"
+NIMS_IMAGE_BASE_URL_ENV_VAR = "PYNIMS_IMAGE_BASE_URL"
+
 # IMAGE LIST REQUEST CONSTANTS
 NIMS_IMAGE_LIST_LIMIT = 1000
 NIMS_DEFAULT_OLDEST_IMAGE_TIME = "2000-01-01T00:00Z"
+NIMS_LIST_SHARDS_PER_WORKER = 4
+NIMS_MIN_LIST_SHARD_SECONDS = 6 * 60 * 60
+DEFAULT_LIST_WORKERS = 8
+
+# IMAGE LIST INDEX CONSTANTS
+NIMS_DEFAULT_INDEX_PATH = "~/.cache/pynims/image_index.sqlite"
+NIMS_INDEX_SETTLE_SECONDS = 60 * 60  # recent ranges may still receive uploads
 
 # HTTP REQUEST CONSTANTS
 DEFAULT_HTTP_TIMEOUT = 30.0
 DEFAULT_RETRIES = 3
 DEFAULT_SLEEP_MULTIPLIER = 2
+
+# CAMERA METADATA CACHE CONSTANTS
+DEFAULT_CAMERA_CACHE_TTL = 24 * 60 * 60  # seconds
+DEFAULT_CAMERA_CACHE_SIZE = 4096
+NIMS_DEFAULT_CAMERA_CACHE_PATH = "~/.cache/pynims/cameras.json"
+
+# GAGE DATA CACHE CONSTANTS
+NIMS_DEFAULT_GAGE_CACHE_DIR = "~/.cache/pynims/gage"
+GAGE_CACHE_SETTLE_SECONDS = (
+    2 * 60 * 60
+)  # recent values may still be revised or arrive late
+DEFAULT_GAGE_TIME_TOLERANCE = 60  # seconds between an image and its gage reading
+GAGE_HEIGHT_PARAMETER = "00065"  # NWIS parameter code of gage height, in feet
+
+# PIPELINE CONSTANTS
+PIPELINE_MANIFEST_FILE = "pipeline_manifest.sqlite"  # in each camera's directory
+PIPELINE_IMAGES_AND_DATA_FILE = "images_and_data.csv"
+DEFAULT_PIPELINE_WORKERS = 2  # cameras run at the same time
+
+# RATE LIMITS (requests per second)
+NIMS_API_RATE_LIMIT = 10.0
+NIMS_IMAGE_RATE_LIMIT = 50.0
+
+# DOWNLOAD CONSTANTS
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DEFAULT_DOWNLOAD_QUEUE_SIZE = 256  # listed-but-not-downloaded images held in memory
+PARTIAL_DOWNLOAD_SUFFIX = ".part"
+NIMS_DEFAULT_SAVE_DIR = "downloaded_images/"
+INVENTORY_FILE = ".pynims_inventory.sqlite"  # in each download directory
+
+# METRICS CONSTANTS
+METRICS_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_PROMETHEUS_PREFIX = "pynims"
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+import httpx
+
+from .config import DOWNLOAD_CHUNK_SIZE, PARTIAL_DOWNLOAD_SUFFIX
+
+_MD5_ETAG = re.compile(r'^"?([0-9a-fA-F]{32})"?$')
+
+
+class DownloadVerificationError(Exception):
+    """Raised when a downloaded file does not match the server's Content-Length or ETag."""
+
+
+class BatchDownloadError(Exception):
+    """Raised after a batch of downloads finishes if any of its images failed.
+
+    `errors` maps each failed image name to its exception, and `paths` holds the
+    paths of the images that were saved.
+    """
+
+    def __init__(self, errors: Dict[str, Exception], paths: List[Path]):
+        self.errors = errors
+        self.paths = paths
+        names = ", ".join(sorted(errors))
+        super().__init__(f"{len(errors)} image(s) failed to download: {names}")
+
+
+class RemoteInfo(NamedTuple):
+    """What a HEAD request says about an image: its size and, if the ETag is one, MD5."""
+
+    size: Optional[int]
+    md5: Optional[str]
+
+
+def get_partial_path(save_path: Path) -> Path:
+    """Return the temporary path a download is streamed to before it is complete."""
+    return save_path.with_name(save_path.name + PARTIAL_DOWNLOAD_SUFFIX)
+
+
+def get_resume_headers(part_path: Path) -> Dict[str, str]:
+    """Return a Range header that resumes from the end of a partial download, if any."""
+    if part_path.exists():
+        offset = part_path.stat().st_size
+        if offset > 0:
+            return {"Range": f"bytes={offset}-"}
+    return {}
+
+
+def get_write_offset(response: httpx.Response, part_path: Path) -> int:
+    """Return the offset to write the response body at (0 if the server ignored the Range)."""
+    if response.status_code == 206 and part_path.exists():
+        return part_path.stat().st_size
+    return 0
+
+
+def get_range_total(response: httpx.Response) -> Optional[int]:
+    """Return the full size of the object from Content-Range, if the response has one."""
+    content_range = response.headers.get("content-range")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    return None
+
+
+def get_expected_size(response: httpx.Response) -> Optional[int]:
+    """Return the full size of the object from Content-Range or Content-Length."""
+    if response.headers.get("content-range"):
+        return get_range_total(response)
+    content_length = response.headers.get("content-length")
+    return int(content_length) if content_length else None
+
+
+def get_md5_from_etag(etag: Optional[str]) -> Optional[str]:
+    """Return the MD5 an ETag encodes, or None for multipart/opaque ETags."""
+    if not etag:
+        return None
+    match = _MD5_ETAG.match(etag.strip())
+    return match.group(1).lower() if match else None
+
+
+def get_remote_info(response: httpx.Response) -> RemoteInfo:
+    return RemoteInfo(
+        get_expected_size(response), get_md5_from_etag(response.headers.get("etag"))
+    )
+
+
+def get_file_md5(path: Path) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def finalize_download(
+    part_path: Path,
+    save_path: Path,
+    expected_size: Optional[int] = None,
+    etag: Optional[str] = None,
+) -> Path:
+    """Verify a completed partial download and atomically move it into place.
+
+    A short file is left in place so the next attempt can resume it with a
+    Range request; a file whose content does not match the ETag is discarded.
+    """
+    size = part_path.stat().st_size
+    if expected_size is not None and size != expected_size:
+        raise DownloadVerificationError(
+            f"{save_path.name}: expected {expected_size} bytes, got {size}"
+        )
+    expected_md5 = get_md5_from_etag(etag)
+    if expected_md5 is not None and get_file_md5(part_path) != expected_md5:
+        part_path.unlink()
+        raise DownloadVerificationError(f"{save_path.name}: ETag mismatch")
+    os.replace(part_path, save_path)
+    return save_path
+
+
+def finalize_unsatisfiable_range(
+    response: httpx.Response, part_path: Path, save_path: Path
+) -> Optional[Path]:
+    """Handle a 416 to a resume request; return the saved path, or None to start over.
+
+    A partial download as long as the object (`Content-Range: bytes */N`)
+    was already complete, so it is verified and moved into place. Any other
+    partial download no longer matches the object and is discarded.
+    """
+    if not part_path.exists():
+        return None
+    total = get_range_total(response)
+    if total is not None and part_path.stat().st_size == total:
+        return finalize_download(
+            part_path, save_path, total, response.headers.get("etag")
+        )
+    part_path.unlink()
+    return None
+
+
+def is_file_current(
+    path: Path, response: httpx.Response, check_hash: bool = False
+) -> bool:
+    """Check a local file against the headers of a HEAD response for it."""
+    expected_size = get_expected_size(response)
+    if expected_size is not None and path.stat().st_size != expected_size:
+        return False
+    if check_hash:
+        expected_md5 = get_md5_from_etag(response.headers.get("etag"))
+        if expected_md5 is not None and get_file_md5(path) != expected_md5:
+            return False
+    return True
@@ -0,0 +1,260 @@
+"""A local stand-in for the NIMS camera API and image bucket.
+
+Serves `cameras`, `listFiles` and `overlay/{cam}/{image}` from synthetic data,
+with configurable latency, page size, error rate and image size, so the
+clients can be exercised and benchmarked without touching AWS:
+
+    python -m pynims.fake_server --port 8000 --cameras 5 --images 20000
+
+and then point the clients at it with
+
+    export PYNIMS_CAMERA_BASE_URL=http://127.0.0.1:8000/api/
+    export PYNIMS_IMAGE_BASE_URL=http://127.0.0.1:8000/s3/
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from .config import NIMS_IMAGE_LIST_LIMIT
+from .utils import get_nims_image_name_from_date_time_and_cam_id
+
+API_PREFIX = "/api/"
+IMAGE_PREFIX = "/s3/overlay/"
+
+
+class FakeNIMSServer:
+    """A threaded HTTP server that mimics the NIMS endpoints.
+
+    Each camera gets `images_per_camera` images spaced `interval` apart from
+    `start`. Every request sleeps `latency` seconds and fails with a 503 with
+    probability `error_rate`. Request, error and byte counts are kept in
+    `stats` for benchmarks.
+    """
+
+    def __init__(
+        self,
+        n_cameras: int = 3,
+        images_per_camera: int = 5000,
+        start: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc),
+        interval: timedelta = timedelta(minutes=5),
+        page_size: int = NIMS_IMAGE_LIST_LIMIT,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        image_size: int = 200_000,
+        tz: str = "America/Chicago",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: Optional[int] = 0,
+    ):
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.image_size = image_size
+        self.cameras = [
+            {"camId": f"FAKE_Camera_{i:03d}", "tz": tz} for i in range(n_cameras)
+        ]
+        self.images: Dict[str, List[str]] = {
+            cam["camId"]: [
+                get_nims_image_name_from_date_time_and_cam_id(
+                    start + interval * i, cam["camId"]
+                )
+                for i in range(images_per_camera)
+            ]
+            for cam in self.cameras
+        }
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._body_cache: Dict[int, tuple] = {}
+
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def camera_base_url(self) -> str:
+        return f"{self.url}{API_PREFIX}"
+
+    @property
+    def image_base_url(self) -> str:
+        return f"{self.url}/s3/"
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def should_fail(self) -> bool:
+        with self._stats_lock:
+            return self._random.random() < self.error_rate
+
+    def list_files(self, params: Dict[str, str]) -> List[str]:
+        names = self.images.get(params.get("camId"), [])
+        limit = min(int(params.get("limit", self.page_size)), self.page_size)
+        if params.get("recent", "true") == "true" and "after" not in params:
+            return names[-limit:]
+        lo, hi = 0, len(names)
+        cam_id = params.get("camId")
+        if "after" in params:
+            lo = bisect.bisect_left(names, _name_key(cam_id, params["after"]))
+        if "before" in params:
+            hi = bisect.bisect_right(names, _name_key(cam_id, params["before"], ".~"))
+        return names[lo:hi][:limit]
+
+    def image_body(self) -> tuple:
+        """Return (body, etag) for an image; every image has the same synthetic content."""
+        size = self.image_size
+        if size not in self._body_cache:
+            body = (hashlib.sha256(b"nims").digest() * (size // 32 + 1))[:size]
+            self._body_cache[size] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+        return self._body_cache[size]
+
+    def start(self) -> "FakeNIMSServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def _name_key(cam_id: str, timestamp: str, suffix: str = "") -> str:
+    """Turn an 'after'/'before' query value into a sortable image-name prefix."""
+    dt = datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ")
+    return f"{cam_id}___{dt:%Y-%m-%dT%H-%M-%S}Z{suffix}"
+
+
+def _make_handler(server: FakeNIMSServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass  # keep benchmark output clean
+
+        def do_HEAD(self):
+            self._handle(head=True)
+
+        def do_GET(self):
+            self._handle(head=False)
+
+        def _handle(self, head: bool):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if server.latency:
+                time.sleep(server.latency)
+
+            if url.path == f"{API_PREFIX}cameras":
+                endpoint = "cameras"
+            elif url.path == f"{API_PREFIX}listFiles":
+                endpoint = "listFiles"
+            elif url.path.startswith(IMAGE_PREFIX):
+                endpoint = "image"
+            else:
+                return self._send(404, b"not found", "text/plain", head)
+
+            server.count(f"requests.{endpoint}")
+            if server.should_fail():
+                server.count(f"errors.{endpoint}")
+                return self._send(503, b"unavailable", "text/plain", head)
+
+            if endpoint == "cameras":
+                cameras = server.cameras
+                if "camId" in params:
+                    cameras = [c for c in cameras if c["camId"] == params["camId"]]
+                return self._send_json(cameras, head)
+            if endpoint == "listFiles":
+                return self._send_json(server.list_files(params), head)
+
+            cam_id, _, image_name = url.path[len(IMAGE_PREFIX) :].partition("/")
+            names = server.images.get(cam_id, [])
+            i = bisect.bisect_left(names, image_name)
+            if i == len(names) or names[i] != image_name:
+                return self._send(404, b"not found", "text/plain", head)
+            body, etag = server.image_body()
+            self._send_range(body, etag, head)
+
+        def _send_json(self, obj, head: bool):
+            self._send(200, json.dumps(obj).encode(), "application/json", head)
+
+        def _send_range(self, body: bytes, etag: str, head: bool):
+            headers = {"ETag": etag, "Accept-Ranges": "bytes"}
+            range_header = self.headers.get("Range")
+            if range_header and range_header.startswith("bytes="):
+                offset = int(range_header[len("bytes=") :].split("-")[0] or 0)
+                if offset >= len(body):
+                    headers["Content-Range"] = f"bytes */{len(body)}"
+                    return self._send(416, b"", "text/plain", head, headers)
+                headers["Content-Range"] = f"bytes {offset}-{len(body) - 1}/{len(body)}"
+                return self._send(206, body[offset:], "image/jpeg", head, headers)
+            self._send(200, body, "image/jpeg", head, headers)
+
+        def _send(self, status, body, content_type, head, headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+                server.count("bytes", len(body))
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake NIMS server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cameras", type=int, default=3)
+    parser.add_argument("--images", type=int, default=5000, help="images per camera")
+    parser.add_argument("--page-size", type=int, default=NIMS_IMAGE_LIST_LIMIT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=200_000, help="bytes")
+    args = parser.parse_args()
+
+    server = FakeNIMSServer(
+        n_cameras=args.cameras,
+        images_per_camera=args.images,
+        page_size=args.page_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        image_size=args.image_size,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Serving fake NIMS on {server.url}")
+    print(f"  export PYNIMS_CAMERA_BASE_URL={server.camera_base_url}")
+    print(f"  export PYNIMS_IMAGE_BASE_URL={server.image_base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
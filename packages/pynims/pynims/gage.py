@@ -0,0 +1,322 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from .config import (
+    DEFAULT_GAGE_TIME_TOLERANCE,
+    GAGE_CACHE_SETTLE_SECONDS,
+    GAGE_HEIGHT_PARAMETER,
+    NIMS_DEFAULT_GAGE_CACHE_DIR,
+)
+from .image_names import parse_image_names
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# A fetcher returns a site's instantaneous values in [start, end] (UTC datetimes)
+# as a DataFrame indexed by a UTC DatetimeIndex, like dataretrieval's get_record
+GageFetcher = Callable[[str, datetime, datetime], "pd.DataFrame"]
+
+
+def _import_pandas():
+    """pandas is optional (`pip install pynims[gage]`), so only import it when used."""
+    try:
+        import pandas as pd
+    except ImportError as e:
+        raise ImportError(
+            "pynims.gage needs pandas and pyarrow: pip install 'pynims[gage]'"
+        ) from e
+    return pd
+
+
+def _to_epoch(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+def _from_epoch(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _to_utc(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def nwis_fetcher(site: str, start: datetime, end: datetime) -> "pd.DataFrame":
+    """Fetch instantaneous values from NWIS with dataretrieval.
+
+    NWIS takes whole days, so the request is padded by a day on each side and
+    the result trimmed back to [start, end].
+    """
+    try:
+        import dataretrieval.nwis as nwis
+    except ImportError as e:
+        raise ImportError(
+            "fetching gage data needs dataretrieval: pip install 'pynims[gage]'"
+        ) from e
+    data_df = nwis.get_record(
+        sites=site,
+        service="iv",
+        start=(start - timedelta(days=1)).strftime("%Y-%m-%d"),
+        end=(end + timedelta(days=1)).strftime("%Y-%m-%d"),
+    )
+    data_df.index = data_df.index.tz_convert("UTC")
+    return data_df.loc[(data_df.index >= start) & (data_df.index <= end)]
+
+
+class FixtureFetcher:
+    """A fetcher serving slices of a fixed DataFrame, for tests and offline use.
+
+    Every request is recorded in `calls` as (site, start, end), so tests can
+    check which ranges a cache actually fetched.
+    """
+
+    def __init__(self, data: Union["pd.DataFrame", str, Path]):
+        pd = _import_pandas()
+        if not isinstance(data, pd.DataFrame):
+            data = pd.read_csv(data, index_col=0, parse_dates=True)
+        data.index = pd.DatetimeIndex(data.index, tz=data.index.tz or "UTC")
+        self.data = data.sort_index()
+        self.calls: List[Tuple[str, datetime, datetime]] = []
+
+    def __call__(self, site: str, start: datetime, end: datetime) -> "pd.DataFrame":
+        self.calls.append((site, start, end))
+        data = self.data
+        if "site_no" in data.columns:
+            data = data[data["site_no"].astype(str) == site]
+        return data.loc[(data.index >= start) & (data.index <= end)]
+
+
+class GageDataCache:
+    """A local, append-only cache of instantaneous-value gage series per site.
+
+    Data is stored as Parquet files under `{root}/{site}/{YYYY-MM}/`, one new
+    file per fetch and month, and never rewritten. `{root}/{site}/coverage.json`
+    records which time ranges have been fetched, so get() only asks the fetcher
+    for the gaps. Ranges ending within GAGE_CACHE_SETTLE_SECONDS of now are
+    stored but not marked complete, since recent values keep arriving.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, Path]] = None,
+        fetcher: Optional[GageFetcher] = None,
+    ):
+        """Open (or create) the cache at `root`, fetching from NWIS by default."""
+        self.root = Path(root or NIMS_DEFAULT_GAGE_CACHE_DIR).expanduser()
+        self.fetcher = fetcher or nwis_fetcher
+
+    def _site_dir(self, site: str) -> Path:
+        return self.root / site
+
+    def _load_coverage(self, site: str) -> List[Tuple[int, int]]:
+        path = self._site_dir(site) / "coverage.json"
+        if not path.exists():
+            return []
+        return [tuple(r) for r in json.loads(path.read_text())]
+
+    def _save_coverage(self, site: str, coverage: List[Tuple[int, int]]) -> None:
+        path = self._site_dir(site) / "coverage.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(coverage))
+        tmp_path.replace(path)
+
+    def mark_complete(self, site: str, start: datetime, end: datetime) -> None:
+        """Record that all data in [start, end] is cached, merging adjacent ranges."""
+        start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+        if end_ts < start_ts:
+            return
+        coverage = []
+        for s, e in self._load_coverage(site):
+            if s <= end_ts + 1 and e >= start_ts - 1:
+                start_ts, end_ts = min(start_ts, s), max(end_ts, e)
+            else:
+                coverage.append((s, e))
+        coverage.append((start_ts, end_ts))
+        self._save_coverage(site, sorted(coverage))
+
+    def missing_ranges(
+        self, site: str, start: datetime, end: datetime
+    ) -> List[Tuple[datetime, datetime]]:
+        """Return the sub-ranges of [start, end] that are not cached."""
+        start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+        gaps = []
+        cursor = start_ts
+        for s, e in self._load_coverage(site):
+            if e < start_ts or s > end_ts:
+                continue
+            if s > cursor:
+                gaps.append((cursor, s - 1))
+            cursor = max(cursor, e + 1)
+        if cursor <= end_ts:
+            gaps.append((cursor, end_ts))
+        return [(_from_epoch(s), _from_epoch(e)) for s, e in gaps]
+
+    def _append(self, site: str, data_df: "pd.DataFrame") -> None:
+        """Write fetched data as new Parquet files, one per month it spans."""
+        if data_df.empty:
+            return
+        part_name = f"{time.time_ns()}.parquet"
+        months = data_df.index.tz_convert("UTC").strftime("%Y-%m")
+        for month, month_df in data_df.groupby(months):
+            month_dir = self._site_dir(site) / month
+            month_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = month_dir / (part_name + ".tmp")
+            month_df.to_parquet(tmp_path)
+            tmp_path.replace(month_dir / part_name)
+
+    def sync(self, site: str, start: datetime, end: datetime) -> int:
+        """Fetch the missing parts of [start, end]; return how many ranges were fetched."""
+        start, end = _to_utc(start), _to_utc(end)
+        settled = datetime.now(timezone.utc) - timedelta(
+            seconds=GAGE_CACHE_SETTLE_SECONDS
+        )
+        gaps = self.missing_ranges(site, start, end)
+        for gap_start, gap_end in gaps:
+            self._append(site, self.fetcher(site, gap_start, gap_end))
+            self.mark_complete(site, gap_start, min(gap_end, settled))
+        return len(gaps)
+
+    def read(self, site: str, start: datetime, end: datetime) -> "pd.DataFrame":
+        """Return the cached data for a site in [start, end], without fetching."""
+        pd = _import_pandas()
+        start, end = _to_utc(start), _to_utc(end)
+        months = pd.period_range(
+            start.replace(tzinfo=None), end.replace(tzinfo=None), freq="M"
+        )
+        paths = [
+            path
+            for month in months
+            for path in sorted((self._site_dir(site) / str(month)).glob("*.parquet"))
+        ]
+        if not paths:
+            return pd.DataFrame(index=pd.DatetimeIndex([], tz="UTC", name="datetime"))
+        data_df = pd.concat([pd.read_parquet(path) for path in paths])
+        data_df = data_df.loc[(data_df.index >= start) & (data_df.index <= end)]
+        # Later fetches of the same (e.g. provisional) values win
+        data_df = data_df[~data_df.index.duplicated(keep="last")]
+        return data_df.sort_index()
+
+    def get(self, site: str, start: datetime, end: datetime) -> "pd.DataFrame":
+        """Like dataretrieval's get_record for [start, end], served from the cache
+        after fetching only the ranges it is missing."""
+        self.sync(site, start, end)
+        return self.read(site, start, end)
+
+
+def join_images_to_gage(
+    image_names: Sequence[str],
+    data_df: "pd.DataFrame",
+    tolerance_seconds: float = DEFAULT_GAGE_TIME_TOLERANCE,
+    drop_unmatched: bool = True,
+) -> "pd.DataFrame":
+    """Match each image to the nearest gage reading in time (images_and_data).
+
+    Image times are parsed from the names in one vectorized pass and joined
+    with a single as-of merge. Images with no reading within
+    `tolerance_seconds` are dropped, or kept with empty data columns if
+    `drop_unmatched` is False. Returns image_times, image_names, data_times,
+    the data columns and time_diff_sec, sorted by image time.
+    """
+    pd = _import_pandas()
+    image_times, _ = parse_image_names(list(image_names))
+    image_df = pd.DataFrame(
+        {
+            "image_times": pd.DatetimeIndex(image_times).tz_localize("UTC"),
+            "image_names": list(image_names),
+        }
+    ).sort_values("image_times", kind="stable")
+    data = data_df.sort_index()
+    data.index = data.index.rename("data_times")
+    data = data.reset_index()
+    data["data_times"] = data["data_times"].astype(image_df["image_times"].dtype)
+
+    merged = pd.merge_asof(
+        image_df,
+        data,
+        left_on="image_times",
+        right_on="data_times",
+        direction="nearest",
+        tolerance=pd.Timedelta(seconds=tolerance_seconds),
+    )
+    merged["time_diff_sec"] = (
+        (merged["image_times"] - merged["data_times"]).abs().dt.total_seconds()
+    )
+    if drop_unmatched:
+        merged = merged[merged["data_times"].notna()].reset_index(drop=True)
+    return merged
+
+
+def get_images_and_data(
+    image_names: Iterable[str],
+    site: str,
+    cache: Optional[GageDataCache] = None,
+    tolerance_seconds: float = DEFAULT_GAGE_TIME_TOLERANCE,
+) -> "pd.DataFrame":
+    """Join images to a site's gage data, fetching only data not already cached."""
+    image_names = list(image_names)
+    if not image_names:
+        raise ValueError("no image names to join to gage data")
+    cache = cache or GageDataCache()
+    image_times, _ = parse_image_names(image_names)
+    margin = np.timedelta64(int(np.ceil(tolerance_seconds)), "s")
+    start = (image_times.min() - margin).astype(datetime).replace(tzinfo=timezone.utc)
+    end = (image_times.max() + margin).astype(datetime).replace(tzinfo=timezone.utc)
+    data_df = cache.get(site, start, end)
+    return join_images_to_gage(image_names, data_df, tolerance_seconds)
+
+
+def sample_images_by_stage(
+    images_and_data: "pd.DataFrame",
+    resolution: float,
+    column: str = GAGE_HEIGHT_PARAMETER,
+    prefer: Iterable[str] = (),
+) -> "pd.DataFrame":
+    """Pick the fewest images that cover the range of `column` at `resolution`.
+
+    Stage values are split into bins `resolution` wide (e.g. 0.05 ft), on a
+    fixed grid so bins are the same from one call to the next, and one image
+    is kept per bin that has any. Images named in `prefer` (e.g. those already
+    downloaded) win their bin; otherwise the image closest in time to its
+    gage reading does, then the earliest. So a rerun over a longer window or
+    at a finer resolution keeps what it picked before and only adds images
+    for the bins that are new. Returns the chosen rows of images_and_data
+    (see join_images_to_gage), sorted by image time; none if no image has a
+    gage reading.
+    """
+    if resolution <= 0:
+        raise ValueError("resolution must be positive")
+    if images_and_data.empty:
+        return images_and_data.reset_index(drop=True)
+    if column not in images_and_data.columns:
+        raise ValueError(f"the gage data has no '{column}' column to sample by")
+    pd = _import_pandas()
+    stages = pd.to_numeric(images_and_data[column], errors="coerce")
+    candidates = images_and_data.assign(
+        _bin=np.floor(stages / resolution + 1e-9),
+        _not_preferred=~images_and_data["image_names"].isin(set(prefer)),
+    )
+    candidates = candidates[stages.notna()]
+    chosen = candidates.sort_values(
+        ["_bin", "_not_preferred", "time_diff_sec", "image_times"], kind="stable"
+    ).drop_duplicates("_bin")
+    return (
+        chosen.drop(columns=["_bin", "_not_preferred"])
+        .sort_values("image_times", kind="stable")
+        .reset_index(drop=True)
+    )
@@ -0,0 +1,325 @@
+import os
+from typing import Iterable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+IMAGE_NAME_FORMATS = ("nims", "tl1", "vivotek", "rise")
+
+# Deletes the separators so a timestamp collapses to its digits
+_SEPARATORS = str.maketrans("", "", "-_:TZ")
+
+
+##### Per-format field extraction (string slicing only, no datetime parsing)
+def _split_stem(imageName):
+    stem = os.path.basename(imageName)
+    return stem.rpartition(".")[0] or stem  # remove file ext
+
+
+def _nims_fields(stem):
+    # format: camId___YYYY-MM-DDTHH-MM-SSZ (UTC)
+    camId, _, timestamp = stem.rpartition("___")
+    return camId, timestamp.translate(_SEPARATORS)[:14], 0
+
+
+def _tl1_fields(stem):
+    # format: camId___YYYY-MM-DD_HH-MM-SS-ms±HH-MM (local time with offset)
+    camId, _, timestamp = stem.partition("___")
+    tz = timestamp[-5:]
+    offsetMinutes = int(tz[:2]) * 60 + int(tz[-2:])
+    if timestamp[-6] == "+":
+        offsetMinutes = -offsetMinutes
+    return camId, timestamp[:-6].translate(_SEPARATORS)[:14], offsetMinutes
+
+
+def _vivotek_fields(stem):
+    # format: [camId_]YYYYmmdd_HHMMSS (no tz)
+    parts = stem.rsplit("_", 2)
+    camId = parts[0] if len(parts) == 3 else ""
+    return camId, parts[-2] + parts[-1], 0
+
+
+def _rise_fields(stem):
+    # format: stationId_YYYYmmdd-HHMMSS (no tz)
+    stationId, dateTime = stem.split("_")
+    return stationId, dateTime.translate(_SEPARATORS), 0
+
+
+_FIELD_PARSERS = {
+    "nims": _nims_fields,
+    "tl1": _tl1_fields,
+    "vivotek": _vivotek_fields,
+    "rise": _rise_fields,
+}
+
+
+def _invalid_names_error(names: Sequence[str], bad: np.ndarray, format: str):
+    badNames = [names[i] for i in np.flatnonzero(bad)[:5]]
+    more = f" (and {bad.sum() - len(badNames)} more)" if bad.sum() > 5 else ""
+    return ValueError(
+        f"not valid '{format}' image names: {', '.join(map(repr, badNames))}{more}"
+    )
+
+
+def digits_to_datetime64(
+    digits: Sequence[str],
+    names: Optional[Sequence[str]] = None,
+    format: str = "nims",
+) -> np.ndarray:
+    """Convert 'YYYYmmddHHMMSS' strings to a datetime64[s] array in one vectorized pass.
+
+    Raises ValueError naming the entries (`names`, or else the digit strings)
+    that are not 14 digits or not a real date and time.
+    """
+    if len(digits) == 0:
+        return np.array([], dtype="datetime64[s]")
+    d = np.array(digits, dtype="S14").view(np.uint8).reshape(-1, 14) - ord("0")
+    return _fields_to_datetime64(
+        d.astype(np.int64), digits if names is None else names, format
+    )
+
+
+def _fields_to_datetime64(
+    d: np.ndarray, names: Sequence[str], format: str
+) -> np.ndarray:
+    """Convert an (N, 14) array of the digits of 'YYYYmmddHHMMSS' to datetime64[s].
+
+    Raises ValueError naming the rows of `names` that are not a valid time.
+    """
+    bad = ((d < 0) | (d > 9)).any(axis=1)
+    year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+    month = d[:, 4] * 10 + d[:, 5]
+    day = d[:, 6] * 10 + d[:, 7]
+    hour = d[:, 8] * 10 + d[:, 9]
+    minute = d[:, 10] * 10 + d[:, 11]
+    second = d[:, 12] * 10 + d[:, 13]
+    bad |= (month < 1) | (month > 12) | (day < 1) | (day > 31)
+    bad |= (hour > 23) | (minute > 59) | (second > 59)
+    if bad.any():
+        raise _invalid_names_error(names, bad, format)
+
+    months = ((year - 1970) * 12 + (month - 1)).astype("datetime64[M]")
+    days = months.astype("datetime64[D]") + (day - 1)
+    # Days past the end of their month (e.g. 02-30) roll over into the next one
+    bad = days.astype("datetime64[M]") != months
+    if bad.any():
+        raise _invalid_names_error(names, bad, format)
+    seconds = hour * 3600 + minute * 60 + second
+    return days.astype("datetime64[s]") + seconds.astype("timedelta64[s]")
+
+
+# Offsets of the 14 digits and of the separators within '___YYYY-MM-DDTHH-MM-SSZ',
+# counted from the start of the timestamp
+_NIMS_DIGIT_OFFSETS = np.array([0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18])
+_NIMS_SEPARATOR_OFFSETS = np.array([-3, -2, -1, 4, 7, 10, 13, 16, 19])
+_NIMS_SEPARATORS = np.frombuffer(b"___--T--Z", dtype=np.uint8)
+_NIMS_TIMESTAMP_LENGTH = 20
+
+
+def _parse_nims_names(imageNames: Sequence[str]):
+    """Vectorized 'nims' parser working on the names as one 2D byte array."""
+    b = np.array(imageNames, dtype="S")
+    width = b.dtype.itemsize
+    chars = b.view(np.uint8).reshape(len(b), width)
+    columns = np.arange(width)
+
+    # The timestamp ends right before the last '.', the camera id starts after the last '/'
+    lengths = np.char.str_len(b)
+    isDot = chars == ord(".")
+    extStart = np.where(
+        isDot.any(axis=1), width - 1 - np.argmax(isDot[:, ::-1], axis=1), lengths
+    )
+    isSlash = chars == ord("/")
+    camStart = np.where(
+        isSlash.any(axis=1), width - np.argmax(isSlash[:, ::-1], axis=1), 0
+    )
+    tsStart = extStart - _NIMS_TIMESTAMP_LENGTH
+    bad = tsStart - 3 < camStart
+    if bad.any():
+        raise _invalid_names_error(imageNames, bad, "nims")
+
+    rows = np.arange(len(b))[:, None]
+    separators = chars[rows, tsStart[:, None] + _NIMS_SEPARATOR_OFFSETS]
+    bad = (separators != _NIMS_SEPARATORS).any(axis=1)
+    if bad.any():
+        raise _invalid_names_error(imageNames, bad, "nims")
+    digits = chars[rows, tsStart[:, None] + _NIMS_DIGIT_OFFSETS] - ord("0")
+    times = _fields_to_datetime64(digits.astype(np.int64), imageNames, "nims")
+
+    # Left-align the camera ids (dropping any directory), zero the rest of each row,
+    # then dedupe the ids as whole rows
+    camLength = tsStart - 3 - camStart
+    if camStart.any():
+        shifted = np.minimum(camStart[:, None] + columns, width - 1)
+        camBytes = chars[rows, shifted]
+    else:
+        camBytes = chars.copy()
+    camBytes *= columns < camLength[:, None]
+    uniqueBytes, camCodes = np.unique(
+        camBytes.view(f"V{width}").ravel(), return_inverse=True
+    )
+    cameras = np.array(
+        [u.tobytes().rstrip(b"\0").decode() for u in uniqueBytes], dtype=str
+    )
+    return times, cameras, camCodes.astype(np.int32)
+
+
+def _parse_names(imageNames: Sequence[str], format: str):
+    format = format.lower()
+    if format not in _FIELD_PARSERS:
+        raise ValueError(f"format must be one of {IMAGE_NAME_FORMATS}")
+    if len(imageNames) == 0:
+        return (
+            np.array([], dtype="datetime64[s]"),
+            np.array([], dtype=str),
+            np.array([], dtype=np.int32),
+        )
+    if format == "nims":
+        try:
+            return _parse_nims_names(imageNames)
+        except UnicodeEncodeError:
+            pass  # non-ASCII names, fall back to parsing them one by one
+
+    parseFields = _FIELD_PARSERS[format]
+    camIds, digits, offsets = zip(
+        *(parseFields(_split_stem(name)) for name in imageNames)
+    )
+    times = digits_to_datetime64(digits, imageNames, format)
+    if format == "tl1":
+        times = times + np.array(offsets, dtype="timedelta64[m]")
+    cameras, camCodes = np.unique(np.array(camIds), return_inverse=True)
+    return times, cameras, camCodes.astype(np.int32)
+
+
+def parse_image_names(
+    imageNames: Sequence[str], format: str = "nims"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Parse many image names at once into (datetime64[s] times, camera ids).
+
+    Times are UTC for the 'nims' and 'tl1' formats, and the (unknown) local time
+    written in the name for 'vivotek' and 'rise'.
+    """
+    times, cameras, camCodes = _parse_names(list(imageNames), format)
+    return times, cameras[camCodes]
+
+
+def convert_image_names_to_utc_dates(imageNames: Iterable[str]) -> np.ndarray:
+    """Batch version of convert_nims_image_name_to_utc_date (naive datetime64[s], UTC)."""
+    return parse_image_names(imageNames, "nims")[0]
+
+
+def _build_nims_names(cameraIds: np.ndarray, times: np.ndarray) -> list:
+    # Same layout as get_nims_image_name_from_date_time_and_cam_id
+    stamps = np.char.replace(np.datetime_as_string(times, unit="s"), ":", "-")
+    return [
+        f"{camId}___{stamp}Z.jpg"
+        for camId, stamp in zip(cameraIds.tolist(), stamps.tolist())
+    ]
+
+
+class ImageNameTable:
+    """A compact, array-backed table of image names.
+
+    Camera ids are stored once and referenced by an integer code per image, and
+    times as datetime64[s]. NIMS names are rebuilt from those two columns on
+    demand. Other formats, and NIMS names that would not be rebuilt exactly
+    (e.g. a '.JPG' extension or a directory), also keep the original names as
+    a fixed-width byte array.
+    """
+
+    def __init__(
+        self,
+        cameras: np.ndarray,
+        camCodes: np.ndarray,
+        times: np.ndarray,
+        format: str = "nims",
+        names: Optional[np.ndarray] = None,
+    ):
+        self.cameras = cameras
+        self.camCodes = camCodes
+        self.times = times
+        self.format = format
+        self._names = names
+
+    @classmethod
+    def from_names(
+        cls, imageNames: Sequence[str], format: str = "nims"
+    ) -> "ImageNameTable":
+        imageNames = list(imageNames)
+        times, cameras, camCodes = _parse_names(imageNames, format)
+        names = None
+        if (
+            format.lower() != "nims"
+            or _build_nims_names(cameras[camCodes], times) != imageNames
+        ):
+            names = np.array([name.encode() for name in imageNames], dtype="S")
+        return cls(cameras, camCodes, times, format.lower(), names)
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def camera_ids(self) -> np.ndarray:
+        return self.cameras[self.camCodes]
+
+    @property
+    def nbytes(self) -> int:
+        total = self.cameras.nbytes + self.camCodes.nbytes + self.times.nbytes
+        return total + (self._names.nbytes if self._names is not None else 0)
+
+    def _take(self, idx) -> "ImageNameTable":
+        names = self._names[idx] if self._names is not None else None
+        return ImageNameTable(
+            self.cameras, self.camCodes[idx], self.times[idx], self.format, names
+        )
+
+    def sorted(self) -> "ImageNameTable":
+        """Return the table sorted by camera, then time."""
+        return self._take(np.lexsort((self.times, self.camCodes)))
+
+    def select(
+        self,
+        camera_id: Optional[str] = None,
+        start: Optional[Union[str, np.datetime64]] = None,
+        end: Optional[Union[str, np.datetime64]] = None,
+    ) -> "ImageNameTable":
+        """Return the rows for a camera and/or within [start, end]."""
+        keep = np.ones(len(self), dtype=bool)
+        if camera_id is not None:
+            code = np.searchsorted(self.cameras, camera_id)
+            if code == len(self.cameras) or self.cameras[code] != camera_id:
+                return self._take(np.zeros(len(self), dtype=bool))
+            keep &= self.camCodes == code
+        if start is not None:
+            keep &= self.times >= np.datetime64(start, "s")
+        if end is not None:
+            keep &= self.times <= np.datetime64(end, "s")
+        return self._take(keep)
+
+    def names(self) -> list:
+        """Return the image names as a list of str."""
+        if self._names is not None:
+            return [name.decode() for name in self._names]
+        return _build_nims_names(self.camera_ids, self.times)
+
+    def save(self, path) -> None:
+        """Save the table to a .npz file."""
+        arrays = dict(
+            cameras=self.cameras,
+            camCodes=self.camCodes,
+            times=self.times.astype(np.int64),
+            format=np.array(self.format),
+        )
+        if self._names is not None:
+            arrays["names"] = self._names
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path) -> "ImageNameTable":
+        with np.load(path) as data:
+            return cls(
+                data["cameras"],
+                data["camCodes"],
+                data["times"].astype("datetime64[s]"),
+                str(data["format"]),
+                data["names"] if "names" in data.files else None,
+            )
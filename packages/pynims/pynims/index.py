@@ -0,0 +1,220 @@
+import sqlite3
+import numpy as np
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+from .config import (
+    NIMS_DEFAULT_INDEX_PATH,
+    NIMS_DEFAULT_OLDEST_IMAGE_TIME,
+    NIMS_INDEX_SETTLE_SECONDS,
+)
+from .image_names import parse_image_names
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    cam_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (cam_id, ts, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    cam_id TEXT NOT NULL,
+    start_ts INTEGER NOT NULL,
+    end_ts INTEGER NOT NULL,
+    PRIMARY KEY (cam_id, start_ts)
+) WITHOUT ROWID;
+"""
+
+
+def _to_epoch(dt: datetime) -> int:
+    return int(dt.timestamp())
+
+
+def _from_epoch(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+class ImageListIndex:
+    """A persistent SQLite index of NIMS image names, keyed by camera and UTC timestamp.
+
+    Alongside the image names, the index records which time ranges are known
+    to be completely listed for each camera, so a sync only asks the API for
+    the gaps.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Open (or create) the index at `path`."""
+        self.path = Path(path or NIMS_DEFAULT_INDEX_PATH).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA)
+
+    def add_images(self, image_names: Iterable[str]) -> None:
+        """Insert image names, ignoring any that are already indexed."""
+        image_names = list(image_names)
+        times, cam_ids = parse_image_names(image_names)
+        rows = zip(cam_ids.tolist(), times.astype(np.int64).tolist(), image_names)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO images (cam_id, ts, name) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def mark_complete(self, camera_id: str, start: datetime, end: datetime) -> None:
+        """Record that every image in [start, end] is indexed, merging adjacent ranges."""
+        start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+        if end_ts < start_ts:
+            return
+        with self.conn:
+            overlapping = self.conn.execute(
+                "SELECT start_ts, end_ts FROM coverage "
+                "WHERE cam_id = ? AND start_ts <= ? AND end_ts >= ?",
+                (camera_id, end_ts + 1, start_ts - 1),
+            ).fetchall()
+            for s, e in overlapping:
+                start_ts, end_ts = min(start_ts, s), max(end_ts, e)
+            self.conn.execute(
+                "DELETE FROM coverage "
+                "WHERE cam_id = ? AND start_ts <= ? AND end_ts >= ?",
+                (camera_id, end_ts + 1, start_ts - 1),
+            )
+            self.conn.execute(
+                "INSERT INTO coverage (cam_id, start_ts, end_ts) VALUES (?, ?, ?)",
+                (camera_id, start_ts, end_ts),
+            )
+
+    def missing_ranges(
+        self, camera_id: str, start: datetime, end: datetime
+    ) -> List[Tuple[datetime, datetime]]:
+        """Return the sub-ranges of [start, end] that are not known to be complete."""
+        start_ts, end_ts = _to_epoch(start), _to_epoch(end)
+        covered = self.conn.execute(
+            "SELECT start_ts, end_ts FROM coverage "
+            "WHERE cam_id = ? AND start_ts <= ? AND end_ts >= ? ORDER BY start_ts",
+            (camera_id, end_ts, start_ts),
+        ).fetchall()
+
+        gaps = []
+        cursor = start_ts
+        for s, e in covered:
+            if s > cursor:
+                gaps.append((cursor, s - 1))
+            cursor = max(cursor, e + 1)
+        if cursor <= end_ts:
+            gaps.append((cursor, end_ts))
+        return [(_from_epoch(s), _from_epoch(e)) for s, e in gaps]
+
+    def query(
+        self,
+        camera_id: str,
+        start: datetime,
+        end: datetime,
+        max_results: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> List[str]:
+        """Return the indexed image names for a camera in [start, end], sorted.
+
+        With max_results, these are the oldest images of the range, or the
+        newest ones with newest_first.
+        """
+        order = "DESC" if newest_first else "ASC"
+        sql = (
+            "SELECT name FROM images WHERE cam_id = ? AND ts BETWEEN ? AND ? "
+            f"ORDER BY ts {order}, name {order}"
+        )
+        params = [camera_id, _to_epoch(start), _to_epoch(end)]
+        if max_results is not None:
+            sql += " LIMIT ?"
+            params.append(max_results)
+        names = [row[0] for row in self.conn.execute(sql, params)]
+        return names[::-1] if newest_first else names
+
+    def newest_image_time(self, camera_id: str) -> Optional[datetime]:
+        """Return the timestamp of the newest indexed image for a camera."""
+        row = self.conn.execute(
+            "SELECT MAX(ts) FROM images WHERE cam_id = ?", (camera_id,)
+        ).fetchone()
+        return _from_epoch(row[0]) if row[0] is not None else None
+
+    def sync(
+        self,
+        client,
+        camera_id: str,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        max_results: Optional[int] = None,
+        newest_first: bool = False,
+    ) -> int:
+        """Fetch the missing parts of [start, end] from the API; return how many ranges were fetched.
+
+        Ranges that end within NIMS_INDEX_SETTLE_SECONDS of now are indexed but
+        only marked complete up to the settle time, since late uploads may still
+        appear after it. Settled ranges are marked complete through their end
+        (`after` and `before` are both inclusive), so a repeat query over a
+        settled window is answered from the index alone. With max_results, gaps
+        are fetched oldest (or, with newest_first, newest) first, stopping once
+        that many images at that end of the range are indexed.
+        """
+        start, end = self._resolve_range(client, camera_id, start, end)
+        settled = datetime.now(timezone.utc) - timedelta(
+            seconds=NIMS_INDEX_SETTLE_SECONDS
+        )
+
+        gaps = self.missing_ranges(camera_id, start, end)
+        if newest_first:
+            gaps.reverse()
+        for i, (gap_start, gap_end) in enumerate(gaps):
+            self.add_images(
+                client.get_image_list(camera_id, gap_start, gap_end, recursive=True)
+            )
+            self.mark_complete(camera_id, gap_start, min(gap_end, settled))
+            if max_results is not None and i + 1 < len(gaps):
+                # Everything up to the next gap is indexed now
+                next_start, next_end = gaps[i + 1]
+                if newest_first:
+                    done = (next_end + timedelta(seconds=1), end)
+                else:
+                    done = (start, next_start - timedelta(seconds=1))
+                if len(self.query(camera_id, *done, max_results)) >= max_results:
+                    return i + 1
+        return len(gaps)
+
+    def get_image_list(
+        self,
+        client,
+        camera_id: str,
+        start: Optional[Union[str, datetime]] = None,
+        end: Optional[Union[str, datetime]] = None,
+        max_results: Optional[int] = None,
+        recursive: Optional[bool] = None,
+    ) -> List[str]:
+        """Like NIMSClient.get_image_list, but served from the index after an incremental sync.
+
+        As with the API, a capped, non-recursive listing without a start
+        returns the most recent images rather than the oldest.
+        """
+        newest_first = not start and not recursive
+        start, end = self._resolve_range(client, camera_id, start, end)
+        self.sync(client, camera_id, start, end, max_results, newest_first)
+        return self.query(camera_id, start, end, max_results, newest_first)
+
+    @staticmethod
+    def _resolve_range(client, camera_id, start, end):
+        if not start:
+            start = NIMS_DEFAULT_OLDEST_IMAGE_TIME
+        if not end:
+            end = datetime.now(timezone.utc)
+        return (
+            client._format_date_range_input(start, camera_id),
+            client._format_date_range_input(end, camera_id),
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,186 @@
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from .config import INVENTORY_FILE, PARTIAL_DOWNLOAD_SUFFIX
+from .download import RemoteInfo, get_file_md5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT
+) WITHOUT ROWID;
+"""
+
+# (size, mtime_ns, md5) of a local file; md5 is None until it is hashed
+FileRecord = Tuple[int, int, Optional[str]]
+
+
+class DownloadPlan(NamedTuple):
+    """What a download would do with each remote image name.
+
+    `missing` images are not in the directory, `truncated` ones are empty,
+    shorter than the server's copy or have a partial download to resume, and
+    `stale` ones differ from the server's copy in size or MD5. The rest are
+    `current`. Names keep the order of the remote list.
+    """
+
+    missing: List[str]
+    truncated: List[str]
+    stale: List[str]
+    current: List[str]
+
+    @property
+    def to_download(self) -> List[str]:
+        return self.missing + self.truncated + self.stale
+
+    def summary(self) -> str:
+        total = len(self.to_download) + len(self.current)
+        return (
+            f"{len(self.to_download)} of {total} images to download: "
+            f"{len(self.missing)} missing, {len(self.truncated)} truncated, "
+            f"{len(self.stale)} stale ({len(self.current)} up to date)"
+        )
+
+
+class LocalInventory:
+    """A manifest of the images in a download directory: size, mtime and MD5 per file.
+
+    The manifest is a SQLite file inside the directory. refresh() brings it up
+    to date with a single os.scandir pass, rewriting only the rows of files
+    whose size or mtime changed, so a directory is listed once instead of
+    stat-ing every image a download might skip. MD5s are only computed on
+    request and kept until the file changes.
+    """
+
+    def __init__(
+        self, directory: Union[str, Path], path: Optional[Union[str, Path]] = None
+    ):
+        """Open (or create) the inventory of `directory`, stored at `path`."""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = Path(path) if path else self.directory / INVENTORY_FILE
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA)
+        self.files: Dict[str, FileRecord] = {
+            name: (size, mtime_ns, md5)
+            for name, size, mtime_ns, md5 in self.conn.execute(
+                "SELECT name, size, mtime_ns, md5 FROM files"
+            )
+        }
+        # Names with a partial download next to them, found by refresh()
+        self.partial = set()
+
+    def refresh(self) -> Tuple[int, int]:
+        """Scan the directory and update the manifest; return (changed, removed) counts."""
+        seen = set()
+        changed = []
+        partial = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.startswith(self.path.name) or not entry.is_file():
+                    continue
+                if name.endswith(PARTIAL_DOWNLOAD_SUFFIX):
+                    partial.add(name[: -len(PARTIAL_DOWNLOAD_SUFFIX)])
+                    continue
+                seen.add(name)
+                stat = entry.stat()
+                record = self.files.get(name)
+                if record is None or record[:2] != (stat.st_size, stat.st_mtime_ns):
+                    changed.append((name, stat.st_size, stat.st_mtime_ns, None))
+        removed = [name for name in self.files if name not in seen]
+        self._update(changed, removed)
+        self.partial = partial
+        return len(changed), len(removed)
+
+    def record(self, names: Iterable[str]) -> None:
+        """Add or update files that were just written, without rescanning the directory."""
+        changed, removed = [], []
+        for name in names:
+            try:
+                stat = os.stat(self.directory / name)
+            except FileNotFoundError:
+                removed.append(name)
+                continue
+            changed.append((name, stat.st_size, stat.st_mtime_ns, None))
+            self.partial.discard(name)
+        self._update(changed, removed)
+
+    def hash(self, names: Iterable[str]) -> None:
+        """Compute the MD5 of files that do not have one recorded yet."""
+        hashed = []
+        for name in names:
+            record = self.files.get(name)
+            if record is not None and record[2] is None:
+                md5 = get_file_md5(self.directory / name)
+                hashed.append((name, record[0], record[1], md5))
+        self._update(hashed, [])
+
+    def _update(
+        self,
+        rows: List[Tuple[str, int, int, Optional[str]]],
+        removed: List[str],
+    ) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO files (name, size, mtime_ns, md5) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.executemany(
+                "DELETE FROM files WHERE name = ?", [(name,) for name in removed]
+            )
+        for name, size, mtime_ns, md5 in rows:
+            self.files[name] = (size, mtime_ns, md5)
+        for name in removed:
+            self.files.pop(name, None)
+
+    def plan(
+        self,
+        image_names: Iterable[str],
+        remote: Optional[Mapping[str, RemoteInfo]] = None,
+    ) -> DownloadPlan:
+        """Sort remote image names into missing, truncated, stale and current.
+
+        Without `remote` (size and MD5 from HEAD requests) local images are
+        only checked for being empty; with it, their size and any known MD5
+        are compared too. MD5s are only compared for files hashed beforehand.
+        """
+        remote = remote or {}
+        plan = DownloadPlan([], [], [], [])
+        for name in image_names:
+            record = self.files.get(name)
+            if record is None:
+                if name in self.partial:
+                    plan.truncated.append(name)
+                else:
+                    plan.missing.append(name)
+                continue
+            size, _, md5 = record
+            info = remote.get(name)
+            if size == 0:
+                plan.truncated.append(name)
+            elif info is None:
+                plan.current.append(name)
+            elif info.size is not None and size < info.size:
+                plan.truncated.append(name)
+            elif (info.size is not None and size != info.size) or (
+                info.md5 is not None and md5 is not None and md5 != info.md5
+            ):
+                plan.stale.append(name)
+            else:
+                plan.current.append(name)
+        return plan
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
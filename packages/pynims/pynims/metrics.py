@@ -0,0 +1,213 @@
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from .config import METRICS_LATENCY_BUCKETS, METRICS_PROMETHEUS_PREFIX
+
+
+def get_endpoint_name(url: str, image_base_url: str) -> str:
+    """Name the endpoint a URL belongs to: `image` for images, else the API route."""
+    if url.startswith(image_base_url):
+        return "image"
+    return url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def _quantile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class RequestRecord:
+    """What a single HTTP request returned, filled in by the client as it goes."""
+
+    def __init__(self, endpoint: str, method: str):
+        self.endpoint = endpoint
+        self.method = method
+        self.status_code: Optional[int] = None
+        self.nbytes = 0
+
+
+class Instrumentation:
+    """Hooks called by the NIMS clients around every HTTP request.
+
+    The base class does nothing; subclass it and override the `on_*` methods to
+    log, trace or collect metrics. Endpoints are `cameras`, `listFiles` and
+    `image` (image GET/HEAD requests).
+    """
+
+    def on_request_start(self, endpoint: str, method: str) -> None:
+        pass
+
+    def on_request_end(self, record: RequestRecord, elapsed: float) -> None:
+        """Called once per attempt; record.status_code is None if no response arrived."""
+        pass
+
+    def on_retry(
+        self, endpoint: str, attempt: int, delay: float, error: Exception
+    ) -> None:
+        pass
+
+    @contextmanager
+    def request(self, endpoint: str, method: str) -> Iterator[RequestRecord]:
+        """Time a request, calling on_request_start/on_request_end around it."""
+        record = RequestRecord(endpoint, method)
+        self.on_request_start(endpoint, method)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            self.on_request_end(record, time.perf_counter() - start)
+
+
+class _EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.status_codes: Counter = Counter()
+        self.latencies = array("d")
+
+
+class RequestMetrics(Instrumentation):
+    """Thread-safe per-endpoint request counts, bytes, retries and latencies.
+
+    Latencies are kept exactly (8 bytes per request), so percentiles are exact
+    and the Prometheus histogram can be exported with any bucket bounds.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._endpoints: Dict[str, _EndpointStats] = defaultdict(_EndpointStats)
+        self._lock = threading.Lock()
+
+    def on_request_end(self, record: RequestRecord, elapsed: float) -> None:
+        with self._lock:
+            stats = self._endpoints[record.endpoint]
+            stats.requests += 1
+            stats.bytes += record.nbytes
+            stats.latencies.append(elapsed)
+            stats.status_codes[record.status_code or "error"] += 1
+            if record.status_code is None or record.status_code >= 400:
+                stats.errors += 1
+
+    def on_retry(
+        self, endpoint: str, attempt: int, delay: float, error: Exception
+    ) -> None:
+        with self._lock:
+            self._endpoints[endpoint].retries += 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Return throughput, latency percentiles and retry counts per endpoint."""
+        elapsed = time.monotonic() - self.started
+        endpoints = {}
+        with self._lock:
+            for name, stats in sorted(self._endpoints.items()):
+                ordered = sorted(stats.latencies)
+                endpoints[name] = {
+                    "requests": stats.requests,
+                    "errors": stats.errors,
+                    "retries": stats.retries,
+                    "bytes": stats.bytes,
+                    "status_codes": {str(k): v for k, v in stats.status_codes.items()},
+                    "requests_per_sec": stats.requests / elapsed if elapsed else 0.0,
+                    "bytes_per_sec": stats.bytes / elapsed if elapsed else 0.0,
+                    "latency": {
+                        "mean": sum(ordered) / len(ordered) if ordered else 0.0,
+                        "p50": _quantile(ordered, 0.50),
+                        "p95": _quantile(ordered, 0.95),
+                        "p99": _quantile(ordered, 0.99),
+                        "max": ordered[-1] if ordered else 0.0,
+                    },
+                }
+        return {"elapsed_seconds": elapsed, "endpoints": endpoints}
+
+    def format_summary(self) -> str:
+        """Return the summary as a small table for printing at the end of a run."""
+        summary = self.summary()
+        lines = [
+            f"{'endpoint':<10} {'requests':>8} {'req/s':>7} {'MB/s':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'retries':>7} {'errors':>6}"
+        ]
+        for name, stats in summary["endpoints"].items():
+            latency = stats["latency"]
+            lines.append(
+                f"{name:<10} {stats['requests']:>8} {stats['requests_per_sec']:>7.1f} "
+                f"{stats['bytes_per_sec'] / 1e6:>7.2f} {latency['p50'] * 1000:>8.0f} "
+                f"{latency['p95'] * 1000:>8.0f} {latency['p99'] * 1000:>8.0f} "
+                f"{stats['retries']:>7} {stats['errors']:>6}"
+            )
+        lines.append(f"elapsed: {summary['elapsed_seconds']:.1f}s")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """Return the metrics in the Prometheus text exposition format."""
+        p = METRICS_PROMETHEUS_PREFIX
+        lines = []
+
+        def counter(name, help_text, value_of):
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} counter")
+            for endpoint, stats in self._endpoints.items():
+                lines.append(f'{p}_{name}{{endpoint="{endpoint}"}} {value_of(stats)}')
+
+        with self._lock:
+            counter("requests_total", "HTTP requests sent.", lambda s: s.requests)
+            counter("request_errors_total", "Failed requests.", lambda s: s.errors)
+            counter("request_retries_total", "Retried requests.", lambda s: s.retries)
+            counter("response_bytes_total", "Response bytes.", lambda s: s.bytes)
+
+            lines.append(f"# HELP {p}_responses_total Responses by status code.")
+            lines.append(f"# TYPE {p}_responses_total counter")
+            for endpoint, stats in self._endpoints.items():
+                for code, count in stats.status_codes.items():
+                    lines.append(
+                        f'{p}_responses_total{{endpoint="{endpoint}",code="{code}"}} '
+                        f"{count}"
+                    )
+
+            name = f"{p}_request_duration_seconds"
+            lines.append(f"# HELP {name} Request latency.")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, stats in self._endpoints.items():
+                ordered = sorted(stats.latencies)
+                for bound in METRICS_LATENCY_BUCKETS:
+                    lines.append(
+                        f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                        f"{bisect_right(ordered, bound)}"
+                    )
+                lines.append(
+                    f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {len(ordered)}'
+                )
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {sum(ordered)}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {len(ordered)}')
+        return "\n".join(lines) + "\n"
+
+    def save_json(self, path: Union[str, Path]) -> None:
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def save_prometheus(self, path: Union[str, Path]) -> None:
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+
+_instrumentation: Instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """Return the instrumentation new clients use when none is passed in."""
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]) -> None:
+    """Set the instrumentation used by clients created from now on (None resets it)."""
+    global _instrumentation
+    _instrumentation = instrumentation or Instrumentation()
@@ -0,0 +1,467 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .async_client import AsyncNIMSClient
+from .config import (
+    DEFAULT_DOWNLOAD_CONCURRENCY,
+    DEFAULT_GAGE_TIME_TOLERANCE,
+    DEFAULT_PIPELINE_WORKERS,
+    GAGE_CACHE_SETTLE_SECONDS,
+    PIPELINE_IMAGES_AND_DATA_FILE,
+    PIPELINE_MANIFEST_FILE,
+)
+from .image_names import parse_image_names
+from .index import ImageListIndex
+from .workflows import make_client
+
+# What a stage produced for each item (image name) it handled: a hash of the
+# output, or None if the item was dropped (e.g. no gage reading to join with)
+StageOutputs = Dict[str, Optional[str]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    stage TEXT NOT NULL,
+    item TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    output_hash TEXT,
+    PRIMARY KEY (stage, item)
+) WITHOUT ROWID;
+"""
+
+
+def hash_values(*values: Any) -> str:
+    """A short content hash of some JSON-serializable values."""
+    data = json.dumps(values, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_file(path: Union[str, Path], chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PipelineCamera:
+    """One camera to run the pipeline for, and where its files live.
+
+    `settings` holds anything else from the camera's config entry, for stages
+    that need more than the camera, gage site and time window.
+    """
+
+    def __init__(
+        self,
+        camera_id: str,
+        camera_dir: Union[str, Path],
+        site: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        settings: Optional[Dict[str, Any]] = None,
+    ):
+        self.camera_id = camera_id
+        self.camera_dir = Path(camera_dir)
+        self.site = site
+        self.start = start
+        self.end = end
+        self.settings = settings or {}
+
+    @property
+    def images_dir(self) -> Path:
+        return self.camera_dir / "images"
+
+    @classmethod
+    def from_dict(
+        cls, entry: Dict[str, Any], root: Union[str, Path] = "."
+    ) -> "PipelineCamera":
+        """Build a camera from a config entry; its directory defaults to root/<camera_id>."""
+        entry = dict(entry)
+        camera_id = entry.pop("camera_id")
+        camera_dir = entry.pop("camera_dir", None) or Path(root) / camera_id
+        return cls(
+            camera_id,
+            camera_dir,
+            site=entry.pop("site", None),
+            start=entry.pop("start", None),
+            end=entry.pop("end", None),
+            settings=entry,
+        )
+
+
+class PipelineManifest:
+    """A per-camera SQLite record of what every stage produced from which inputs.
+
+    For each stage and item it stores the hash of the inputs the item was
+    processed with and the hash of the result, so the next run can tell which
+    items are new or changed.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.executescript(_SCHEMA)
+
+    def get(self, stage: str) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Return {item: (input_hash, output_hash)} for a stage."""
+        rows = self.conn.execute(
+            "SELECT item, input_hash, output_hash FROM outputs WHERE stage = ?",
+            (stage,),
+        )
+        return {
+            item: (input_hash, output_hash) for item, input_hash, output_hash in rows
+        }
+
+    def record(
+        self, stage: str, rows: Iterable[Tuple[str, str, Optional[str]]]
+    ) -> None:
+        """Store (item, input_hash, output_hash) rows for a stage."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO outputs (stage, item, input_hash, output_hash) "
+                "VALUES (?, ?, ?, ?)",
+                ((stage, *row) for row in rows),
+            )
+
+    def forget(self, stage: str, items: Iterable[str]) -> None:
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM outputs WHERE stage = ? AND item = ?",
+                ((stage, item) for item in items),
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class Stage:
+    """One step of the pipeline, run on the items that are new or changed.
+
+    A stage depends on the stages named in `deps`. An item's input hash
+    combines its outputs from every dependency with fingerprint(camera), so
+    an item is rerun when any of those change. An item only reaches a stage
+    once every dependency produced an output for it.
+
+    run() returns the output hash of each item it handled, or None for items
+    it dropped. Items it leaves out are not recorded and are tried again on
+    the next run, so a stage can skip items that failed or are not ready yet.
+    Items that no longer reach a stage are passed to forget(), so the stage can
+    remove what it produced for them.
+    Stages whose outputs can only be added to (`append_only`) are rerun on all
+    items, with rebuild=True, when an item they already handled changed or
+    went away.
+    """
+
+    name: str = ""
+    deps: Tuple[str, ...] = ()
+    append_only: bool = False
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        """Settings that, when changed, make every item of the stage rerun."""
+        return ""
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        raise NotImplementedError
+
+    def forget(self, camera: PipelineCamera, items: List[str]) -> None:
+        """Remove what the stage produced for items that went away."""
+
+
+class SourceStage(Stage):
+    """A stage with no dependencies that lists the items the pipeline works on."""
+
+    def list_items(self, camera: PipelineCamera) -> StageOutputs:
+        raise NotImplementedError
+
+
+class ImageListStage(SourceStage):
+    """The camera's images in its time window, listed through the local image-list index."""
+
+    name = "images"
+
+    def __init__(self, index_path: Optional[Union[str, Path]] = None):
+        self.index_path = index_path
+
+    def list_items(self, camera: PipelineCamera) -> StageOutputs:
+        with make_client() as client, ImageListIndex(self.index_path) as index:
+            names = index.get_image_list(
+                client, camera.camera_id, camera.start, camera.end
+            )
+        # NIMS image names never change, so the name is the content hash
+        return {name: name for name in names}
+
+
+class DownloadStage(Stage):
+    """Download new images to {camera_dir}/images, hashing each file's content."""
+
+    name = "download"
+    deps = ("images",)
+
+    def __init__(self, concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY):
+        self.concurrency = concurrency
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        results = asyncio.run(self._download(items, camera.images_dir))
+        outputs = {}
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                print(f"{item} failed -- {result}")
+            else:
+                outputs[item] = hash_file(result)
+        return outputs
+
+    async def _download(self, items: List[str], save_dir: Path) -> list:
+        async with AsyncNIMSClient(concurrency=self.concurrency) as client:
+            return await asyncio.gather(
+                *(client.download_image(item, save_dir) for item in items),
+                return_exceptions=True,
+            )
+
+
+class JoinStage(Stage):
+    """Join new images to the camera's gage data and add them to images_and_data.csv.
+
+    Images with no reading within `tolerance_seconds` are dropped, unless they
+    are recent enough that the reading may not have been published yet; those
+    are tried again on the next run.
+    """
+
+    name = "join"
+    deps = ("download",)
+
+    def __init__(
+        self,
+        tolerance_seconds: float = DEFAULT_GAGE_TIME_TOLERANCE,
+        cache_root: Optional[Union[str, Path]] = None,
+        fetcher=None,
+    ):
+        """Gage data is cached under `cache_root` and fetched with `fetcher`
+        (see pynims.gage.GageDataCache)."""
+        self.tolerance_seconds = tolerance_seconds
+        self.cache_root = cache_root
+        self.fetcher = fetcher
+
+    def fingerprint(self, camera: PipelineCamera) -> str:
+        return hash_values(camera.site, self.tolerance_seconds)
+
+    def run(
+        self, camera: PipelineCamera, items: List[str], rebuild: bool
+    ) -> StageOutputs:
+        from .gage import GageDataCache, _import_pandas, get_images_and_data
+
+        pd = _import_pandas()
+        if camera.site is None:
+            raise ValueError(f"no gage site configured for {camera.camera_id}")
+        joined = get_images_and_data(
+            items,
+            camera.site,
+            GageDataCache(self.cache_root, self.fetcher),
+            self.tolerance_seconds,
+        )
+        data_columns = [
+            c for c in joined.columns if c not in ("image_times", "image_names")
+        ]
+        outputs = {
+            name: hash_values(*values)
+            for name, values in zip(
+                joined["image_names"],
+                joined[data_columns].itertuples(index=False, name=None),
+            )
+        }
+        image_times, _ = parse_image_names(items)
+        settled = datetime.now(timezone.utc) - timedelta(
+            seconds=GAGE_CACHE_SETTLE_SECONDS
+        )
+        settled = np.datetime64(settled.replace(tzinfo=None), "s")
+        for item, image_time in zip(items, image_times):
+            if item not in outputs and image_time < settled:
+                outputs[item] = None
+
+        existing = self._read_csv(camera)
+        if existing is not None:
+            existing = existing[~existing["image_names"].isin(items)]
+            joined = pd.concat([existing, joined], ignore_index=True)
+        self._write_csv(camera, joined.sort_values("image_times", kind="stable"))
+        return outputs
+
+    def forget(self, camera: PipelineCamera, items: List[str]) -> None:
+        # Later stages read the whole CSV, so rows of removed images must go too
+        existing = self._read_csv(camera)
+        if existing is not None:
+            self._write_csv(camera, existing[~existing["image_names"].isin(items)])
+
+    def _read_csv(self, camera: PipelineCamera):
+        from .gage import _import_pandas
+
+        pd = _import_pandas()
+        csv_path = camera.camera_dir / PIPELINE_IMAGES_AND_DATA_FILE
+        if not csv_path.exists():
+            return None
+        return pd.read_csv(csv_path, parse_dates=["image_times", "data_times"])
+
+    def _write_csv(self, camera: PipelineCamera, joined) -> None:
+        csv_path = camera.camera_dir / PIPELINE_IMAGES_AND_DATA_FILE
+        tmp_path = csv_path.with_suffix(".csv.tmp")
+        joined.to_csv(tmp_path, index=False)
+        tmp_path.replace(csv_path)
+
+
+def get_default_stages() -> List[Stage]:
+    return [ImageListStage(), DownloadStage(), JoinStage()]
+
+
+def load_stages(spec: str) -> List[Stage]:
+    """Load extra stages from "module:attribute" (a list of stages or a function returning one).
+
+    The working directory is put on the import path while the module is
+    imported, so stages can live next to the notebooks the pipeline is run from.
+    """
+    module_name, _, attribute = spec.partition(":")
+    cwd = os.getcwd()
+    added = cwd not in sys.path
+    if added:
+        sys.path.insert(0, cwd)
+    try:
+        stages = getattr(importlib.import_module(module_name), attribute or "STAGES")
+        return list(stages() if callable(stages) else stages)
+    finally:
+        if added:
+            sys.path.remove(cwd)
+
+
+def _sort_stages(stages: Sequence[Stage]) -> List[Stage]:
+    """Order stages so every stage comes after its dependencies."""
+    by_name = {stage.name: stage for stage in stages}
+    ordered: List[Stage] = []
+    visiting = set()
+
+    def visit(stage: Stage):
+        if stage in ordered:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"pipeline stages have a cycle through {stage.name}")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"stage {stage.name} depends on unknown stage {dep}")
+            visit(by_name[dep])
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+def run_camera(camera: PipelineCamera, stages: Sequence[Stage]) -> Dict[str, int]:
+    """Run every stage on one camera's new or changed items.
+
+    Returns how many items each stage processed.
+    """
+    counts = {}
+    outputs: Dict[str, StageOutputs] = {}
+    with PipelineManifest(camera.camera_dir / PIPELINE_MANIFEST_FILE) as manifest:
+        for stage in _sort_stages(stages):
+            done = manifest.get(stage.name)
+            fingerprint = stage.fingerprint(camera)
+            if isinstance(stage, SourceStage):
+                current = stage.list_items(camera)
+                inputs = {
+                    item: hash_values(fingerprint, h) for item, h in current.items()
+                }
+            else:
+                dep_outputs = [outputs[dep] for dep in stage.deps]
+                inputs = {
+                    item: hash_values(fingerprint, *[o[item] for o in dep_outputs])
+                    for item in dep_outputs[0]
+                    if all(o.get(item) is not None for o in dep_outputs)
+                }
+
+            todo = sorted(
+                item for item, h in inputs.items() if done.get(item, ("",))[0] != h
+            )
+            removed = [item for item in done if item not in inputs]
+            rebuild = stage.append_only and (
+                bool(removed) or any(item in done for item in todo)
+            )
+            if rebuild:
+                todo = sorted(inputs)
+            if removed:
+                stage.forget(camera, removed)
+            manifest.forget(stage.name, removed)
+
+            if isinstance(stage, SourceStage):
+                results = {item: current[item] for item in todo}
+            elif todo:
+                print(f"{camera.camera_id}: {stage.name} on {len(todo)} items")
+                results = stage.run(camera, todo, rebuild)
+            else:
+                results = {}
+            manifest.record(
+                stage.name,
+                [
+                    (item, inputs[item], results[item])
+                    for item in todo
+                    if item in results
+                ],
+            )
+            counts[stage.name] = len(todo)
+            outputs[stage.name] = {
+                item: results[item] if item in results else done[item][1]
+                for item in inputs
+                if item in results or (item in done and item not in todo)
+            }
+    return counts
+
+
+def run_pipeline(
+    cameras: Sequence[PipelineCamera],
+    stages: Optional[Sequence[Stage]] = None,
+    workers: int = DEFAULT_PIPELINE_WORKERS,
+) -> Dict[str, Union[Dict[str, int], Exception]]:
+    """Run the pipeline for many cameras, `workers` cameras at a time.
+
+    Cameras are independent, so one failing does not stop the others; its
+    exception is returned in place of its counts.
+    """
+    stages = list(stages) if stages is not None else get_default_stages()
+
+    def run_one(camera):
+        try:
+            return run_camera(camera, stages)
+        except Exception as e:
+            print(f"{camera.camera_id} failed -- {e}")
+            return e
+
+    with ThreadPoolExecutor(workers) as executor:
+        results = executor.map(run_one, cameras)
+        return {camera.camera_id: result for camera, result in zip(cameras, results)}
+
+
+def load_pipeline_config(path: Union[str, Path]) -> List[PipelineCamera]:
+    """Read cameras from a JSON config: {"root": ".", "cameras": [{"camera_id": ..., "site": ...}]}."""
+    config = json.loads(Path(path).read_text())
+    if isinstance(config, list):
+        config = {"cameras": config}
+    root = config.get("root", Path(path).parent)
+    return [PipelineCamera.from_dict(entry, root) for entry in config["cameras"]]
@@ -1,7 +1,7 @@
+import math
 import os
 import pytz
 from datetime import datetime, timezone, timedelta
-from pathlib import Path
 
 
 ##### NIMS image path / date time conversion utilities
@@ -60,15 +60,38 @@ def convert_tz_date_to_utc_date(tzDate):
     return tzDate.astimezone(pytz.utc)
 
 
+def split_time_range(start, end, nShards, minShardSeconds=0):
+    """Split [start, end] into at most nShards contiguous (start, end) intervals."""
+    totalSeconds = (end - start).total_seconds()
+    if totalSeconds <= 0:
+        return [(start, end)]
+    if minShardSeconds > 0:
+        nShards = min(nShards, int(totalSeconds // minShardSeconds))
+    nShards = max(nShards, 1)
+    step = timedelta(seconds=math.ceil(totalSeconds / nShards))  # whole-second bounds
+    bounds = [min(start + step * i, end) for i in range(nShards)] + [end]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
 ##### Image List utilities
 def get_downloaded_image_list_within_directory(directory):
-    return [p.name for p in Path(directory).iterdir() if p.is_file()]
+    with os.scandir(directory) as entries:
+        return [entry.name for entry in entries if entry.is_file()]
 
 
 def get_downloaded_image_list_for_cam_id(camId, downloadedImageList):
     return [img for img in downloadedImageList if camId in img]
 
 
+def group_image_list_by_cam_id(imageList):
+    """Split an image list by camera in one pass (instead of one scan per camera)."""
+    imagesByCamId = {}
+    for img in imageList:
+        camId = img.split("___")[0]
+        imagesByCamId.setdefault(camId, []).append(img)
+    return imagesByCamId
+
+
 def compare_image_lists(list1, list2):
     set1 = set(list1)
     set2 = set(list2)
@@ -80,14 +103,11 @@ def compare_image_lists(list1, list2):
 
 ##### Basic file path utilities
 def get_folder_images(folder_path, ext=(".JPG", ".jpg")):
-    if len(os.listdir(folder_path)) == 0:
-        return None
     imgs = []
-    for file in os.listdir(folder_path):
-        if file.endswith(ext):
-            file_path = folder_path + file
-            if os.path.getsize(file_path) > 0:
-                imgs.append(folder_path + file)
+    with os.scandir(folder_path) as entries:  # one listing, sizes from the entries
+        for entry in entries:
+            if entry.name.endswith(ext) and entry.stat().st_size > 0:
+                imgs.append(folder_path + entry.name)
     if len(imgs) == 0:
         return None
     return imgs
@@ -116,7 +136,7 @@ def get_utc_date_from_tl1_image_name(imageName):
     nameSplit = imageName.split("___")[1]  # separate timestamp from name
     tz = nameSplit[-5:]
     tzSign = nameSplit[-6]
-    tzOffsetMinutes = int(tz[1]) * 60 + int(tz[-2:])
+    tzOffsetMinutes = int(tz[:2]) * 60 + int(tz[-2:])
     if tzSign == "+":
         tzOffsetMinutes = tzOffsetMinutes * -1
     dt = nameSplit[:-6]
@@ -1,16 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Union
+from typing import List, Optional, Union
 from datetime import datetime
+import asyncio
 import json
 
 from pynims.client import NIMSClient
+from pynims.async_client import AsyncNIMSClient
+from pynims.index import ImageListIndex
+from pynims.inventory import DownloadPlan, LocalInventory
+from pynims.cache import CameraMetadataCache
+from pynims.bulk import BulkDownloadScheduler, CameraJob, select_cameras
+from pynims.gage import get_images_and_data, sample_images_by_stage
+from pynims.config import (
+    NIMS_DEFAULT_CAMERA_CACHE_PATH,
+    DEFAULT_GAGE_TIME_TOLERANCE,
+    NIMS_API_RATE_LIMIT,
+    NIMS_IMAGE_RATE_LIMIT,
+    DEFAULT_DOWNLOAD_CONCURRENCY,
+    DEFAULT_DOWNLOAD_QUEUE_SIZE,
+    NIMS_DEFAULT_SAVE_DIR,
+)
 from pynims.utils import get_nims_image_timestamp
 
 
+def make_client() -> NIMSClient:
+    """Create a NIMSClient whose camera metadata cache persists between runs."""
+    return NIMSClient(
+        camera_cache=CameraMetadataCache(path=NIMS_DEFAULT_CAMERA_CACHE_PATH)
+    )
+
+
 def get_camera_list(ids_only: bool = True):
     """Get list of all cameras"""
-    client = NIMSClient()
-    cameras = client.get_cameras()
+    with make_client() as client:
+        cameras = client.get_cameras()
     return [d["camId"] for d in cameras] if ids_only else cameras
 
 
@@ -21,11 +45,14 @@ def save_image_list_to_file(
     recursive: Optional[bool] = None,
     max_results: Optional[int] = None,
     save_dir: Union[str, Path] = "image_lists",
+    index_path: Optional[Union[str, Path]] = None,
 ) -> None:
     """Save image list to a file."""
 
-    client = NIMSClient()
-    image_list = client.get_image_list(camera_id, start, end, recursive, max_results)
+    client = make_client()
+    image_list = _get_image_list(
+        client, camera_id, start, end, recursive, max_results, index_path
+    )
 
     first_image_time = get_nims_image_timestamp(image_list[0])
     last_image_time = get_nims_image_timestamp(image_list[-1])
@@ -46,13 +73,337 @@ def download_images_for_camera(
     recursive: Optional[bool] = None,
     max_results: Optional[int] = None,
     save_dir: Optional[Union[str, Path]] = None,
-) -> None:
-    """Get images for a camera and download them all."""
-    with NIMSClient() as client:
-        image_list = client.get_image_list(
-            camera_id, start, end, recursive, max_results
+    concurrency: int = 1,
+    index_path: Optional[Union[str, Path]] = None,
+    revalidate: bool = False,
+    site: Optional[str] = None,
+    stage_resolution: Optional[float] = None,
+    tolerance_seconds: float = DEFAULT_GAGE_TIME_TOLERANCE,
+) -> List[str]:
+    """Get images for a camera and download the ones not already in save_dir.
+
+    What to download is planned up front from the directory's inventory (see
+    plan_downloads_for_camera), so images already saved are skipped without
+    touching them one by one. With concurrency > 1 the downloads run on an
+    AsyncNIMSClient with up to `concurrency` requests in flight. With
+    revalidate=True images that already exist are checked against the server
+    and re-downloaded if they differ.
+
+    With a stage_resolution (in feet), only one image per gage height bin of
+    that size is kept, using the gage data of `site` (see
+    sample_images_by_stage). Returns the names of the images wanted, whether
+    they were downloaded now or before.
+    """
+    save_dir = Path(save_dir or NIMS_DEFAULT_SAVE_DIR)
+    with make_client() as client, LocalInventory(save_dir) as inventory:
+        image_list = _get_image_list(
+            client, camera_id, start, end, recursive, max_results, index_path
         )
-        if len(image_list) > 0:
-            for idx, image in enumerate(image_list):
-                print(f"image # {idx + 1} of {len(image_list)}")
-                client.download_image(image, save_dir)
+        if stage_resolution is not None:
+            image_list = _sample_by_stage(
+                inventory, image_list, site, stage_resolution, tolerance_seconds
+            )
+        wanted = image_list
+        plan = _plan_downloads(inventory, image_list, revalidate, False, concurrency)
+        print(plan.summary())
+        image_list = plan.to_download
+        for image in image_list:
+            if image in inventory.files:
+                (save_dir / image).unlink()
+
+        try:
+            if len(image_list) > 0 and concurrency <= 1:
+                for idx, image in enumerate(image_list):
+                    print(f"image # {idx + 1} of {len(image_list)}")
+                    client.download_image(image, save_dir)
+            if len(image_list) > 0 and concurrency > 1:
+                asyncio.run(_download_images_async(image_list, save_dir, concurrency))
+        finally:
+            inventory.record(image_list)
+    return wanted
+
+
+def plan_downloads_for_camera(
+    camera_id: str,
+    start: Optional[Union[str, datetime]] = None,
+    end: Optional[Union[str, datetime]] = None,
+    recursive: Optional[bool] = None,
+    max_results: Optional[int] = None,
+    save_dir: Optional[Union[str, Path]] = None,
+    index_path: Optional[Union[str, Path]] = None,
+    revalidate: bool = False,
+    check_hash: bool = False,
+    concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+    site: Optional[str] = None,
+    stage_resolution: Optional[float] = None,
+    tolerance_seconds: float = DEFAULT_GAGE_TIME_TOLERANCE,
+) -> DownloadPlan:
+    """Work out which of a camera's images a download would fetch, without downloading.
+
+    The remote list is compared against save_dir's inventory, which is
+    refreshed with one directory scan. With revalidate=True images that
+    already exist are also checked against the server with HEAD requests
+    (`concurrency` at a time), and with check_hash=True their MD5s too.
+    With a stage_resolution, the list is first sampled by gage height as in
+    download_images_for_camera.
+    """
+    save_dir = Path(save_dir or NIMS_DEFAULT_SAVE_DIR)
+    with make_client() as client, LocalInventory(save_dir) as inventory:
+        image_list = _get_image_list(
+            client, camera_id, start, end, recursive, max_results, index_path
+        )
+        if stage_resolution is not None:
+            image_list = _sample_by_stage(
+                inventory, image_list, site, stage_resolution, tolerance_seconds
+            )
+        return _plan_downloads(
+            inventory, image_list, revalidate, check_hash, concurrency
+        )
+
+
+def sync_image_list_index(
+    camera_id: str,
+    start: Optional[Union[str, datetime]] = None,
+    end: Optional[Union[str, datetime]] = None,
+    index_path: Optional[Union[str, Path]] = None,
+) -> int:
+    """Fetch only the missing parts of a camera's listing into the local index."""
+    with make_client() as client, ImageListIndex(index_path) as index:
+        return index.sync(client, camera_id, start, end)
+
+
+def stream_images_for_camera(
+    camera_id: str,
+    start: Optional[Union[str, datetime]] = None,
+    end: Optional[Union[str, datetime]] = None,
+    max_results: Optional[int] = None,
+    save_dir: Optional[Union[str, Path]] = None,
+    concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+    revalidate: bool = False,
+    queue_size: int = DEFAULT_DOWNLOAD_QUEUE_SIZE,
+) -> int:
+    """Download a camera's images while they are still being listed.
+
+    Image names are fed page by page into a bounded queue drained by `concurrency`
+    download workers, so the first download starts after one listing request and
+    listing pauses whenever the queue is full. Each page is planned against
+    save_dir's inventory like download_images_for_camera, so only missing,
+    truncated or (with revalidate=True) stale images are fetched. Returns the
+    number of images listed.
+    """
+    return asyncio.run(
+        _stream_images_async(
+            camera_id,
+            start,
+            end,
+            max_results,
+            save_dir,
+            concurrency,
+            revalidate,
+            queue_size,
+        )
+    )
+
+
+async def _stream_images_async(
+    camera_id: str,
+    start: Optional[Union[str, datetime]],
+    end: Optional[Union[str, datetime]],
+    max_results: Optional[int],
+    save_dir: Optional[Union[str, Path]],
+    concurrency: int,
+    revalidate: bool,
+    queue_size: int,
+) -> int:
+    save_dir = Path(save_dir or NIMS_DEFAULT_SAVE_DIR)
+    queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(maxsize=queue_size)
+    queued = []
+    failed = []
+    done = 0
+
+    async def _worker(client: AsyncNIMSClient):
+        nonlocal done
+        while True:
+            image = await queue.get()
+            if image is None:
+                return
+            try:
+                await client.download_image(image, save_dir)
+            except Exception as e:
+                print(f"{image} failed -- {e}")
+                failed.append(image)
+            done += 1
+            print(f"image # {done} of {len(queued)} queued so far")
+
+    # Listing, camera lookups and the inventory (SQLite) all block, so they run
+    # on one helper thread instead of the event loop
+    loop = asyncio.get_running_loop()
+    helper = ThreadPoolExecutor(max_workers=1)
+
+    def run_blocking(fn, *args):
+        return loop.run_in_executor(helper, fn, *args)
+
+    count = 0
+    inventory = await run_blocking(LocalInventory, save_dir)
+    try:
+        await run_blocking(inventory.refresh)
+        with make_client() as list_client:
+            pages = await run_blocking(
+                list_client.iter_image_pages, camera_id, start, end
+            )
+            async with AsyncNIMSClient(concurrency=concurrency) as client:
+                workers = [
+                    asyncio.ensure_future(_worker(client)) for _ in range(concurrency)
+                ]
+                try:
+                    while max_results is None or count < max_results:
+                        page = await run_blocking(next, pages, None)
+                        if page is None:
+                            break
+                        page = sorted(page)
+                        if max_results is not None:
+                            page = page[: max_results - count]
+                        count += len(page)
+                        plan = await run_blocking(
+                            _plan_downloads,
+                            inventory,
+                            page,
+                            revalidate,
+                            False,
+                            concurrency,
+                            False,
+                        )
+                        for image in plan.to_download:
+                            if image in inventory.files:
+                                (save_dir / image).unlink()
+                            queued.append(image)
+                            await queue.put(image)  # waits while the queue is full
+                finally:
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+    finally:
+        await run_blocking(inventory.record, queued)
+        await run_blocking(inventory.close)
+        helper.shutdown()
+
+    print(f"Downloaded {len(queued) - len(failed)} of {count} images listed")
+    if failed:
+        print(f"{len(failed)} of {len(queued)} images failed to download")
+    return count
+
+
+def download_images_for_cameras(
+    camera_ids: Optional[List[str]] = None,
+    pattern: Optional[str] = None,
+    start: Optional[Union[str, datetime]] = None,
+    end: Optional[Union[str, datetime]] = None,
+    save_dir: Union[str, Path] = ".",
+    concurrency: int = DEFAULT_DOWNLOAD_CONCURRENCY,
+    api_rate: float = NIMS_API_RATE_LIMIT,
+    image_rate: float = NIMS_IMAGE_RATE_LIMIT,
+    state_path: Optional[Union[str, Path]] = None,
+) -> List[CameraJob]:
+    """Download a time window of images for many cameras, saving each to save_dir/<camera_id>.
+
+    Cameras are chosen by ID and/or glob pattern (all cameras if neither is given)
+    and share one concurrency budget and per-host rate limits. Progress is saved to
+    state_path, and re-running with the same window resumes where it stopped.
+    """
+    with make_client() as client:
+        cameras = client.get_cameras()
+    selected = select_cameras(cameras, camera_ids, pattern)
+    missing = set(camera_ids or []) - set(selected)
+    if missing:
+        raise ValueError(f"Unknown camera ID(s): {', '.join(sorted(missing))}")
+
+    scheduler = BulkDownloadScheduler(
+        selected,
+        start=start,
+        end=end,
+        save_dir=save_dir,
+        concurrency=concurrency,
+        api_rate=api_rate,
+        image_rate=image_rate,
+        state_path=state_path,
+    )
+    return scheduler.run()
+
+
+def _get_image_list(
+    client: NIMSClient,
+    camera_id: str,
+    start: Optional[Union[str, datetime]],
+    end: Optional[Union[str, datetime]],
+    recursive: Optional[bool],
+    max_results: Optional[int],
+    index_path: Optional[Union[str, Path]],
+) -> List[str]:
+    """List images from the API, or through the local index when index_path is given."""
+    if index_path is None:
+        return client.get_image_list(camera_id, start, end, recursive, max_results)
+    with ImageListIndex(index_path) as index:
+        return index.get_image_list(
+            client, camera_id, start, end, max_results, recursive
+        )
+
+
+def _sample_by_stage(
+    inventory: LocalInventory,
+    image_list: List[str],
+    site: Optional[str],
+    stage_resolution: float,
+    tolerance_seconds: float,
+) -> List[str]:
+    """Keep one image per gage height bin, preferring images already downloaded."""
+    if site is None:
+        raise ValueError("sampling by stage needs the gage site of the camera")
+    if not image_list:
+        return []
+    images_and_data = get_images_and_data(
+        image_list, site, tolerance_seconds=tolerance_seconds
+    )
+    # The inventory as last saved is enough to prefer local images; it is
+    # refreshed when the download is planned
+    sample = sample_images_by_stage(
+        images_and_data, stage_resolution, prefer=inventory.files
+    )
+    print(
+        f"Sampled {len(sample)} of {len(image_list)} images, "
+        f"one per {stage_resolution} ft of gage height"
+    )
+    return sample["image_names"].tolist()
+
+
+def _plan_downloads(
+    inventory: LocalInventory,
+    image_list: List[str],
+    revalidate: bool,
+    check_hash: bool,
+    concurrency: int,
+    refresh: bool = True,
+) -> DownloadPlan:
+    if refresh:
+        inventory.refresh()
+    remote = None
+    if revalidate:
+        present = [image for image in image_list if image in inventory.files]
+        if check_hash:
+            inventory.hash(present)
+        remote = asyncio.run(_get_images_info_async(present, concurrency))
+    return inventory.plan(image_list, remote)
+
+
+async def _get_images_info_async(image_list: List[str], concurrency: int):
+    async with AsyncNIMSClient(concurrency=concurrency) as client:
+        return await client.get_images_info(image_list)
+
+
+async def _download_images_async(
+    image_list: List[str],
+    save_dir: Optional[Union[str, Path]],
+    concurrency: int,
+    revalidate: bool = False,
+) -> List[Path]:
+    async with AsyncNIMSClient(concurrency=concurrency) as client:
+        return await client.download_images(image_list, save_dir, revalidate)
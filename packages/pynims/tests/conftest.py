@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pynims.config import NIMS_CAMERA_BASE_URL_ENV_VAR, NIMS_IMAGE_BASE_URL_ENV_VAR
+from pynims.fake_server import FakeNIMSServer
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+INTERVAL = timedelta(minutes=5)
+
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    """A fake NIMS server with small pages, which every client in the test talks to."""
+    with FakeNIMSServer(
+        n_cameras=2,
+        images_per_camera=600,
+        start=START,
+        interval=INTERVAL,
+        page_size=50,
+        image_size=10_000,
+    ) as srv:
+        monkeypatch.setenv(NIMS_CAMERA_BASE_URL_ENV_VAR, srv.camera_base_url)
+        monkeypatch.setenv(NIMS_IMAGE_BASE_URL_ENV_VAR, srv.image_base_url)
+        # Keep the default camera cache out of the real home directory
+        monkeypatch.setenv("HOME", str(tmp_path / "home"))
+        yield srv
+
+
+@pytest.fixture
+def client(server):
+    from pynims.client import NIMSClient
+
+    with NIMSClient() as client:
+        yield client
+
+
+@pytest.fixture
+def camera_id(server):
+    return server.cameras[0]["camId"]
@@ -0,0 +1,133 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from conftest import INTERVAL, START
+from pynims.bulk import BulkDownloadScheduler
+from pynims.utils import (
+    get_nims_image_name_from_date_time_and_cam_id,
+    get_nims_image_timestamp,
+)
+
+END = START + timedelta(hours=10)
+
+
+@pytest.fixture
+def scheduler(server, tmp_path):
+    def make():
+        return BulkDownloadScheduler(
+            [camera["camId"] for camera in server.cameras],
+            START.isoformat(),
+            END.isoformat(),
+            save_dir=tmp_path / "images",
+            concurrency=4,
+            api_rate=1000,
+            image_rate=1000,
+            state_path=tmp_path / "state.json",
+        )
+
+    return make
+
+
+def expected_images(server, camera_id):
+    return server.images[camera_id][: 10 * 12 + 1]
+
+
+def downloaded(tmp_path, camera_id):
+    return sorted(path.name for path in (tmp_path / "images" / camera_id).glob("*.jpg"))
+
+
+def test_bulk_download(server, scheduler, tmp_path):
+    jobs = scheduler().run()
+
+    for job in jobs:
+        assert job.complete and not job.failed and job.error is None
+        assert downloaded(tmp_path, job.camera_id) == expected_images(
+            server, job.camera_id
+        )
+
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert all(camera["complete"] for camera in state["cameras"].values())
+
+    # Everything is complete, so a rerun downloads nothing
+    requests = server.stats["requests.image"]
+    scheduler().run()
+    assert server.stats["requests.image"] == requests
+
+
+def test_bulk_download_resumes_from_state(server, scheduler, tmp_path):
+    first, second = [camera["camId"] for camera in server.cameras]
+    images = expected_images(server, first)
+    timestamp = get_nims_image_timestamp(images[60])
+    date, time = timestamp.split("T")
+    state = {
+        "start": START.isoformat(),
+        "end": END.isoformat(),
+        "cameras": {
+            first: {
+                "cursor": f"{date}T{time.replace('-', ':')}",
+                "complete": False,
+                "downloaded": 60,
+                "failed": {images[10]: "timed out"},
+            },
+            second: {"cursor": None, "complete": True, "downloaded": 121},
+        },
+    }
+    (tmp_path / "state.json").write_text(json.dumps(state))
+
+    jobs = scheduler().run()
+
+    assert all(job.complete and not job.failed for job in jobs)
+    assert downloaded(tmp_path, first) == [images[10]] + images[60:]
+    assert downloaded(tmp_path, second) == []
+    assert jobs[0].downloaded == 60 + 1 + len(images[60:])
+
+
+def test_bulk_state_for_other_window_is_ignored(server, scheduler, tmp_path):
+    state = {
+        "start": START.isoformat(),
+        "end": (END + timedelta(hours=1)).isoformat(),
+        "cameras": {camera["camId"]: {"complete": True} for camera in server.cameras},
+    }
+    (tmp_path / "state.json").write_text(json.dumps(state))
+
+    jobs = scheduler().run()
+
+    for job in jobs:
+        assert downloaded(tmp_path, job.camera_id) == expected_images(
+            server, job.camera_id
+        )
+
+
+def test_open_ended_bulk_download_picks_up_new_images(server, tmp_path):
+    camera_id = server.cameras[0]["camId"]
+
+    def run():
+        return BulkDownloadScheduler(
+            [camera_id],
+            START.isoformat(),
+            save_dir=tmp_path / "images",
+            concurrency=4,
+            api_rate=1000,
+            image_rate=1000,
+            state_path=tmp_path / "state.json",
+        ).run()
+
+    (job,) = run()
+    assert not job.complete and job.error is None
+    assert downloaded(tmp_path, camera_id) == server.images[camera_id]
+
+    last = START + INTERVAL * (len(server.images[camera_id]) - 1)
+    new_images = [
+        get_nims_image_name_from_date_time_and_cam_id(last + INTERVAL * i, camera_id)
+        for i in range(1, 4)
+    ]
+    server.images[camera_id].extend(new_images)
+    requests = server.stats["requests.image"]
+
+    (job,) = run()
+
+    assert not job.complete
+    assert server.stats["requests.image"] - requests == len(new_images)
+    assert downloaded(tmp_path, camera_id) == server.images[camera_id]
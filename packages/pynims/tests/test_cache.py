@@ -0,0 +1,57 @@
+import pytest
+
+from pynims.cache import CameraMetadataCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("pynims.cache.time.time", lambda: now[0])
+    return now
+
+
+def camera(camera_id):
+    return {"camId": camera_id, "tz": "America/Chicago"}
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = CameraMetadataCache(ttl=60)
+    cache.put("a", camera("a"))
+
+    clock[0] += 59
+    assert cache.get("a") == camera("a")
+    clock[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = CameraMetadataCache(max_size=2)
+    cache.warm([camera("a"), camera("b")])
+    cache.get("a")
+    cache.put("c", camera("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") == camera("a")
+    assert cache.get("c") == camera("c")
+
+
+def test_cache_file_keeps_unexpired_entries(clock, tmp_path):
+    path = tmp_path / "cameras.json"
+    cache = CameraMetadataCache(ttl=60, path=path)
+    cache.put("old", camera("old"))
+    clock[0] += 30
+    cache.put("new", camera("new"))
+    cache.save()
+
+    clock[0] += 45
+    loaded = CameraMetadataCache(ttl=60, path=path)
+    assert len(loaded) == 1
+    assert loaded.get("new") == camera("new")
+
+
+def test_corrupt_cache_file_is_a_cold_cache(tmp_path):
+    path = tmp_path / "cameras.json"
+    path.write_text("{not json")
+
+    assert len(CameraMetadataCache(path=path)) == 0
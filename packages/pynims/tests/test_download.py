@@ -0,0 +1,108 @@
+import asyncio
+
+import httpx
+import pytest
+
+from pynims.async_client import AsyncNIMSClient
+from pynims.download import BatchDownloadError, get_partial_path
+
+
+@pytest.fixture
+def image_name(server, camera_id):
+    return server.images[camera_id][0]
+
+
+def test_download_image(server, client, image_name, tmp_path):
+    body, _ = server.image_body()
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert not get_partial_path(path).exists()
+
+
+def test_download_resumes_partial_file(server, client, image_name, tmp_path):
+    body, _ = server.image_body()
+    get_partial_path(tmp_path / image_name).write_bytes(body[:4000])
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert server.stats["bytes"] == len(body) - 4000
+
+
+def test_complete_partial_file_is_finalized_on_416(
+    server, client, image_name, tmp_path
+):
+    body, _ = server.image_body()
+    get_partial_path(tmp_path / image_name).write_bytes(body)
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert server.stats["requests.image"] == 1
+    assert server.stats["bytes"] == 0
+
+
+def test_oversized_partial_file_is_restarted(server, client, image_name, tmp_path):
+    body, _ = server.image_body()
+    get_partial_path(tmp_path / image_name).write_bytes(body + b"extra")
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert server.stats["bytes"] == len(body)
+
+
+def test_corrupt_partial_file_is_retried(
+    monkeypatch, server, client, image_name, tmp_path
+):
+    monkeypatch.setattr("pynims.client.time.sleep", lambda seconds: None)
+    body, _ = server.image_body()
+    get_partial_path(tmp_path / image_name).write_bytes(bytes(len(body)))
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert not get_partial_path(path).exists()
+
+
+def test_short_transfer_is_resumed(monkeypatch, server, client, image_name, tmp_path):
+    monkeypatch.setattr("pynims.client.time.sleep", lambda seconds: None)
+    body, _ = server.image_body()
+    iter_bytes = httpx.Response.iter_bytes
+    transfers = []
+
+    def drop_connection_once(response, chunk_size=None):
+        transfers.append(response.request.headers.get("range"))
+        for chunk in iter_bytes(response, chunk_size):
+            if len(transfers) == 1:
+                yield chunk[:4000]
+                return
+            yield chunk
+
+    monkeypatch.setattr(httpx.Response, "iter_bytes", drop_connection_once)
+
+    path = client.download_image(image_name, tmp_path)
+
+    assert path.read_bytes() == body
+    assert transfers == [None, "bytes=4000-"]
+
+
+def test_failed_image_does_not_stop_the_batch(server, camera_id, tmp_path):
+    body, _ = server.image_body()
+    names = server.images[camera_id][:5]
+    missing = server.images[camera_id].pop(2)
+
+    async def download():
+        async with AsyncNIMSClient(concurrency=2) as client:
+            return await client.download_images(names, tmp_path)
+
+    with pytest.raises(BatchDownloadError) as excinfo:
+        asyncio.run(download())
+
+    assert list(excinfo.value.errors) == [missing]
+    assert len(excinfo.value.paths) == 4
+    for name in names:
+        if name != missing:
+            assert (tmp_path / name).read_bytes() == body
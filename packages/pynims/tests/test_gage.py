@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+import pytest
+
+from conftest import START
+from pynims.utils import get_nims_image_name_from_date_time_and_cam_id
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from pynims.gage import (  # noqa: E402
+    FixtureFetcher,
+    GageDataCache,
+    get_images_and_data,
+    join_images_to_gage,
+    sample_images_by_stage,
+)
+
+SITE = "01234567"
+GAGE_HEIGHT_PARAMETER = "00065"
+
+
+@pytest.fixture
+def readings():
+    index = pd.date_range(START, periods=4 * 24 * 3, freq="15min", name="datetime")
+    return pd.DataFrame({GAGE_HEIGHT_PARAMETER: range(len(index))}, index=index)
+
+
+@pytest.fixture
+def fetcher(readings):
+    return FixtureFetcher(readings)
+
+
+@pytest.fixture
+def cache(tmp_path, fetcher):
+    return GageDataCache(tmp_path / "gage", fetcher)
+
+
+def test_cache_only_fetches_gaps(cache, fetcher, readings):
+    day = timedelta(days=1)
+    first = cache.get(SITE, START, START + day)
+    assert len(fetcher.calls) == 1
+    assert first.equals(readings.loc[START : START + day])
+    assert cache.missing_ranges(SITE, START, START + day) == []
+
+    cache.get(SITE, START, START + day)
+    assert len(fetcher.calls) == 1
+
+    both = cache.get(SITE, START, START + 2 * day)
+    assert fetcher.calls[1][1:] == (START + day + timedelta(seconds=1), START + 2 * day)
+    assert both.equals(readings.loc[START : START + 2 * day])
+
+
+def test_cache_fills_gap_between_ranges(cache, fetcher):
+    day = timedelta(days=1)
+    cache.get(SITE, START, START + day / 2)
+    cache.get(SITE, START + day, START + 2 * day)
+
+    assert cache.missing_ranges(SITE, START, START + 2 * day) == [
+        (START + day / 2 + timedelta(seconds=1), START + day - timedelta(seconds=1))
+    ]
+    cache.get(SITE, START, START + 2 * day)
+    assert len(fetcher.calls) == 3
+    assert cache.missing_ranges(SITE, START, START + 2 * day) == []
+
+
+def test_join_images_to_gage(readings):
+    offsets = [timedelta(minutes=14), timedelta(minutes=1), timedelta(minutes=37)]
+    image_names = [
+        get_nims_image_name_from_date_time_and_cam_id(START + offset, "cam")
+        for offset in offsets
+    ]
+
+    joined = join_images_to_gage(image_names, readings, tolerance_seconds=120)
+
+    # Sorted by image time; the 00:37 image is 7 minutes from any reading
+    assert joined["image_names"].tolist() == [image_names[1], image_names[0]]
+    assert joined["data_times"].tolist() == [START, START + timedelta(minutes=15)]
+    assert joined[GAGE_HEIGHT_PARAMETER].tolist() == [0, 1]
+    assert joined["time_diff_sec"].tolist() == [60.0, 60.0]
+
+    kept = join_images_to_gage(
+        image_names, readings, tolerance_seconds=120, drop_unmatched=False
+    )
+    assert len(kept) == 3
+    assert kept["data_times"].isna().tolist() == [False, False, True]
+
+
+def image_names_at(offsets):
+    return [
+        get_nims_image_name_from_date_time_and_cam_id(START + offset, "cam")
+        for offset in offsets
+    ]
+
+
+def test_sample_images_by_stage(readings):
+    image_names = image_names_at(timedelta(minutes=15 * i) for i in range(40))
+    images_and_data = join_images_to_gage(image_names, readings)
+
+    sample = sample_images_by_stage(images_and_data, resolution=10)
+    assert sample["image_names"].tolist() == image_names[::10]
+    assert sample[GAGE_HEIGHT_PARAMETER].tolist() == [0, 10, 20, 30]
+
+    preferred = sample_images_by_stage(
+        images_and_data, resolution=10, prefer=[image_names[15]]
+    )
+    assert preferred["image_names"].tolist()[1] == image_names[15]
+
+
+def test_sample_images_by_stage_without_readings(tmp_path, readings):
+    image_names = image_names_at(timedelta(minutes=15 * i) for i in range(10))
+    cache = GageDataCache(tmp_path / "gage", FixtureFetcher(readings.iloc[:0]))
+
+    images_and_data = get_images_and_data(image_names, SITE, cache)
+    assert images_and_data.empty
+
+    sample = sample_images_by_stage(images_and_data, resolution=0.05)
+    assert sample.empty
+
+
+def test_sample_images_by_stage_without_gage_height(readings):
+    image_names = image_names_at([timedelta(0)])
+    discharge = readings.rename(columns={GAGE_HEIGHT_PARAMETER: "00060"})
+    images_and_data = join_images_to_gage(image_names, discharge)
+
+    with pytest.raises(ValueError, match="00065"):
+        sample_images_by_stage(images_and_data, resolution=0.05)
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from pynims.image_names import ImageNameTable, parse_image_names
+from pynims.utils import (
+    convert_nims_image_name_to_utc_date,
+    get_cam_id_from_nims_image_name,
+    get_exif_date_from_rise_image_name,
+    get_exif_date_from_vivotek_image_name,
+    get_nims_image_name_from_date_time_and_cam_id,
+    get_utc_date_from_tl1_image_name,
+)
+
+
+def to_datetimes(times):
+    return [t.replace(tzinfo=timezone.utc) for t in times.astype(datetime).tolist()]
+
+
+def to_exif_dates(times):
+    return [t.strftime("%Y:%m:%d %H:%M:%S") for t in times.astype(datetime).tolist()]
+
+
+@pytest.fixture
+def nims_names():
+    rng = np.random.default_rng(0)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    return [
+        get_nims_image_name_from_date_time_and_cam_id(
+            start + timedelta(seconds=int(seconds)), f"XX_Camera_{cam}"
+        )
+        for seconds, cam in zip(
+            rng.integers(0, 5 * 365 * 86400, 500), rng.integers(0, 7, 500)
+        )
+    ]
+
+
+def test_nims_names_match_scalar_parser(nims_names):
+    times, camera_ids = parse_image_names(nims_names)
+
+    assert to_datetimes(times) == [
+        convert_nims_image_name_to_utc_date(name) for name in nims_names
+    ]
+    assert camera_ids.tolist() == [
+        get_cam_id_from_nims_image_name(name) for name in nims_names
+    ]
+
+
+def test_tl1_names_match_scalar_parser():
+    names = [
+        "CAM_A___2024-03-05_12-30-45-123-06-00.jpg",
+        "CAM_B___2024-12-31_23-59-59-000+05-30.jpg",
+        "CAM_A___2024-02-29_00-00-00-999-00-00.jpg",
+    ]
+
+    times, camera_ids = parse_image_names(names, "tl1")
+
+    assert to_datetimes(times) == [
+        get_utc_date_from_tl1_image_name(name) for name in names
+    ]
+    assert camera_ids.tolist() == ["CAM_A", "CAM_B", "CAM_A"]
+
+
+@pytest.mark.parametrize(
+    "format, names, parse_scalar",
+    [
+        (
+            "vivotek",
+            ["cam_20240305_123045.jpg", "20231231_235959.jpg"],
+            get_exif_date_from_vivotek_image_name,
+        ),
+        (
+            "rise",
+            ["station1_20240305-123045.jpg", "station2_20231231-235959.jpg"],
+            get_exif_date_from_rise_image_name,
+        ),
+    ],
+)
+def test_local_time_names_match_scalar_parser(format, names, parse_scalar):
+    times, _ = parse_image_names(names, format)
+
+    assert to_exif_dates(times) == [parse_scalar(name) for name in names]
+
+
+def test_name_table_round_trip(nims_names, tmp_path):
+    table = ImageNameTable.from_names(nims_names)
+    assert table.names() == nims_names
+
+    table.save(tmp_path / "names.npz")
+    loaded = ImageNameTable.load(tmp_path / "names.npz")
+    assert loaded.names() == nims_names
+    assert np.array_equal(loaded.times, table.times)
+
+
+def test_name_table_select(nims_names):
+    table = ImageNameTable.from_names(nims_names).sorted()
+    start, end = "2022-01-01T00:00:00", "2022-06-30T23:59:59"
+
+    selected = table.select("XX_Camera_3", start, end).names()
+
+    assert selected == sorted(
+        name
+        for name in nims_names
+        if name.startswith("XX_Camera_3___")
+        and datetime(2022, 1, 1, tzinfo=timezone.utc)
+        <= convert_nims_image_name_to_utc_date(name)
+        <= datetime(2022, 6, 30, 23, 59, 59, tzinfo=timezone.utc)
+    )
+    assert len(table.select("no_such_camera")) == 0
+
+
+@pytest.mark.parametrize(
+    "bad_name",
+    [
+        "XX_Camera_1___2024-13-01T00-00-00Z.jpg",
+        "XX_Camera_1___2024-02-30T00-00-00Z.jpg",
+        "XX_Camera_1___2024-01-01T24-00-00Z.jpg",
+        "XX_Camera_1___2024-01-0xT00-00-00Z.jpg",
+        "XX_Camera_1___2024/01/01T00-00-00Z.jpg",
+        "XX_Camera_1__2024-01-01T00-00-00Z.jpg",
+        "short.jpg",
+    ],
+)
+def test_invalid_names_are_rejected(nims_names, bad_name):
+    with pytest.raises(ValueError, match=repr(bad_name)):
+        parse_image_names(nims_names[:10] + [bad_name])
+
+
+def test_name_table_keeps_irregular_names(nims_names):
+    names = nims_names[:3] + [
+        "XX_Camera_1___2024-01-01T00-00-00Z.JPG",
+        "images/XX_Camera_1___2024-01-01T00-05-00Z.jpg",
+    ]
+
+    table = ImageNameTable.from_names(names)
+
+    assert table.names() == names
+    assert table.camera_ids.tolist()[-2:] == ["XX_Camera_1", "XX_Camera_1"]
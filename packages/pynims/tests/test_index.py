@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+
+from conftest import START
+from pynims.index import ImageListIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    with ImageListIndex(tmp_path / "index.sqlite") as index:
+        yield index
+
+
+def test_missing_ranges(index):
+    end = START + timedelta(days=2)
+    index.mark_complete("cam", START + timedelta(hours=6), START + timedelta(hours=12))
+    index.mark_complete(
+        "cam", START + timedelta(hours=12, seconds=1), START + timedelta(days=1)
+    )
+
+    assert index.missing_ranges("cam", START, end) == [
+        (START, START + timedelta(hours=6, seconds=-1)),
+        (START + timedelta(days=1, seconds=1), end),
+    ]
+    assert index.missing_ranges("other", START, end) == [(START, end)]
+
+
+def test_repeat_query_is_served_from_index(server, client, camera_id, index):
+    end = START + timedelta(hours=24)
+    expected = server.images[camera_id][: 24 * 12 + 1]
+
+    assert index.get_image_list(client, camera_id, START, end) == expected
+    assert index.missing_ranges(camera_id, START, end) == []
+
+    requests = server.stats["requests.listFiles"]
+    assert index.get_image_list(client, camera_id, START, end) == expected
+    assert server.stats["requests.listFiles"] == requests
+
+
+def test_extended_window_only_fetches_gap(
+    monkeypatch, server, client, camera_id, index
+):
+    middle = START + timedelta(hours=12)
+    end = START + timedelta(hours=24)
+    index.get_image_list(client, camera_id, START, middle)
+
+    fetched = []
+    get_image_list = client.get_image_list
+
+    def record(camera_id, start, end, **kwargs):
+        fetched.append((start, end))
+        return get_image_list(camera_id, start, end, **kwargs)
+
+    monkeypatch.setattr(client, "get_image_list", record)
+    images = index.get_image_list(client, camera_id, START, end)
+
+    assert images == server.images[camera_id][: 24 * 12 + 1]
+    assert fetched == [(middle + timedelta(seconds=1), end)]
+
+
+def test_capped_listing_matches_api(server, client, camera_id, index):
+    end = START + timedelta(days=3)
+
+    # Without a start the API returns the most recent images, with one the oldest
+    newest = index.get_image_list(client, camera_id, end=end, max_results=30)
+    assert newest == client.get_image_list(camera_id, end=end, max_results=30)
+    assert newest == server.images[camera_id][-30:]
+
+    oldest = index.get_image_list(client, camera_id, START, end, max_results=30)
+    assert oldest == client.get_image_list(camera_id, START, end, max_results=30)
+    assert oldest == server.images[camera_id][:30]
+
+
+def test_capped_sync_stops_once_enough_images_are_indexed(
+    server, client, camera_id, index
+):
+    end = START + timedelta(hours=24)
+    index.sync(
+        client, camera_id, START + timedelta(hours=4), START + timedelta(hours=6)
+    )
+    index.sync(
+        client, camera_id, START + timedelta(hours=12), START + timedelta(hours=20)
+    )
+
+    oldest = index.get_image_list(client, camera_id, START, end, max_results=150)
+
+    assert oldest == server.images[camera_id][:150]
+    # The images up to hour 20 were enough, so the last gap was never fetched
+    assert index.missing_ranges(camera_id, START, end) == [
+        (START + timedelta(hours=20, seconds=1), end)
+    ]
@@ -0,0 +1,71 @@
+import hashlib
+
+import pytest
+
+from pynims.download import RemoteInfo, get_partial_path
+from pynims.inventory import LocalInventory
+
+BODY = b"jpeg" * 100
+REMOTE = RemoteInfo(len(BODY), hashlib.md5(BODY).hexdigest())
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    directory = tmp_path / "images"
+    directory.mkdir()
+    (directory / "current.jpg").write_bytes(BODY)
+    (directory / "empty.jpg").write_bytes(b"")
+    (directory / "short.jpg").write_bytes(BODY[:10])
+    (directory / "changed.jpg").write_bytes(BODY[::-1])
+    (directory / "longer.jpg").write_bytes(BODY + b"!")
+    get_partial_path(directory / "partial.jpg").write_bytes(BODY[:10])
+    with LocalInventory(directory) as inventory:
+        yield inventory
+
+
+NAMES = [
+    "current.jpg",
+    "empty.jpg",
+    "short.jpg",
+    "changed.jpg",
+    "longer.jpg",
+    "partial.jpg",
+    "missing.jpg",
+]
+
+
+def test_plan_without_remote_info(inventory):
+    assert inventory.refresh() == (5, 0)
+
+    plan = inventory.plan(NAMES)
+
+    assert plan.missing == ["missing.jpg"]
+    assert plan.truncated == ["empty.jpg", "partial.jpg"]
+    assert plan.stale == []
+    assert plan.current == ["current.jpg", "short.jpg", "changed.jpg", "longer.jpg"]
+
+
+def test_plan_with_remote_info(inventory):
+    inventory.refresh()
+    inventory.hash(NAMES)
+
+    plan = inventory.plan(NAMES, {name: REMOTE for name in NAMES})
+
+    assert plan.missing == ["missing.jpg"]
+    assert plan.truncated == ["empty.jpg", "short.jpg", "partial.jpg"]
+    assert plan.stale == ["changed.jpg", "longer.jpg"]
+    assert plan.current == ["current.jpg"]
+    assert plan.to_download == plan.missing + plan.truncated + plan.stale
+
+
+def test_refresh_only_rewrites_changed_files(inventory):
+    inventory.refresh()
+    assert inventory.refresh() == (0, 0)
+
+    (inventory.directory / "empty.jpg").write_bytes(BODY)
+    (inventory.directory / "short.jpg").unlink()
+    assert inventory.refresh() == (1, 1)
+
+    plan = inventory.plan(["empty.jpg", "short.jpg"])
+    assert plan.current == ["empty.jpg"]
+    assert plan.missing == ["short.jpg"]
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from conftest import INTERVAL, START
+
+
+def test_sharded_listing_matches_server(server, client, camera_id):
+    # 48 hours splits into 6-hour shards whose bounds fall on image times,
+    # so the boundary images are listed by both neighbouring shards
+    end = START + timedelta(hours=48)
+    expected = server.images[camera_id][: 48 * 12 + 1]
+
+    images = client.get_image_list(camera_id, START, end)
+
+    assert images == expected
+    assert server.stats["requests.listFiles"] > len(expected) // server.page_size
+
+
+def test_sequential_listing_drops_page_overlap(server, client, camera_id):
+    end = START + timedelta(hours=48)
+    expected = server.images[camera_id][: 48 * 12 + 1]
+
+    images = client._fetch_image_list_sharded(camera_id, START, end, max_workers=1)
+
+    assert images == expected
+
+
+def test_listing_max_results(server, client, camera_id):
+    end = START + timedelta(hours=48)
+
+    images = client.get_image_list(camera_id, START, end, max_results=120)
+
+    assert images == server.images[camera_id][:120]
+
+
+def test_iter_image_pages_yields_each_image_once(server, client, camera_id):
+    end = START + INTERVAL * 199
+    pages = list(client.iter_image_pages(camera_id, START, end))
+
+    assert len(pages) > 1
+    assert [image for page in pages for image in page] == server.images[camera_id][:200]
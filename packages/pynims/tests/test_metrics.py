@@ -0,0 +1,44 @@
+import json
+from datetime import timedelta
+
+import pytest
+
+from conftest import START
+from pynims.client import NIMSClient
+from pynims.metrics import RequestMetrics
+
+
+@pytest.fixture
+def metrics(server, camera_id, tmp_path):
+    metrics = RequestMetrics()
+    with NIMSClient(instrumentation=metrics) as client:
+        client.get_image_list(camera_id, START, START + timedelta(hours=12))
+        for name in server.images[camera_id][:3]:
+            client.download_image(name, tmp_path)
+    return metrics
+
+
+def test_summary_counts_requests(server, metrics, tmp_path):
+    endpoints = metrics.summary()["endpoints"]
+
+    assert endpoints["listFiles"]["requests"] == server.stats["requests.listFiles"]
+    assert endpoints["image"]["requests"] == 3
+    assert endpoints["image"]["bytes"] == 3 * server.image_size
+    assert endpoints["image"]["status_codes"] == {"200": 3}
+    assert endpoints["image"]["errors"] == 0
+
+    metrics.save_json(tmp_path / "metrics.json")
+    saved = json.loads((tmp_path / "metrics.json").read_text())
+    assert saved["endpoints"]["image"]["requests"] == 3
+
+
+def test_prometheus_output(metrics):
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'pynims_requests_total{endpoint="image"} 3' in lines
+    assert 'pynims_responses_total{endpoint="image",code="200"} 3' in lines
+    assert "# TYPE pynims_request_duration_seconds histogram" in lines
+    assert (
+        'pynims_request_duration_seconds_bucket{endpoint="image",le="+Inf"} 3' in lines
+    )
+    assert 'pynims_request_duration_seconds_count{endpoint="image"} 3' in lines
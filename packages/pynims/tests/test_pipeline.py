@@ -0,0 +1,65 @@
+import sys
+from datetime import timedelta
+
+import pytest
+
+from conftest import START
+from pynims.config import PIPELINE_IMAGES_AND_DATA_FILE
+from pynims.pipeline import (
+    DownloadStage,
+    ImageListStage,
+    JoinStage,
+    PipelineCamera,
+    load_stages,
+    run_camera,
+)
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("pyarrow")
+
+from pynims.gage import FixtureFetcher  # noqa: E402
+
+
+@pytest.fixture
+def stages(tmp_path):
+    index = pd.date_range(START, periods=12 * 24, freq="5min", name="datetime")
+    readings = pd.DataFrame({"00065": range(len(index))}, index=index)
+    return [
+        ImageListStage(tmp_path / "index.sqlite"),
+        DownloadStage(concurrency=4),
+        JoinStage(cache_root=tmp_path / "gage", fetcher=FixtureFetcher(readings)),
+    ]
+
+
+def test_join_drops_rows_of_removed_images(server, camera_id, stages, tmp_path):
+    camera = PipelineCamera(
+        camera_id,
+        tmp_path / camera_id,
+        site="01234567",
+        start=START.isoformat(),
+        end=(START + timedelta(hours=2)).isoformat(),
+    )
+    run_camera(camera, stages)
+    csv_path = camera.camera_dir / PIPELINE_IMAGES_AND_DATA_FILE
+    assert len(pd.read_csv(csv_path)) == 2 * 12 + 1
+
+    camera.end = (START + timedelta(hours=1)).isoformat()
+    counts = run_camera(camera, stages)
+
+    assert counts["join"] == 0
+    assert list(pd.read_csv(csv_path)["image_names"]) == (
+        server.images[camera_id][: 12 + 1]
+    )
+
+
+def test_load_stages_leaves_import_path_alone(monkeypatch, tmp_path):
+    (tmp_path / "extra_stages.py").write_text(
+        "from pynims.pipeline import Stage\n\nSTAGES = [Stage()]\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delitem(sys.modules, "extra_stages", raising=False)
+
+    stages = load_stages("extra_stages")
+
+    assert len(stages) == 1
+    assert str(tmp_path) not in sys.path
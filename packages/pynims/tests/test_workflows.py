@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from conftest import START
+from pynims.inventory import LocalInventory
+from pynims.workflows import stream_images_for_camera
+
+END = START + timedelta(hours=10)
+
+
+def test_stream_images_for_camera(server, camera_id, tmp_path):
+    expected = server.images[camera_id][: 10 * 12 + 1]
+
+    count = stream_images_for_camera(camera_id, START, END, save_dir=tmp_path)
+
+    assert count == len(expected)
+    assert sorted(path.name for path in tmp_path.glob("*.jpg")) == expected
+    with LocalInventory(tmp_path) as inventory:
+        assert sorted(inventory.files) == expected
+
+
+def test_stream_only_fetches_what_the_inventory_is_missing(server, camera_id, tmp_path):
+    expected = server.images[camera_id][: 10 * 12 + 1]
+    stream_images_for_camera(camera_id, START, END, save_dir=tmp_path)
+    (tmp_path / expected[3]).write_bytes(b"")
+    (tmp_path / expected[5]).unlink()
+
+    requests = server.stats["requests.image"]
+    stream_images_for_camera(camera_id, START, END, save_dir=tmp_path)
+
+    assert server.stats["requests.image"] - requests == 2
+    body, _ = server.image_body()
+    assert (tmp_path / expected[3]).read_bytes() == body
+    assert (tmp_path / expected[5]).read_bytes() == body
+
+
+def test_stream_max_results(server, camera_id, tmp_path):
+    count = stream_images_for_camera(
+        camera_id, START, END, max_results=70, save_dir=tmp_path
+    )
+
+    assert count == 70
+    assert sorted(path.name for path in tmp_path.glob("*.jpg")) == (
+        server.images[camera_id][:70]
+    )
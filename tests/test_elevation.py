@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from deepwater.elevation import ElevationRaster, build_elevation_raster
+from deepwater.mask_store import MaskStore, MaskStoreWriter
+
+SHAPE = (37, 53)  # not a multiple of 64 pixels, so the last word is padded
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    rows = np.arange(SHAPE[0])[:, None]
+    frames = []
+    for i in range(40):
+        elevation = float(rng.uniform(0, 10))
+        line = SHAPE[0] - 3 * elevation + 2 * np.sin(np.arange(SHAPE[1]) / 5 + i)
+        frames.append((f"image_{i:03d}.jpg", rows > line, elevation))
+    return frames
+
+
+@pytest.fixture
+def store(frames, tmp_path):
+    with MaskStoreWriter(tmp_path / "obj1.masks") as writer:
+        for name, mask, _ in frames:
+            writer.append(name, mask)
+    with MaskStore(tmp_path / "obj1.masks") as store:
+        yield store
+
+
+def brute_force(frames):
+    masks = np.stack([mask for _, mask, _ in frames])
+    elevations = np.array([e for _, _, e in frames], np.float32)[:, None, None]
+    min_wet = np.where(masks, elevations, np.inf).min(axis=0)
+    max_dry = np.where(masks, -np.inf, elevations).max(axis=0)
+    return (
+        np.where(np.isinf(min_wet), np.nan, min_wet),
+        np.where(np.isinf(max_dry), np.nan, max_dry),
+        masks.sum(axis=0),
+    )
+
+
+def assert_matches(raster, frames):
+    min_wet, max_dry, wet_count = brute_force(frames)
+    np.testing.assert_array_equal(raster.get_min_wet(), min_wet)
+    np.testing.assert_array_equal(raster.get_max_dry(), max_dry)
+    np.testing.assert_array_equal(raster.wet_count, wet_count)
+    np.testing.assert_allclose(raster.inundation_frequency, wet_count / len(frames))
+    assert raster.frame_count == len(frames)
+
+
+def test_add_frames_matches_brute_force(frames, store):
+    raster = ElevationRaster(SHAPE)
+    names = [name for name, _, _ in frames]
+    elevations = [e for _, _, e in frames]
+
+    assert raster.add_frames(store, names, elevations) == len(frames)
+    assert_matches(raster, frames)
+    # Frames already added are skipped
+    assert raster.add_frames(store, names, elevations) == 0
+
+
+def test_incremental_updates_match_brute_force(frames, store, tmp_path):
+    raster = ElevationRaster(SHAPE)
+    for name, mask, elevation in frames[:3]:
+        assert raster.add(name, mask, elevation)
+    assert_matches(raster, frames[:3])
+
+    raster.save(tmp_path / "raster.npz")
+    raster = ElevationRaster.load(tmp_path / "raster.npz")
+    assert_matches(raster, frames[:3])
+
+    names = [name for name, _, _ in frames]
+    elevations = [e for _, _, e in frames]
+    assert raster.add_frames(store, names, elevations) == len(frames) - 3
+    assert_matches(raster, frames)
+
+
+def test_query_pixel(frames):
+    raster = ElevationRaster(SHAPE)
+    for name, mask, elevation in frames[:12]:
+        raster.add(name, mask, elevation)
+
+    min_wet, max_dry, wet_count = brute_force(frames[:12])
+    y, x = SHAPE[0] - 5, 7
+    pixel = raster.query(x, y)
+    assert pixel["wet_count"] == wet_count[y, x]
+    assert pixel["min_wet_elevation"] == min_wet[y, x]
+
+
+def test_build_elevation_raster_skips_missing_frames(frames, store, tmp_path):
+    names = [name for name, _, _ in frames] + ["not_in_store.jpg"]
+    elevations = [e for _, _, e in frames] + [1.0]
+    elevations[0] = float("nan")
+    path = tmp_path / "raster.npz"
+
+    raster = build_elevation_raster(store, names, elevations, path)
+    assert_matches(raster, frames[1:])
+
+    raster = build_elevation_raster(store, names, elevations, path)
+    assert raster.frame_count == len(frames) - 1
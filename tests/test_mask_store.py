@@ -0,0 +1,113 @@
+import json
+
+import numpy as np
+import pytest
+
+from deepwater.config import MASK_STORE_DATA_FILE, MASK_STORE_INDEX_FILE
+from deepwater.mask_store import MaskStore, MaskStoreWriter, convert_mask_dir
+
+
+@pytest.fixture
+def masks():
+    rng = np.random.default_rng(0)
+    rows = np.arange(48)[:, None]
+    # Water-like masks (a wet band below a wavy line) plus pure noise
+    masks = [rows > 20 + 8 * np.sin(np.arange(64) / 9 + i) for i in range(10)]
+    masks.append(rng.random((48, 64)) > 0.5)
+    masks.append(np.zeros((48, 64), bool))
+    return masks
+
+
+def names_for(masks):
+    return [f"image_{i:03d}.jpg" for i in range(len(masks))]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_round_trip(masks, tmp_path, compress):
+    names = names_for(masks)
+    with MaskStoreWriter(tmp_path / "obj1.masks", chunk_size=5, compress=compress) as w:
+        for name, mask in zip(names, masks):
+            w.append(name, mask[None])  # SAM 2 masks come as (1, H, W)
+
+    with MaskStore(tmp_path / "obj1.masks") as store:
+        assert len(store) == len(masks)
+        assert store.shape == (48, 64)
+        assert store.names == names
+        for name, mask in zip(names, masks):
+            assert np.array_equal(store[name], mask)
+        assert np.array_equal(store[-1], masks[-1])
+        assert all(np.array_equal(a, b) for a, b in zip(store, masks))
+        assert store.get("missing.jpg") is None
+        with pytest.raises(IndexError):
+            store[len(masks)]
+
+
+def test_reopened_writer_appends(masks, tmp_path):
+    names = names_for(masks)
+    with MaskStoreWriter(tmp_path / "obj1.masks") as writer:
+        for name, mask in zip(names[:4], masks[:4]):
+            writer.append(name, mask)
+    with MaskStoreWriter(tmp_path / "obj1.masks") as writer:
+        with pytest.raises(ValueError):
+            writer.append(names[0], masks[0])
+        with pytest.raises(ValueError):
+            writer.append("other.jpg", masks[0][:10])
+        for name, mask in zip(names[4:], masks[4:]):
+            writer.append(name, mask)
+
+    with MaskStore(tmp_path / "obj1.masks") as store:
+        assert store.names == names
+        assert all(np.array_equal(a, b) for a, b in zip(store, masks))
+
+
+def test_interrupted_writer_keeps_flushed_chunks(masks, tmp_path):
+    path = tmp_path / "obj1.masks"
+    writer = MaskStoreWriter(path, chunk_size=4)
+    for name, mask in zip(names_for(masks), masks[:10]):
+        writer.append(name, mask)
+    # Simulate a crash: unflushed masks are lost, and the data file has bytes
+    # the index does not know about
+    writer._data.write(b"partial chunk")
+    writer._data.close()
+
+    with MaskStore(path) as store:
+        assert len(store) == 8
+        assert all(np.array_equal(a, b) for a, b in zip(store, masks))
+
+    with MaskStoreWriter(path) as writer:
+        assert (path / MASK_STORE_DATA_FILE).stat().st_size == writer.offsets[-1]
+
+
+def test_interrupted_overwrite_leaves_an_empty_store(masks, tmp_path):
+    path = tmp_path / "obj1.masks"
+    with MaskStoreWriter(path) as writer:
+        for name, mask in zip(names_for(masks), masks):
+            writer.append(name, mask)
+
+    writer = MaskStoreWriter(path, overwrite=True)
+    writer.append("new.jpg", masks[0])
+    writer._data.close()  # crash before the first flush
+
+    with MaskStore(path) as store:
+        assert len(store) == 0
+    with MaskStoreWriter(path) as writer:
+        writer.append("new.jpg", masks[1])
+    with MaskStore(path) as store:
+        assert store.names == ["new.jpg"]
+        assert np.array_equal(store["new.jpg"], masks[1])
+
+
+def test_convert_mask_dir(masks, tmp_path):
+    masks_dir = tmp_path / "masks"
+    masks_dir.mkdir()
+    for i, mask in enumerate(masks):
+        np.save(masks_dir / f"{i:05d}_obj1.npy", mask[None])
+        np.save(masks_dir / f"{i:05d}_obj2.npy", ~mask[None])
+    names = names_for(masks)
+
+    with convert_mask_dir(masks_dir, tmp_path / "obj1.masks", names) as store:
+        assert store.names == names
+        assert all(np.array_equal(a, b) for a, b in zip(store, masks))
+
+    index = json.loads((tmp_path / "obj1.masks" / MASK_STORE_INDEX_FILE).read_text())
+    assert index["offsets"][-1] < sum(mask.size for mask in masks) // 8
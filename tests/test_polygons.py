@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from deepwater.mask_store import MaskStore, MaskStoreWriter  # noqa: E402
+from deepwater.polygons import (  # noqa: E402
+    PolygonTable,
+    extract_polygons,
+    mask_to_polygons,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    masks = {}
+    for i in range(6):
+        mask = np.zeros((60, 80), bool)
+        mask[10 : 20 + i, 5:30] = True
+        if i % 2:
+            mask[40:55, 50 + i : 75] = True
+        masks[f"image_{i}.jpg"] = mask
+    masks["empty.jpg"] = np.zeros((60, 80), bool)
+    with MaskStoreWriter(tmp_path / "obj1.masks") as writer:
+        for name, mask in masks.items():
+            writer.append(name, mask)
+    with MaskStore(tmp_path / "obj1.masks") as store:
+        yield store
+
+
+def test_extract_polygons(store):
+    names = store.names + ["not_in_store.jpg"]
+
+    table = extract_polygons(store, names, workers=1, chunk_size=2)
+
+    assert table.names == names
+    for name in store.names:
+        expected = mask_to_polygons(store[name])
+        polygons = table.frame_polygons(name)
+        assert len(polygons) == len(expected)
+        assert all(np.array_equal(a, b) for a, b in zip(polygons, expected))
+    assert table.frame_polygons("empty.jpg") == []
+    assert table.frame_polygons("not_in_store.jpg") == []
+    assert np.bincount(table.polygon_frames).tolist() == [1, 2, 1, 2, 1, 2]
+
+
+def test_polygon_cache(store, tmp_path, capsys):
+    cache_path = tmp_path / "polygons.sqlite"
+    first = extract_polygons(store, store.names, cache_path=cache_path, workers=1)
+    capsys.readouterr()
+
+    second = extract_polygons(store, store.names, cache_path=cache_path, workers=1)
+    assert "from 0 masks (7 cached)" in capsys.readouterr().out
+    assert np.array_equal(second.vertices, first.vertices)
+    assert np.array_equal(second.polygon_offsets, first.polygon_offsets)
+
+    # A different tolerance is a different cache entry
+    extract_polygons(
+        store, store.names, simplify_tolerance=5, cache_path=cache_path, workers=1
+    )
+    assert "from 7 masks (0 cached)" in capsys.readouterr().out
+
+
+def test_table_save_and_load(store, tmp_path):
+    table = extract_polygons(store, store.names, workers=1)
+    table.save(tmp_path / "polygons")
+
+    loaded = PolygonTable.load(tmp_path / "polygons")
+    assert loaded.names == table.names
+    assert loaded.simplify_tolerance == table.simplify_tolerance
+    assert all(np.array_equal(a, b) for a, b in zip(loaded, table))
+    assert np.array_equal(loaded.num_vertices, table.num_vertices)